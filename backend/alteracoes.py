@@ -0,0 +1,159 @@
+"""
+Canal de alterações para o frontend (Server-Sent Events em /eventos/stream).
+
+Cada inquilino tem um CanalAlteracoes. Depois de cada escrita (apos_gravar,
+na thread de escrita) o canal lê os eventos novos do histórico e envia a
+quem está conectado as linhas alteradas e os totais do dashboard dos meses
+afetados, já no formato SSE. Como o histórico é gravado por triggers, isso
+vale para qualquer escrita: handlers, importações, recorrências e tarefas em
+segundo plano. Escritas de outros processos (outros workers do uvicorn) são
+percebidas a cada PING_SEGUNDOS, quando cada conexão confere o histórico.
+
+As conexões duram até DURACAO_SEGUNDOS e são encerradas antes disso quando
+o processo recebe SIGINT/SIGTERM (ao_desligar): o uvicorn só desliga depois
+que as respostas em andamento terminam.
+
+Sem ninguém conectado, o canal não faz nada. Alterações demais de uma vez
+(mais de LIMITE_EVENTOS numa transação ou numa reconexão, a restauração de
+um dump) ou um cliente que não acompanha o ritmo recebem "recarregar", e o
+frontend volta a buscar tudo.
+"""
+import asyncio
+import signal
+import threading
+from contextlib import asynccontextmanager
+from json_rapido import dumps
+
+# Eventos por mensagem; acima disso o cliente recebe "recarregar"
+LIMITE_EVENTOS = 500
+# Mensagens aguardando envio por conexão antes de o cliente ser dado como atrasado
+MAX_PENDENTES = 100
+# Intervalo do comentário que mantém a conexão aberta através de proxies
+PING_SEGUNDOS = 15
+# Duração máxima de uma conexão; o EventSource reconecta sozinho, informando
+# o último id recebido, e nada se perde (ver desde_evento)
+DURACAO_SEGUNDOS = 300
+
+
+def mensagem_sse(evento, dados, id=None):
+    """
+    Uma mensagem no formato text/event-stream
+    """
+    linhas = [f"id: {id}\n".encode()] if id is not None else []
+    linhas.append(f"event: {evento}\n".encode())
+    linhas.append(b"data: " + dumps(dados) + b"\n\n")
+    return b"".join(linhas)
+
+
+def recarregar_sse(id):
+    return mensagem_sse("recarregar", {}, id=id)
+
+
+class CanalAlteracoes:
+    """
+    Conexões abertas de um inquilino e o último evento do histórico já
+    enviado a elas. publicar() roda nas threads do banco; as filas das
+    conexões só são mexidas no event loop.
+    """
+
+    def __init__(self):
+        self._filas = set()
+        self._loop = None
+        self._lock = threading.Lock()
+        self.ultimo_id = None
+
+    @asynccontextmanager
+    async def assinar(self):
+        """
+        Registra uma conexão enquanto o bloco durar; a fila recebe as
+        mensagens já no formato SSE
+        """
+        self._loop = asyncio.get_running_loop()
+        fila = asyncio.Queue(MAX_PENDENTES)
+        self._filas.add(fila)
+        try:
+            yield fila
+        finally:
+            self._filas.discard(fila)
+            if not self._filas:
+                # Sem conexões o canal para de acompanhar o histórico
+                with self._lock:
+                    self.ultimo_id = None
+
+    def _distribuir(self, mensagem):
+        for fila in self._filas:
+            try:
+                fila.put_nowait(mensagem)
+            except asyncio.QueueFull:
+                # Cliente atrasado: descarta o que estava pendente e pede para recarregar
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait(recarregar_sse(self.ultimo_id) if mensagem is not None else None)
+
+    def fechar(self):
+        """
+        Encerra as conexões abertas: as filas recebem None
+        """
+        self._distribuir(None)
+
+    def publicar(self, conn, montar):
+        """
+        Envia os eventos gravados desde a última publicação, montados por
+        montar(conn, desde, ate) (None quando são eventos demais). Devolve o
+        id do último evento.
+        """
+        if not self._filas:
+            return None
+        with self._lock:
+            ate = conn.execute("SELECT IFNULL(MAX(id), 0) FROM eventos").fetchone()[0]
+            desde, self.ultimo_id = self.ultimo_id, ate
+            if desde is None or desde == ate:
+                return ate
+            mensagem = desde_evento(conn, montar, desde, ate)
+            self._loop.call_soon_threadsafe(self._distribuir, mensagem)
+            return ate
+
+    def recarregar(self, conn):
+        """
+        Manda todos recarregarem (os dados foram substituídos) e passa a
+        acompanhar o histórico a partir do fim atual
+        """
+        if not self._filas:
+            return
+        with self._lock:
+            self.ultimo_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM eventos").fetchone()[0]
+            self._loop.call_soon_threadsafe(self._distribuir, recarregar_sse(self.ultimo_id))
+
+
+def desde_evento(conn, montar, desde, ate):
+    """
+    Mensagem com o que mudou entre dois eventos, também para uma conexão
+    que retoma de onde parou (cabeçalho Last-Event-ID); None se nada mudou
+    """
+    if desde == ate:
+        return None
+    # Histórico substituído (restauração) ou eventos demais
+    mensagem = montar(conn, desde, ate) if desde < ate else None
+    return mensagem or recarregar_sse(ate)
+
+
+def ao_desligar(funcao):
+    """
+    Chama funcao() no event loop quando o processo recebe SIGINT ou SIGTERM,
+    antes do tratamento já instalado (o do uvicorn, que espera as respostas
+    em andamento). Sinais só podem ser tratados na thread principal; fora
+    dela (TestClient, por exemplo) não faz nada.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        anterior = signal.getsignal(sinal)
+        if not callable(anterior):
+            continue
+
+        def tratar(numero, frame, anterior=anterior):
+            loop.call_soon_threadsafe(funcao)
+            anterior(numero, frame)
+
+        signal.signal(sinal, tratar)
@@ -0,0 +1,180 @@
+import re
+import sqlite3
+from fastapi import HTTPException
+from db_pool import DB_PATH
+
+# Índices de texto completo (FTS5) sobre os nomes de entradas e saídas. São
+# tabelas de conteúdo externo: guardam só o índice, com rowid = id da linha,
+# e os triggers abaixo as mantêm em dia. O tokenizador ignora acentos e
+# pontuação, então "farmacia" encontra "Farmácia" e "geladeira" encontra as
+# parcelas "geladeira (3/12)"; os índices de prefixo aceleram "merc*".
+BUSCA_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS entradas_fts USING fts5(
+        nome, content='entradas', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS saidas_fts USING fts5(
+        nome, content='saidas', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS fts_entradas_insert AFTER INSERT ON entradas
+    BEGIN
+        INSERT INTO entradas_fts (rowid, nome) VALUES (NEW.id, NEW.nome);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS fts_entradas_delete AFTER DELETE ON entradas
+    BEGIN
+        INSERT INTO entradas_fts (entradas_fts, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS fts_entradas_update AFTER UPDATE OF nome ON entradas
+    BEGIN
+        INSERT INTO entradas_fts (entradas_fts, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+        INSERT INTO entradas_fts (rowid, nome) VALUES (NEW.id, NEW.nome);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS fts_saidas_insert AFTER INSERT ON saidas
+    BEGIN
+        INSERT INTO saidas_fts (rowid, nome) VALUES (NEW.id, NEW.nome);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS fts_saidas_delete AFTER DELETE ON saidas
+    BEGIN
+        INSERT INTO saidas_fts (saidas_fts, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS fts_saidas_update AFTER UPDATE OF nome ON saidas
+    BEGIN
+        INSERT INTO saidas_fts (saidas_fts, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+        INSERT INTO saidas_fts (rowid, nome) VALUES (NEW.id, NEW.nome);
+    END;
+"""
+
+# Por tabela: (tabela FTS, tabela, coluna de data, coluna de flags)
+TABELAS = {
+    "entradas": ("entradas_fts", "entradas", "data", "NULL"),
+    "saidas": ("saidas_fts", "saidas", "data_vencimento", "t.flags"),
+}
+
+MAX_TERMOS = 8
+# Ordenar por relevância exige calcular o bm25 de cada resultado; acima deste
+# total isso custaria mais que a busca inteira, e nomes curtos e repetidos
+# ("mercado") têm quase a mesma relevância, então os resultados vêm dos
+# lançados mais recentemente para os mais antigos
+MAX_RANQUEADOS = 20000
+
+
+def create_busca(cursor):
+    """
+    Cria os índices de busca e os triggers que os mantêm atualizados
+    """
+    cursor.executescript(BUSCA_SCHEMA)
+
+
+def rebuild_busca(conn, commit=True):
+    """
+    Reconstrói os índices a partir das tabelas (bancos existentes ou cargas
+    feitas com os triggers desligados)
+    """
+    for fts, _, _, _ in TABELAS.values():
+        conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    if commit:
+        conn.commit()
+
+
+def termos_busca(q):
+    """
+    Palavras da consulta, sem a sintaxe do FTS5: cada uma vira uma busca por
+    prefixo entre aspas, então o usuário não consegue montar consultas inválidas
+    """
+    termos = list(dict.fromkeys(re.findall(r"\w+", q.lower())))
+    if not termos:
+        raise HTTPException(status_code=400, detail="Informe ao menos uma palavra para buscar")
+    if len(termos) > MAX_TERMOS:
+        raise HTTPException(status_code=400, detail=f"Use no máximo {MAX_TERMOS} palavras")
+    return termos
+
+
+def _match(termos):
+    return " ".join(f'"{termo}"*' for termo in termos)
+
+
+def get_busca(conn, q, tipos=("entradas", "saidas"), limit=50, offset=0):
+    """
+    Resultados paginados por limit/offset, ordenados por relevância (bm25) ou,
+    com mais de MAX_RANQUEADOS resultados, dos mais recentes para os mais
+    antigos; junto vêm o total e, para cada palavra, a quantidade e a soma dos
+    valores das linhas que a contêm
+    """
+    termos = termos_busca(q)
+    consulta = _match(termos)
+    cursor = conn.cursor()
+
+    # Contar só percorre o índice, sem ler as tabelas
+    contagens = {}
+    for tipo in tipos:
+        fts = TABELAS[tipo][0]
+        cursor.execute(f"SELECT COUNT(*) FROM {fts} WHERE {fts} MATCH ?", (consulta,))
+        contagens[tipo] = cursor.fetchone()[0]
+    total = sum(contagens.values())
+    ranquear = total <= MAX_RANQUEADOS
+
+    # Cada tabela devolve só as suas primeiras limit+offset linhas, e só elas
+    # são lidas da tabela principal
+    ordem = "rank, rowid DESC" if ranquear else "rowid DESC"
+    resultados = []
+    for tipo in tipos:
+        if not contagens[tipo]:
+            continue
+        fts, tabela, coluna_data, coluna_flags = TABELAS[tipo]
+        cursor.execute(f"""
+            SELECT ? AS tipo, t.id, t.nome, t.valor, t.{coluna_data} AS data, {coluna_flags} AS flags,
+                   m.relevancia
+            FROM (
+                SELECT rowid, {"rank" if ranquear else "NULL"} AS relevancia
+                FROM {fts} WHERE {fts} MATCH ? ORDER BY {ordem} LIMIT ?
+            ) m
+            JOIN {tabela} t ON t.id = m.rowid
+        """, (tipo[:-1], consulta, limit + offset))
+        resultados.extend(dict(row) for row in cursor.fetchall())
+
+    resultados.sort(key=lambda r: r["data"] or "", reverse=True)
+    if ranquear:
+        resultados.sort(key=lambda r: r["relevancia"])
+    resultados = resultados[offset:offset + limit]
+
+    por_termo = []
+    for termo in termos:
+        totais = {"termo": termo}
+        for tipo in tipos:
+            fts, tabela, _, _ = TABELAS[tipo]
+            if len(termos) == 1 and not contagens[tipo]:
+                totais[tipo] = {"quantidade": 0, "total": 0}
+                continue
+            cursor.execute(f"""
+                SELECT COUNT(*), IFNULL(SUM(t.valor), 0)
+                FROM {fts} JOIN {tabela} t ON t.id = {fts}.rowid
+                WHERE {fts} MATCH ?
+            """, (_match([termo]),))
+            quantidade, soma = cursor.fetchone()
+            totais[tipo] = {"quantidade": quantidade, "total": round(soma, 2)}
+        por_termo.append(totais)
+
+    return {
+        "termos": por_termo,
+        "total": total,
+        "ordem": "relevancia" if ranquear else "recentes",
+        "limit": limit,
+        "offset": offset,
+        "resultados": resultados,
+    }
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DB_PATH)
+    create_busca(conn.cursor())
+    rebuild_busca(conn)
+    conn.close()
+    print("Índices de busca reconstruídos.")
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from json_rapido import dumps
+
+# Número máximo de respostas guardadas (configurável por variável de ambiente)
+CACHE_SIZE = int(os.environ.get("CACHE_SIZE", "256"))
+
+
+class ResponseCache:
+    """
+    Cache em memória das respostas dos endpoints de leitura.
+
+    Guarda o JSON já serializado e o ETag de cada resposta, por chave
+    (endpoint e parâmetros), com descarte LRU. Cada escrita no banco chama
+    invalidar(), que incrementa o contador de versão: entradas gravadas numa
+    versão anterior deixam de valer. A versão é lida antes da consulta, então
+    uma escrita que aconteça durante a consulta também invalida o resultado.
+
+    alterado, se informado, devolve True quando o banco foi alterado por fora
+    deste processo (ver MonitorAlteracoes). Ele lê o banco, então não é
+    chamado por get(): conferir() o consulta e invalida o cache se preciso, e
+    deve rodar fora do event loop antes da busca.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, alterado=None):
+        self.max_size = max_size
+        self.alterado = alterado
+        self.versao = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def conferir(self):
+        if self.alterado is not None and self.alterado():
+            self.invalidar()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if item[0] != self.versao:
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return item[1], item[2]
+
+    def put(self, chave, versao, dados):
+        """
+        Serializa os dados e guarda a resposta; devolve (corpo, etag)
+        """
+        corpo = dumps(dados)
+        etag = f'"{hashlib.sha1(corpo).hexdigest()[:20]}"'
+        with self._lock:
+            if self.max_size > 0 and versao == self.versao:
+                self._itens[chave] = (versao, corpo, etag)
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.max_size:
+                    self._itens.popitem(last=False)
+        return corpo, etag
+
+    def invalidar(self):
+        with self._lock:
+            self.versao += 1
+            self._itens.clear()
@@ -0,0 +1,313 @@
+import logging
+import re
+import sqlite3
+import unicodedata
+from functools import lru_cache
+from fastapi import HTTPException
+from db_pool import DB_PATH
+
+# Categorias das saídas e as regras que as atribuem pelo nome. Cada saída
+# guarda sua categoria em saidas.categoria_id; NULL quer dizer "ainda não
+# classificada" (linhas novas ou renomeadas), e o que nenhuma regra reconhece
+# vai para "Outros". A classificação roda depois de cada escrita
+# (classificar_pendentes) e, quando as regras mudam, em lotes
+# (reclassificar_em_lotes).
+CATEGORIAS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS categorias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL UNIQUE
+    );
+
+    CREATE TABLE IF NOT EXISTS regras_categoria (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        categoria_id INTEGER NOT NULL,
+        padrao TEXT NOT NULL,
+        regex INTEGER NOT NULL DEFAULT 0,
+        prioridade INTEGER NOT NULL DEFAULT 0
+    );
+
+    -- Renomear uma saída a devolve para a fila de classificação
+    CREATE TRIGGER IF NOT EXISTS categorias_saidas_nome AFTER UPDATE OF nome ON saidas
+    WHEN NEW.nome IS NOT OLD.nome
+    BEGIN
+        UPDATE saidas SET categoria_id = NULL WHERE id = NEW.id;
+    END;
+"""
+
+# Totais por categoria num intervalo de datas (dashboard) e as saídas pendentes
+# de classificação (categoria_id IS NULL), cobertos pelo índice. Numa tabela
+# já cheia ele é criado depois da primeira classificação: manter o índice a
+# cada linha alterada custaria mais que criá-lo de uma vez no final.
+CATEGORIAS_INDICE = """
+    CREATE INDEX IF NOT EXISTS idx_saidas_categoria
+    ON saidas (categoria_id, data_vencimento, valor);
+"""
+
+# Categoria das saídas que nenhuma regra reconhece; não pode ser removida
+OUTROS = 1
+
+# Construções que só funcionam numa expressão isolada: flags globais como
+# (?i), que precisam estar no início da expressão, e referências numéricas
+# (\1), que na expressão combinada apontariam para os grupos de outra regra
+_SO_ISOLADA = re.compile(r"(?<!\\)(?:\\\\)*(?:\(\?[aiLmsux]+\)|\\[1-9])")
+
+logger = logging.getLogger("categorias")
+
+# Categorias e regras iniciais de um banco novo: (nome, padrões)
+CATEGORIAS_PADRAO = (
+    ("Outros", ()),
+    ("Cartões", ("cartao*",)),
+    ("Moradia", ("aluguel|condominio|iptu",)),
+    ("Contas da casa", ("luz|agua|internet|gas|telefone|celular",)),
+    ("Mercado", ("mercado|supermercado|padaria|feira|acougue|hortifruti",)),
+    ("Saúde", ("farmacia|drogaria|remedio*|plano de saude|consulta*|exame*|dentista",)),
+    ("Transporte", ("uber|99|taxi|combustivel|gasolina|estacionamento|pedagio|onibus|metro",)),
+    ("Alimentação", ("restaurante*|lanchonete|ifood|delivery",)),
+    ("Educação", ("curso*|escola|faculdade|posgraduacao|mensalidade",)),
+)
+
+# Linhas por lote na reclassificação completa
+TAMANHO_LOTE = 50000
+# Máximo de saídas pendentes classificadas depois de cada escrita; cargas
+# feitas por fora da aplicação terminam de ser classificadas nas seguintes
+MAX_PENDENTES = 50000
+
+
+def normalizar(texto):
+    """
+    Minúsculas, sem acentos e com os espaços simplificados: regras e nomes são
+    comparados nessa forma
+    """
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.split())
+
+
+def padrao_regex(padrao, regex=False):
+    """
+    Expressão regular de uma regra. Padrões simples são alternativas separadas
+    por | que casam com palavras inteiras do nome, e * vale qualquer
+    continuação da palavra ("cartao*" casa com "cartao inter" e com
+    "cartaonubank"). Com regex=True o padrão já é uma expressão regular.
+    """
+    if regex:
+        return padrao
+    alternativas = []
+    for alternativa in normalizar(padrao).split("|"):
+        alternativa = alternativa.strip()
+        if not alternativa:
+            continue
+        expressao = r"\w*".join(re.escape(parte) for parte in alternativa.split("*"))
+        alternativas.append(rf"\b{expressao}" + ("" if alternativa.endswith("*") else r"\b"))
+    return "|".join(alternativas)
+
+
+def _problema(expressao):
+    """
+    Por que a expressão de uma regra não pode entrar na expressão combinada
+    (compilar_regras), ou None
+    """
+    if "(?P" in expressao:
+        return "Grupos nomeados (?P...) não são aceitos nas regras"
+    if _SO_ISOLADA.search(expressao):
+        return "Flags globais como (?i) e referências como \\1 não são aceitas nas regras"
+    try:
+        re.compile(_combinar([expressao]), re.IGNORECASE | re.DOTALL)
+    except re.error as e:
+        return f"Expressão regular inválida: {e}"
+    return None
+
+
+def _combinar(expressoes):
+    """
+    Expressão combinada: cada regra é o grupo r<n>, ancorado no início do nome
+    """
+    return "|".join(f"(?P<r{i}>.*?(?:{expressao}))" for i, expressao in enumerate(expressoes))
+
+
+def validar_regra(padrao, regex=False, existentes=()):
+    """
+    Confere, antes de gravar a regra, se o padrão casa com algum texto e se
+    compila como parte da expressão combinada, junto com as regras
+    `existentes` ((padrao, regex) das que já estão gravadas)
+    """
+    expressao = padrao_regex(padrao, regex)
+    if not expressao:
+        raise HTTPException(status_code=400, detail="Padrão vazio")
+    problema = _problema(expressao)
+    if problema:
+        raise HTTPException(status_code=400, detail=problema)
+    if re.compile(expressao, re.IGNORECASE).match(""):
+        raise HTTPException(status_code=400, detail="O padrão casa com qualquer nome")
+    expressoes = [padrao_regex(p, r) for p, r in existentes]
+    try:
+        re.compile(_combinar([e for e in expressoes if e and not _problema(e)] + [expressao]),
+                   re.IGNORECASE | re.DOTALL)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Expressão regular inválida junto com as outras regras: {e}")
+
+
+@lru_cache(maxsize=64)
+def compilar_regras(regras):
+    """
+    Junta todas as regras, (categoria_id, padrao, regex) da mais para a menos
+    prioritária, numa única expressão regular e devolve a função que classifica
+    um nome. Cada regra é uma alternativa ancorada no início do nome, então
+    vale a primeira regra que casa em qualquer posição, e não a que casa mais
+    cedo. O cache evita recompilar enquanto as regras não mudam.
+    """
+    categorias = []
+    expressoes = []
+    for categoria_id, padrao, regex in regras:
+        expressao = padrao_regex(padrao, regex)
+        if not expressao:
+            continue
+        # Regras gravadas antes da validação atual (ou vindas de um dump)
+        # não podem impedir as demais de funcionar
+        problema = _problema(expressao)
+        if problema:
+            logger.warning("regra ignorada (%r): %s", padrao, problema)
+            continue
+        expressoes.append(expressao)
+        categorias.append(categoria_id)
+    if not expressoes:
+        return lambda nome: OUTROS
+    matcher = re.compile(_combinar(expressoes), re.IGNORECASE | re.DOTALL)
+
+    def classificar_nome(nome):
+        m = matcher.match(normalizar(nome))
+        return categorias[int(m.lastgroup[1:])] if m else OUTROS
+
+    return classificar_nome
+
+
+def carregar_classificador(conn):
+    regras = conn.execute("""
+        SELECT categoria_id, padrao, regex FROM regras_categoria
+        ORDER BY prioridade DESC, id
+    """).fetchall()
+    return compilar_regras(tuple((r[0], r[1], bool(r[2])) for r in regras))
+
+
+def classificar(conn, filtro, params=()):
+    """
+    Classifica as saídas selecionadas por `filtro` (condição sobre saidas, com
+    as colunas qualificadas): cada nome distinto passa uma vez pelo
+    classificador, e o resultado é aplicado por um único UPDATE que só grava as
+    linhas cuja categoria muda. Não faz commit; devolve as linhas alteradas.
+    """
+    nomes = [row[0] for row in conn.execute(f"SELECT DISTINCT nome FROM saidas WHERE {filtro}", params)]
+    if not nomes:
+        return 0
+    classificador = carregar_classificador(conn)
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS categorias_nomes (
+            nome TEXT PRIMARY KEY, categoria_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("DELETE FROM temp.categorias_nomes")
+    conn.executemany(
+        "INSERT INTO temp.categorias_nomes (nome, categoria_id) VALUES (?, ?)",
+        ((nome, classificador(nome)) for nome in nomes)
+    )
+    cursor = conn.execute(f"""
+        UPDATE saidas SET categoria_id = m.categoria_id
+        FROM temp.categorias_nomes m
+        WHERE m.nome = saidas.nome AND saidas.categoria_id IS NOT m.categoria_id AND {filtro}
+    """, params)
+    return cursor.rowcount
+
+
+def classificar_pendentes(conn):
+    """
+    Classifica as saídas ainda sem categoria (no máximo MAX_PENDENTES por vez);
+    roda na thread de escrita depois de cada escrita
+    """
+    if conn.execute("SELECT 1 FROM saidas WHERE categoria_id IS NULL LIMIT 1").fetchone() is None:
+        return 0
+    with conn:
+        return classificar(conn, """saidas.id IN (
+            SELECT id FROM saidas WHERE categoria_id IS NULL LIMIT ?
+        )""", (MAX_PENDENTES,))
+
+
+def reclassificar_em_lotes(conn, tamanho_lote=TAMANHO_LOTE):
+    """
+    Reaplica as regras a todas as saídas em faixas de id, sem fazer commit;
+    um yield por lote com o total de linhas alteradas até ali. As regras são
+    relidas a cada lote, então uma mudança no meio do caminho já vale para os
+    lotes seguintes.
+    """
+    maior = conn.execute("SELECT IFNULL(MAX(id), 0) FROM saidas").fetchone()[0]
+    alteradas = 0
+    for inicio in range(0, maior, tamanho_lote):
+        alteradas += classificar(conn, "saidas.id > ? AND saidas.id <= ?", (inicio, inicio + tamanho_lote))
+        yield alteradas
+
+
+def seed_categorias(conn):
+    """
+    Cria as categorias padrão e suas regras (Outros fica com o id OUTROS)
+    """
+    for nome, padroes in CATEGORIAS_PADRAO:
+        cursor = conn.execute("INSERT INTO categorias (nome) VALUES (?)", (nome,))
+        conn.executemany(
+            "INSERT INTO regras_categoria (categoria_id, padrao) VALUES (?, ?)",
+            [(cursor.lastrowid, padrao) for padrao in padroes]
+        )
+
+
+def get_categorias(conn):
+    """
+    Categorias com suas regras, na ordem em que são aplicadas
+    """
+    categorias = {
+        row["id"]: {"id": row["id"], "nome": row["nome"], "regras": []}
+        for row in conn.execute("SELECT id, nome FROM categorias ORDER BY nome")
+    }
+    for row in conn.execute("""
+        SELECT id, categoria_id, padrao, regex, prioridade FROM regras_categoria
+        ORDER BY prioridade DESC, id
+    """):
+        if row["categoria_id"] in categorias:
+            categorias[row["categoria_id"]]["regras"].append({
+                "id": row["id"], "padrao": row["padrao"],
+                "regex": bool(row["regex"]), "prioridade": row["prioridade"],
+            })
+    return list(categorias.values())
+
+
+def totais_por_categoria(conn, inicio, fim):
+    """
+    Total das saídas de cada categoria entre as datas, do maior
+    para o menor; cada categoria é uma faixa do índice idx_saidas_categoria.
+    Saídas ainda não classificadas contam em Outros.
+    """
+    totais = {}
+    nomes = {}
+    for row in conn.execute("""
+        SELECT c.id, c.nome,
+               (SELECT IFNULL(SUM(s.valor), 0) FROM saidas s
+                WHERE s.categoria_id IS c.id AND s.data_vencimento BETWEEN ? AND ?) AS total
+        FROM (SELECT id, nome FROM categorias UNION ALL SELECT NULL, NULL) c
+    """, (inicio, fim)):
+        categoria_id = OUTROS if row["id"] is None else row["id"]
+        if row["nome"] is not None:
+            nomes[categoria_id] = row["nome"]
+        totais[categoria_id] = totais.get(categoria_id, 0) + row["total"]
+    return sorted(
+        (
+            {"id": categoria_id, "nome": nomes.get(categoria_id, "Outros"), "total": round(total, 2)}
+            for categoria_id, total in totais.items() if total
+        ),
+        key=lambda c: c["total"], reverse=True
+    )
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DB_PATH)
+    alteradas = 0
+    for alteradas in reclassificar_em_lotes(conn):
+        conn.commit()
+    conn.close()
+    print(f"Saídas reclassificadas: {alteradas}")
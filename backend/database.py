@@ -1,42 +1,19 @@
 import sqlite3
 from datetime import datetime, timedelta
 import re
+from db_pool import DB_PATH
+from migrate_db import migrate_db
+from parcelas import insert_parcelas
 
-def init_db():
-    conn = sqlite3.connect("db.sqlite3")
-    cursor = conn.cursor()
-    
-    # Tabela de Entradas
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS entradas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            valor REAL NOT NULL,
-            status TEXT DEFAULT 'pendente',
-            data TEXT DEFAULT (strftime('%Y-%m-%d', 'now'))
-        )
-    """)
-    
-    # Tabela de Saídas (atualizada com novos campos)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS saidas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            valor REAL NOT NULL,
-            flags TEXT DEFAULT '',
-            data TEXT DEFAULT (strftime('%Y-%m-%d', 'now')),
-            parcela_atual INTEGER DEFAULT 1,
-            total_parcelas INTEGER DEFAULT 1,
-            id_grupo_parcela INTEGER DEFAULT NULL,
-            data_vencimento TEXT DEFAULT (strftime('%Y-%m-%d', 'now'))
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+def init_db(conn=None):
+    """
+    Cria ou atualiza o schema (ver migrate_db); num banco já atualizado só
+    confere a versão
+    """
+    migrate_db(conn)
 
 def populate_initial_data():
-    conn = sqlite3.connect("db.sqlite3")
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     # Dados iniciais de entradas
@@ -69,7 +46,21 @@ def populate_initial_data():
     ]
     
     cursor.executemany("INSERT OR IGNORE INTO entradas (nome, valor, status) VALUES (?, ?, ?)", entradas)
-    cursor.executemany("INSERT OR IGNORE INTO saidas (nome, valor, flags) VALUES (?, ?, ?)", saidas)
+    
+    # Despesas não recorrentes entram direto; as demais viram modelos de
+    # recorrência, gerados a cada mês quando o mês é consultado
+    cursor.executemany(
+        "INSERT OR IGNORE INTO saidas (nome, valor, flags) VALUES (?, ?, ?)",
+        [s for s in saidas if "no_rec" in s[2].split(",")]
+    )
+    inicio = datetime.now().strftime('%Y-%m')
+    cursor.executemany(
+        "INSERT INTO recorrencias (nome, valor, flags, dia, inicio) VALUES (?, ?, ?, 10, ?)",
+        [
+            (nome, valor, ",".join(f for f in flags.split(",") if f and f != "feito"), inicio)
+            for nome, valor, flags in saidas if "no_rec" not in flags.split(",")
+        ]
+    )
     
     conn.commit()
     conn.close()
@@ -78,7 +69,7 @@ def create_parcelas(nome, valor_total, flags, data_inicial=None):
     """
     Cria parcelas automaticamente baseado na flag 'parcX' onde X é o número de parcelas
     """
-    conn = sqlite3.connect("db.sqlite3")
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     # Detectar o padrão de parcelamento nas flags (parc2, parc3, parc10, etc)
@@ -94,37 +85,12 @@ def create_parcelas(nome, valor_total, flags, data_inicial=None):
         return
     
     total_parcelas = int(parcelas_match.group(1))
-    valor_parcela = round(valor_total / total_parcelas, 2)
-    
-    # Criar um ID de grupo para vincular todas as parcelas
-    cursor.execute("INSERT INTO saidas (nome, valor, flags) VALUES ('temp', 0, '')")
-    id_grupo = cursor.lastrowid
-    cursor.execute("DELETE FROM saidas WHERE id = ?", (id_grupo,))
     
     # Data inicial para primeira parcela (hoje se não for especificada)
     if not data_inicial:
         data_inicial = datetime.now().strftime('%Y-%m-%d')
     
-    data_atual = datetime.strptime(data_inicial, '%Y-%m-%d')
-    
-    # Criar todas as parcelas
-    for i in range(1, total_parcelas + 1):
-        data_vencimento = data_atual.strftime('%Y-%m-%d')
-        nome_parcela = f"{nome} ({i}/{total_parcelas})"
-        
-        cursor.execute("""
-            INSERT INTO saidas 
-            (nome, valor, flags, parcela_atual, total_parcelas, id_grupo_parcela, data_vencimento) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (nome_parcela, valor_parcela, flags, i, total_parcelas, id_grupo, data_vencimento))
-        
-        # Avançar um mês para a próxima parcela
-        if data_atual.month == 12:
-            data_atual = data_atual.replace(year=data_atual.year + 1, month=1)
-        else:
-            data_atual = data_atual.replace(month=data_atual.month + 1)
-    
-    conn.commit()
+    insert_parcelas(conn, nome, valor_total, flags, total_parcelas, data_inicial)
     conn.close()
 
 if __name__ == "__main__":
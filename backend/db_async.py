@@ -0,0 +1,119 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from metricas import registrar_etapa, tempos_requisicao
+
+# Número de threads dedicadas a leituras (configurável por variável de ambiente)
+DB_READERS = int(os.environ.get("DB_READERS", "8"))
+
+logger = logging.getLogger("db")
+
+
+class DatabaseExecutor:
+    """
+    Camada assíncrona de acesso ao banco.
+
+    As funções de banco continuam síncronas (recebem a conexão como primeiro
+    argumento), mas rodam em executores próprios em vez do threadpool padrão
+    do Starlette: leituras num pool de DB_READERS threads e escritas numa
+    única thread, o que serializa as escritas e evita disputa pelo lock de
+    escrita do SQLite. Os handlers apenas aguardam o resultado, sem bloquear
+    o event loop.
+
+    ao_gravar, se informado, é chamado na thread de escrita depois de cada
+    escrita (e de cada passo de um stream de escrita), por exemplo para
+    invalidar caches. apos_gravar, se informado, é uma função de banco
+    (recebe a conexão) chamada do mesmo jeito, antes de ao_gravar, para
+    manutenção que precisa acompanhar as escritas; uma falha nela é registrada
+    no log, sem afetar a escrita já gravada.
+
+    leitura permite usar um executor de leitura compartilhado entre vários
+    bancos (um por inquilino); nesse caso ele não é fechado em close().
+    """
+
+    def __init__(self, pool, leitores=DB_READERS, ao_gravar=None, leitura=None, apos_gravar=None):
+        self.pool = pool
+        self.ao_gravar = ao_gravar
+        self.apos_gravar = apos_gravar
+        self._leitura_propria = leitura is None
+        self._leitura = leitura or ThreadPoolExecutor(max_workers=leitores, thread_name_prefix="db-leitura")
+        self._escrita = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-escrita")
+
+    def _run(self, fn, args):
+        inicio = time.perf_counter()
+        with self.pool.connection() as conn:
+            registrar_etapa("conexao", time.perf_counter() - inicio)
+            tempos = tempos_requisicao.get() or {}
+            sql_antes = tempos.get("sql", 0)
+            inicio = time.perf_counter()
+            try:
+                return fn(conn, *args)
+            finally:
+                # Registra a última instrução antes de separar SQL do resto
+                finalizar = getattr(conn, "finalizar", None)
+                if finalizar:
+                    finalizar()
+                gasto = time.perf_counter() - inicio
+                registrar_etapa("python", gasto - (tempos.get("sql", 0) - sql_antes))
+
+    async def _executar(self, executor, fn, *args):
+        # O contexto é copiado para a thread, levando junto os tempos da requisição
+        loop = asyncio.get_running_loop()
+        contexto = contextvars.copy_context()
+        return await loop.run_in_executor(executor, partial(contexto.run, fn, *args))
+
+    def _run_escrita(self, fn, *args):
+        try:
+            resultado = fn(*args)
+            if self.apos_gravar:
+                try:
+                    self._run(self.apos_gravar, ())
+                except Exception:
+                    logger.exception("falha em apos_gravar")
+            return resultado
+        finally:
+            if self.ao_gravar:
+                self.ao_gravar()
+
+    async def read(self, fn, *args):
+        return await self._executar(self._leitura, self._run, fn, args)
+
+    async def call(self, fn, *args):
+        """
+        Roda fn(*args) no executor de leitura, sem conexão do pool (para
+        funções que bloqueiam com conexão própria)
+        """
+        return await self._executar(self._leitura, fn, *args)
+
+    async def write(self, fn, *args):
+        return await self._executar(self._escrita, self._run_escrita, self._run, fn, args)
+
+    async def stream(self, gerador, escrita=False):
+        """
+        Consome um gerador síncrono no executor, um item por vez, para que
+        respostas em streaming também não bloqueiem o event loop. Com
+        escrita=True cada passo passa pela thread de escrita, intercalando
+        com as demais escritas.
+        """
+        if escrita:
+            executor, passo = self._escrita, partial(self._run_escrita, next)
+        else:
+            executor, passo = self._leitura, next
+        fim = object()
+        try:
+            while True:
+                item = await self._executar(executor, passo, gerador, fim)
+                if item is fim:
+                    break
+                yield item
+        finally:
+            await self._executar(executor, gerador.close)
+
+    def close(self):
+        if self._leitura_propria:
+            self._leitura.shutdown(wait=True)
+        self._escrita.shutdown(wait=True)
@@ -0,0 +1,142 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Caminho do banco e tamanho do pool (configuráveis por variável de ambiente)
+DB_PATH = os.environ.get("DB_PATH", "db.sqlite3")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "16"))
+
+# Pragmas aplicados uma única vez em cada conexão nova
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",      # ~16 MB de cache de páginas por conexão
+    "PRAGMA mmap_size = 268435456",    # 256 MB de leitura via mmap
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def connect(path=DB_PATH, factory=sqlite3.Connection):
+    """
+    Abre uma conexão já configurada com row_factory e os pragmas de desempenho
+    """
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False, factory=factory)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pool de conexões SQLite de longa duração.
+
+    Cada requisição pega uma conexão exclusiva e a devolve ao final, então a
+    abertura do arquivo e a leitura do schema acontecem só uma vez por conexão.
+    Com max_size=0 o pool fica desligado e cada acquire abre uma conexão nova
+    (comportamento antigo, útil para comparar nos benchmarks).
+    """
+
+    def __init__(self, path=DB_PATH, max_size=DB_POOL_SIZE, factory=sqlite3.Connection):
+        self.path = path
+        self.max_size = max_size
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def acquire(self):
+        if self.max_size <= 0:
+            return connect(self.path, self.factory)
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return connect(self.path, self.factory)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Pool cheio: esperar uma conexão ser devolvida
+        return self._idle.get(timeout=30)
+
+    def release(self, conn):
+        # Conexões instrumentadas registram a última instrução ao serem devolvidas
+        finalizar = getattr(conn, "finalizar", None)
+        if finalizar:
+            finalizar()
+
+        # Desfaz qualquer transação deixada aberta por um handler que falhou
+        if conn.in_transaction:
+            conn.rollback()
+
+        if self.max_size <= 0 or self._closed:
+            conn.close()
+            with self._lock:
+                if self.max_size > 0:
+                    self._created -= 1
+            return
+
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+class MonitorAlteracoes:
+    """
+    Detecta commits feitos por outras conexões no mesmo arquivo, inclusive de
+    outros processos (vários workers do uvicorn), via PRAGMA data_version.
+    Usa uma conexão própria, reservada para isso. Cada chamada devolve True se
+    houve commit desde a chamada anterior.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._versao = self._ler()
+
+    def _ler(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def __call__(self):
+        with self._lock:
+            versao = self._ler()
+            mudou = versao != self._versao
+            self._versao = versao
+            return mudou
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,385 @@
+import json
+import sqlite3
+import zlib
+from datetime import datetime, time as dt_time, timezone
+from fastapi import HTTPException
+from db_pool import DB_PATH
+from json_rapido import dumps
+
+# Histórico de entradas e saídas: cada inclusão, alteração e remoção vira uma
+# linha em `eventos`, com a linha antes e depois (JSON). Os triggers gravam o
+# evento na mesma transação da alteração, então ele sai no mesmo commit, sem
+# uma escrita a mais no disco, e nenhum caminho de escrita (API, importação,
+# recorrências, scripts) fica de fora. A tabela só aceita inclusões.
+#
+# Os snapshots guardam as linhas de um mês num evento, compactadas; o estado
+# de um mês num momento passado é reconstruído a partir do ponto mais próximo,
+# o snapshot anterior (aplicando os eventos seguintes) ou as tabelas atuais
+# (desfazendo os eventos mais recentes).
+
+# Colunas guardadas nos eventos; categoria_id é derivada do nome e fica de fora
+COLUNAS = {
+    "entradas": ("id", "nome", "valor", "status", "data", "hash_importacao"),
+    "saidas": ("id", "nome", "valor", "flags", "data", "parcela_atual", "total_parcelas",
+               "id_grupo_parcela", "data_vencimento", "hash_importacao", "id_recorrencia"),
+}
+# Colunas que ficam nos eventos e snapshots (para desfazer e reconstruir as
+# linhas inteiras) mas não saem em /eventos e /historico
+COLUNAS_INTERNAS = ("hash_importacao",)
+# Coluna que define o mês de cada linha
+COLUNA_DATA = {"entradas": "data", "saidas": "data_vencimento"}
+
+# Eventos de um mês desde o seu último snapshot que levam a um snapshot novo;
+# em meses com mais linhas que isso, o número de linhas do mês. Assim gravar
+# snapshots nunca custa mais que os eventos que os motivaram (uma carga grande
+# não gera um snapshot a cada lote), e reconstruir um mês a partir do
+# snapshot aplica no máximo tantos eventos quanto o mês tem de linhas.
+SNAPSHOT_EVENTOS = 500
+
+
+def _json(tabela, linha):
+    return "json_object(" + ", ".join(f"'{c}', {linha}.{c}" for c in COLUNAS[tabela]) + ")"
+
+
+def _triggers(tabela):
+    data = COLUNA_DATA[tabela]
+    colunas = [c for c in COLUNAS[tabela] if c != "id"]
+    mudou = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in colunas)
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS eventos_{tabela}_insert AFTER INSERT ON {tabela}
+    BEGIN
+        INSERT INTO eventos (tabela, linha_id, operacao, mes, depois)
+        VALUES ('{tabela}', NEW.id, 'insert', substr(NEW.{data}, 1, 7), {_json(tabela, "NEW")});
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS eventos_{tabela}_delete AFTER DELETE ON {tabela}
+    BEGIN
+        INSERT INTO eventos (tabela, linha_id, operacao, mes, antes)
+        VALUES ('{tabela}', OLD.id, 'delete', substr(OLD.{data}, 1, 7), {_json(tabela, "OLD")});
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS eventos_{tabela}_update AFTER UPDATE OF {", ".join(colunas)} ON {tabela}
+    WHEN {mudou}
+    BEGIN
+        INSERT INTO eventos (tabela, linha_id, operacao, mes, mes_anterior, antes, depois)
+        VALUES ('{tabela}', NEW.id, 'update', substr(NEW.{data}, 1, 7),
+                NULLIF(substr(OLD.{data}, 1, 7), substr(NEW.{data}, 1, 7)),
+                {_json(tabela, "OLD")}, {_json(tabela, "NEW")});
+    END;
+"""
+
+
+# mes é o mês da linha depois do evento (antes, numa remoção); mes_anterior só
+# é preenchido quando uma alteração muda a linha de mês
+EVENTOS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS eventos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        momento TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+        tabela TEXT NOT NULL,
+        linha_id INTEGER NOT NULL,
+        operacao TEXT NOT NULL,
+        mes TEXT,
+        mes_anterior TEXT,
+        antes TEXT,
+        depois TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_eventos_mes ON eventos (mes, id);
+    CREATE INDEX IF NOT EXISTS idx_eventos_mes_anterior
+    ON eventos (mes_anterior, id) WHERE mes_anterior IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS idx_eventos_linha ON eventos (tabela, linha_id, id);
+    CREATE INDEX IF NOT EXISTS idx_eventos_momento ON eventos (momento);
+
+    CREATE TRIGGER IF NOT EXISTS eventos_somente_inclusao_update BEFORE UPDATE ON eventos
+    BEGIN
+        SELECT RAISE(ABORT, 'eventos só aceita inclusões');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS eventos_somente_inclusao_delete BEFORE DELETE ON eventos
+    BEGIN
+        SELECT RAISE(ABORT, 'eventos só aceita inclusões');
+    END;
+
+    -- Linhas de um mês logo depois do evento evento_id (JSON colunar com zlib)
+    CREATE TABLE IF NOT EXISTS snapshots (
+        ano_mes TEXT NOT NULL,
+        evento_id INTEGER NOT NULL,
+        criado_em TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+        dados BLOB NOT NULL,
+        PRIMARY KEY (ano_mes, evento_id)
+    ) WITHOUT ROWID;
+
+    -- Último evento já considerado pela compactação
+    CREATE TABLE IF NOT EXISTS eventos_compactacao (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        evento_id INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO eventos_compactacao (id, evento_id) VALUES (1, 0);
+""" + _triggers("entradas") + _triggers("saidas")
+
+
+def create_eventos(cursor):
+    """
+    Cria o histórico, os snapshots e os triggers que registram os eventos
+    """
+    cursor.executescript(EVENTOS_SCHEMA)
+
+
+def _linhas_atuais(conn, ano_mes):
+    linhas = {}
+    for tabela, colunas in COLUNAS.items():
+        cursor = conn.execute(
+            f"SELECT {', '.join(colunas)} FROM {tabela} WHERE {COLUNA_DATA[tabela]} BETWEEN ? AND ?",
+            (f"{ano_mes}-01", f"{ano_mes}-31")
+        )
+        for row in cursor:
+            linhas[(tabela, row[0])] = dict(zip(colunas, row))
+    return linhas
+
+
+def gravar_snapshot(conn, ano_mes, evento_id):
+    """
+    Guarda as linhas atuais do mês como snapshot no evento `evento_id` (o
+    último já gravado); sem commit
+    """
+    por_tabela = {tabela: [] for tabela in COLUNAS}
+    for (tabela, _), linha in _linhas_atuais(conn, ano_mes).items():
+        por_tabela[tabela].append([linha[c] for c in COLUNAS[tabela]])
+    dados = {tabela: {"colunas": COLUNAS[tabela], "linhas": linhas} for tabela, linhas in por_tabela.items()}
+    conn.execute(
+        "INSERT OR REPLACE INTO snapshots (ano_mes, evento_id, dados) VALUES (?, ?, ?)",
+        (ano_mes, evento_id, zlib.compress(dumps(dados)))
+    )
+
+
+def _ler_snapshot(dados):
+    linhas = {}
+    for tabela, bloco in json.loads(zlib.decompress(dados)).items():
+        for valores in bloco["linhas"]:
+            linha = dict(zip(bloco["colunas"], valores))
+            linhas[(tabela, linha["id"])] = linha
+    return linhas
+
+
+# Eventos que tocam o mês (a linha estava ou ficou nele), entre dois eventos
+EVENTOS_DO_MES = """
+    FROM eventos
+    WHERE id > ? AND id <= ? AND (mes = ? OR mes_anterior = ?)
+"""
+
+
+def _publica(linha):
+    return {c: v for c, v in linha.items() if c not in COLUNAS_INTERNAS}
+
+
+def _contar(conn, ano_mes, de, ate):
+    return conn.execute(f"SELECT COUNT(*) {EVENTOS_DO_MES}", (de, ate, ano_mes, ano_mes)).fetchone()[0]
+
+
+def compactar(conn, minimo=SNAPSHOT_EVENTOS):
+    """
+    Grava um snapshot de cada mês com `minimo` eventos (ou tantos quanto o mês
+    tem de linhas, se for mais) desde o seu último snapshot. Os meses só são
+    conferidos quando o histórico cresceu `minimo`
+    eventos desde a última conferência, então depois da maioria das escritas
+    isto custa duas leituras. Roda na thread de escrita depois de cada escrita;
+    devolve quantos snapshots gravou.
+    """
+    conferido = conn.execute("SELECT evento_id FROM eventos_compactacao").fetchone()[0]
+    if conn.execute("SELECT IFNULL(MAX(id), 0) FROM eventos").fetchone()[0] - conferido < minimo:
+        return 0
+
+    gravados = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ultimo = conn.execute("SELECT IFNULL(MAX(id), 0) FROM eventos").fetchone()[0]
+        meses = [row[0] for row in conn.execute("""
+            SELECT mes FROM eventos WHERE id > ? AND mes IS NOT NULL
+            UNION
+            SELECT mes_anterior FROM eventos WHERE id > ? AND mes_anterior IS NOT NULL
+        """, (conferido, conferido))]
+        for ano_mes in meses:
+            anterior = conn.execute(
+                "SELECT IFNULL(MAX(evento_id), 0) FROM snapshots WHERE ano_mes = ?", (ano_mes,)
+            ).fetchone()[0]
+            linhas = conn.execute(
+                "SELECT qtd_entradas + qtd_saidas FROM resumo_mensal WHERE ano_mes = ?", (ano_mes,)
+            ).fetchone()
+            if _contar(conn, ano_mes, anterior, ultimo) >= max(minimo, linhas[0] if linhas else 0):
+                gravar_snapshot(conn, ano_mes, ultimo)
+                gravados += 1
+        conn.execute("UPDATE eventos_compactacao SET evento_id = ?", (ultimo,))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return gravados
+
+
+def evento_no_momento(conn, momento):
+    """
+    Último evento registrado até `momento` (datetime; sem fuso vale o horário
+    local), ou 0 se não há eventos até lá
+    """
+    limite = momento.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:23]
+    row = conn.execute(
+        "SELECT id FROM eventos WHERE momento <= ? ORDER BY momento DESC, id DESC LIMIT 1", (limite,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def parse_momento(texto):
+    """
+    Data e hora ISO ('2025-10-14T18:30', com ou sem fuso); uma data sozinha
+    vale o fim daquele dia
+    """
+    try:
+        momento = datetime.fromisoformat(texto)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Momento inválido, use YYYY-MM-DD ou YYYY-MM-DDTHH:MM")
+    if len(texto) == 10:
+        momento = datetime.combine(momento.date(), dt_time.max)
+    return momento
+
+
+def _aplicar(linhas, evento, ano_mes, lado):
+    """
+    Aplica um evento às linhas do mês: com lado="depois" o evento é refeito,
+    com lado="antes" é desfeito
+    """
+    linhas.pop((evento["tabela"], evento["linha_id"]), None)
+    imagem = evento[lado]
+    if imagem is None:
+        return
+    if lado == "depois":
+        mes = evento["mes"]
+    else:
+        mes = evento["mes_anterior"] or evento["mes"]
+    if mes == ano_mes:
+        linhas[(evento["tabela"], evento["linha_id"])] = json.loads(imagem)
+
+
+def get_mes_em(conn, ano_mes, evento_id):
+    """
+    Entradas e saídas do mês 'YYYY-MM' como estavam logo depois do evento
+    `evento_id`. Parte do snapshot anterior mais próximo ou das tabelas
+    atuais, o que exigir aplicar menos eventos.
+    """
+    # Tudo numa só transação de leitura, para tabelas e eventos concordarem
+    conn.execute("BEGIN")
+    try:
+        ultimo = conn.execute("SELECT IFNULL(MAX(id), 0) FROM eventos").fetchone()[0]
+        evento_id = min(evento_id, ultimo)
+        snapshot = conn.execute("""
+            SELECT evento_id, dados FROM snapshots
+            WHERE ano_mes = ? AND evento_id <= ?
+            ORDER BY evento_id DESC LIMIT 1
+        """, (ano_mes, evento_id)).fetchone()
+        desfazer = _contar(conn, ano_mes, evento_id, ultimo)
+
+        if snapshot is not None and _contar(conn, ano_mes, snapshot[0], evento_id) < desfazer:
+            base = {"snapshot": snapshot[0]}
+            linhas = _ler_snapshot(snapshot[1])
+            de, ate, ordem, lado = snapshot[0], evento_id, "ASC", "depois"
+        else:
+            base = {"atual": ultimo}
+            linhas = _linhas_atuais(conn, ano_mes)
+            de, ate, ordem, lado = evento_id, ultimo, "DESC", "antes"
+
+        aplicados = 0
+        cursor = conn.execute(
+            f"SELECT tabela, linha_id, mes, mes_anterior, antes, depois {EVENTOS_DO_MES} ORDER BY id {ordem}",
+            (de, ate, ano_mes, ano_mes)
+        )
+        for evento in cursor:
+            _aplicar(linhas, evento, ano_mes, lado)
+            aplicados += 1
+    finally:
+        conn.rollback()
+
+    resultado = {"ano_mes": ano_mes, "evento_id": evento_id, "base": base, "eventos_aplicados": aplicados}
+    for tabela, coluna_data in COLUNA_DATA.items():
+        resultado[tabela] = sorted(
+            (_publica(linha) for (t, _), linha in linhas.items() if t == tabela),
+            key=lambda linha: (linha[coluna_data] or "", linha["id"])
+        )
+    return resultado
+
+
+def get_eventos(conn, tabela=None, linha_id=None, antes_de=None, limit=100):
+    """
+    Eventos do mais recente para o mais antigo, paginados pelo id
+    (antes_de = menor id da página anterior)
+    """
+    where, params = [], []
+    if tabela:
+        where.append("tabela = ?")
+        params.append(tabela)
+    if linha_id is not None:
+        where.append("linha_id = ?")
+        params.append(linha_id)
+    if antes_de is not None:
+        where.append("id < ?")
+        params.append(antes_de)
+    cursor = conn.execute(f"""
+        SELECT id, momento, tabela, linha_id, operacao, antes, depois FROM eventos
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY id DESC LIMIT ?
+    """, (*params, limit))
+    eventos = []
+    for row in cursor:
+        evento = dict(row)
+        for lado in ("antes", "depois"):
+            if evento[lado] is not None:
+                evento[lado] = _publica(json.loads(evento[lado]))
+        eventos.append(evento)
+    return eventos
+
+
+def desfazer(conn, evento_id):
+    """
+    Desfaz um evento voltando a linha para como estava antes dele (remove o
+    que foi incluído, inclui de novo o que foi removido). Só vale para o último
+    evento da linha; a própria reversão fica registrada como um evento novo.
+    """
+    with conn:
+        evento = conn.execute(
+            "SELECT tabela, linha_id, operacao, antes FROM eventos WHERE id = ?", (evento_id,)
+        ).fetchone()
+        if evento is None:
+            raise HTTPException(status_code=404, detail="Evento não encontrado")
+        tabela, linha_id = evento["tabela"], evento["linha_id"]
+        posterior = conn.execute(
+            "SELECT id FROM eventos WHERE tabela = ? AND linha_id = ? AND id > ? LIMIT 1",
+            (tabela, linha_id, evento_id)
+        ).fetchone()
+        if posterior is not None:
+            raise HTTPException(
+                status_code=409,
+                detail=f"A linha foi alterada depois deste evento (evento {posterior[0]})"
+            )
+
+        if evento["operacao"] == "insert":
+            conn.execute(f"DELETE FROM {tabela} WHERE id = ?", (linha_id,))
+            return
+        antes = json.loads(evento["antes"])
+        colunas = COLUNAS[tabela]
+        if evento["operacao"] == "delete":
+            try:
+                conn.execute(
+                    f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+                    [antes[c] for c in colunas]
+                )
+            except sqlite3.IntegrityError:
+                raise HTTPException(status_code=409, detail="A linha removida já foi incluída de novo")
+        else:
+            conn.execute(
+                f"UPDATE {tabela} SET {', '.join(f'{c} = ?' for c in colunas if c != 'id')} WHERE id = ?",
+                [antes[c] for c in colunas if c != "id"] + [linha_id]
+            )
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DB_PATH)
+    print(f"Snapshots gravados: {compactar(conn, minimo=1)}")
+    conn.close()
@@ -0,0 +1,313 @@
+"""
+Exportação, backup e restauração do banco.
+
+Há dois formatos:
+
+- sqlite: cópia do arquivo do banco pela API de backup online do SQLite. A
+  cópia é feita numa única transação de leitura, então é consistente mesmo
+  com o uvicorn gravando ao mesmo tempo (em WAL as escritas não esperam por
+  ela), e sai em modo de journal normal, pronta para ser aberta.
+- colunas: dump compacto, NDJSON comprimido com gzip. A primeira linha é um
+  cabeçalho com a versão do schema e as tabelas; depois, cada tabela vem em
+  blocos de até TAMANHO_BLOCO linhas com um array por coluna (valor, datas,
+  flags...), o que comprime bem melhor que linha a linha. Os números saem
+  com 15 dígitos significativos, mais que suficiente para valores em
+  centavos. A última linha traz o total de linhas de cada tabela, para
+  detectar arquivos truncados. Gerado e lido em fluxo: a memória usada é a
+  de um bloco, qualquer que seja o tamanho do banco.
+
+A restauração do dump colunar substitui, numa única transação, o conteúdo das
+tabelas presentes no arquivo. Triggers e índices dessas tabelas são removidos
+durante a carga e recriados no final, junto com o resumo mensal, os índices
+de busca e as categorias que o dump não trouxer. O histórico de eventos e o
+registro de saídas recorrentes excluídas são sempre substituídos (pelos do
+dump, se houver); os snapshots são descartados.
+
+Uso pela linha de comando:
+    python backend/exportacao.py backup copia.sqlite3
+    python backend/exportacao.py exportar dump.ndjson.gz
+    python backend/exportacao.py restaurar dump.ndjson.gz
+"""
+import argparse
+import json
+import sqlite3
+import zlib
+from datetime import datetime
+from busca import rebuild_busca
+from categorias import TAMANHO_LOTE, classificar
+from db_pool import DB_PATH, connect
+from json_rapido import dumps
+from migrate_db import versao_do_banco
+from resumo import rebuild_resumo_mensal
+
+FORMATO = "gastos-colunas"
+VERSAO_FORMATO = 1
+# Linhas por bloco do dump colunar
+TAMANHO_BLOCO = 10000
+# gzip rápido: no nível padrão (6) a compressão levava mais tempo que ler o
+# banco, para um arquivo só ~25% menor
+NIVEL_COMPRESSAO = 1
+# Tabelas com dados do usuário, na ordem do dump; resumo, busca e snapshots
+# são derivados e recalculados na restauração
+TABELAS = ("grupos_parcela", "entradas", "saidas", "recorrencias", "recorrencias_meses",
+           "recorrencias_excluidas", "categorias", "regras_categoria", "eventos")
+
+
+class ErroRestauracao(ValueError):
+    pass
+
+
+def backup_sqlite(conn, destino):
+    """
+    Copia o banco da conexão para o arquivo `destino` pela API de backup
+    """
+    copia = sqlite3.connect(destino)
+    try:
+        # Tudo num passo só: uma única transação de leitura, então a cópia é consistente
+        conn.backup(copia)
+        copia.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        copia.close()
+
+
+def _colunas(conn, tabela):
+    """
+    Colunas gravadas da tabela (table_info omite as geradas) e a chave
+    inteira (rowid) pela qual ela é lida em blocos, se houver
+    """
+    info = conn.execute(f"PRAGMA table_info({tabela})").fetchall()
+    colunas = [coluna[1] for coluna in info]
+    chaves = [coluna for coluna in info if coluna[5]]
+    chave = chaves[0][1] if len(chaves) == 1 and chaves[0][2].upper() == "INTEGER" else None
+    return colunas, chave
+
+
+def _tabelas_existentes(conn):
+    existentes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [tabela for tabela in TABELAS if tabela in existentes]
+
+
+def _blocos(conn, tabela, colunas, chave, tamanho_bloco):
+    """
+    Arrays JSON das colunas da tabela, um texto por bloco. O próprio SQLite
+    monta os arrays (json_group_array), sem criar um objeto Python por valor;
+    os blocos são faixas da chave com tamanho_bloco linhas cada.
+    """
+    arrays = ", ".join(f"json_group_array({coluna})" for coluna in colunas)
+    if chave is None:
+        # Tabelas sem chave inteira são só de controle, pequenas: um bloco só
+        linhas, dados = conn.execute(f"SELECT count(*), json_array({arrays}) FROM {tabela}").fetchone()
+        if linhas:
+            yield linhas, dados
+        return
+    inicio = conn.execute(f"SELECT IFNULL(MIN({chave}), 0) - 1 FROM {tabela}").fetchone()[0]
+    while True:
+        fim = conn.execute(f"""
+            SELECT {chave} FROM {tabela} WHERE {chave} > ? ORDER BY {chave} LIMIT 1 OFFSET ?
+        """, (inicio, tamanho_bloco - 1)).fetchone()
+        ate = f"AND {chave} <= {fim[0]:d}" if fim else ""
+        linhas, dados = conn.execute(f"""
+            SELECT count(*), json_array({arrays}) FROM {tabela} WHERE {chave} > ? {ate}
+        """, (inicio,)).fetchone()
+        if linhas:
+            yield linhas, dados
+        if fim is None:
+            return
+        inicio = fim[0]
+
+
+def exportar_colunas(conn, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Gera o dump colunar (bytes já comprimidos), a partir de um único snapshot
+    de leitura do banco
+    """
+    gzip = zlib.compressobj(NIVEL_COMPRESSAO, zlib.DEFLATED, 31)
+
+    conn.execute("BEGIN")
+    try:
+        tabelas = _tabelas_existentes(conn)
+        yield gzip.compress(dumps({
+            "formato": FORMATO, "versao": VERSAO_FORMATO, "schema": versao_do_banco(conn),
+            "criado_em": datetime.now().isoformat(timespec="seconds"), "tabelas": tabelas,
+        }) + b"\n")
+        totais = {}
+        for tabela in tabelas:
+            colunas, chave = _colunas(conn, tabela)
+            inicio_quadro = dumps({"tabela": tabela, "colunas": colunas})[:-1] + b', "dados": '
+            totais[tabela] = 0
+            for linhas, dados in _blocos(conn, tabela, colunas, chave, tamanho_bloco):
+                totais[tabela] += linhas
+                parte = gzip.compress(inicio_quadro + dados.encode() + b"}\n")
+                if parte:
+                    yield parte
+        yield gzip.compress(dumps({"fim": totais}) + b"\n") + gzip.flush()
+    finally:
+        conn.rollback()
+
+
+def _ler_linhas(partes):
+    """
+    Linhas JSON do dump, descomprimidas à medida que os pedaços chegam
+    """
+    gzip = zlib.decompressobj(wbits=31)
+    resto = b""
+    try:
+        for parte in partes:
+            resto += gzip.decompress(parte)
+            *linhas, resto = resto.split(b"\n")
+            for linha in linhas:
+                if linha:
+                    yield json.loads(linha)
+        resto += gzip.flush()
+        if resto.strip():
+            yield json.loads(resto)
+    except (zlib.error, ValueError) as e:
+        raise ErroRestauracao(f"Arquivo inválido: {e}")
+
+
+def _desmontar(conn, tabelas):
+    """
+    Remove índices e triggers das tabelas, devolvendo o SQL para recriá-los
+    """
+    marcadores = ", ".join("?" * len(tabelas))
+    objetos = conn.execute(f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN ({marcadores})
+        ORDER BY type
+    """, tabelas).fetchall()
+    for tipo, nome, _ in objetos:
+        conn.execute(f"DROP {tipo.upper()} {nome}")
+    return [sql for _, _, sql in objetos]
+
+
+def _inteiro(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _validar_cabecalho(cabecalho):
+    if not isinstance(cabecalho, dict) or cabecalho.get("formato") != FORMATO:
+        raise ErroRestauracao("O arquivo não é um dump colunar")
+    tabelas = cabecalho.get("tabelas", [])
+    if (not _inteiro(cabecalho.get("versao")) or not _inteiro(cabecalho.get("schema", 0))
+            or not isinstance(tabelas, list) or not all(isinstance(t, str) for t in tabelas)):
+        raise ErroRestauracao("Cabeçalho do dump inválido")
+
+
+def _validar_quadro(quadro):
+    """
+    Um bloco de tabela: colunas (nomes) e um array de valores por coluna,
+    todos do mesmo tamanho; ou o final, com o total de linhas por tabela
+    """
+    if not isinstance(quadro, dict):
+        raise ErroRestauracao("Bloco do dump inválido")
+    if "fim" in quadro:
+        if not isinstance(quadro["fim"], dict):
+            raise ErroRestauracao("Final do dump inválido")
+        return
+    colunas, dados = quadro.get("colunas"), quadro.get("dados")
+    if (not isinstance(quadro.get("tabela"), str) or not isinstance(colunas, list)
+            or not all(isinstance(coluna, str) for coluna in colunas)
+            or not isinstance(dados, list) or len(dados) != len(colunas)
+            or not all(isinstance(valores, list) for valores in dados)
+            or len({len(valores) for valores in dados}) > 1):
+        raise ErroRestauracao(f"Bloco do dump inválido ({quadro.get('tabela')!r})")
+
+
+def restaurar_colunas(conn, partes):
+    """
+    Substitui as tabelas presentes no dump pelo seu conteúdo, numa única
+    transação. `partes` são os bytes do arquivo, em pedaços de qualquer
+    tamanho. Devolve o número de linhas restauradas por tabela.
+    """
+    linhas = _ler_linhas(partes)
+    cabecalho = next(linhas, None)
+    _validar_cabecalho(cabecalho)
+    if cabecalho["versao"] > VERSAO_FORMATO or cabecalho.get("schema", 0) > versao_do_banco(conn):
+        raise ErroRestauracao("O dump é de uma versão mais nova da aplicação")
+
+    existentes = _tabelas_existentes(conn)
+    tabelas = [tabela for tabela in cabecalho.get("tabelas", []) if tabela in existentes]
+    # O histórico e as saídas recorrentes excluídas descrevem as linhas
+    # substituídas, então são sempre trocados
+    substituidas = list(dict.fromkeys(tabelas + ["recorrencias_excluidas", "eventos"]))
+    colunas_atuais = {tabela: set(_colunas(conn, tabela)[0]) for tabela in tabelas}
+    colunas_saidas = set()
+    restauradas = {tabela: 0 for tabela in tabelas}
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        recriar = _desmontar(conn, substituidas)
+        for tabela in substituidas:
+            conn.execute(f"DELETE FROM {tabela}")
+        conn.execute("DELETE FROM snapshots")
+
+        for quadro in linhas:
+            _validar_quadro(quadro)
+            if "fim" in quadro:
+                if {t: quadro["fim"].get(t) for t in restauradas} != restauradas:
+                    raise ErroRestauracao("O total de linhas não confere com o dump")
+                break
+            tabela = quadro.get("tabela")
+            if tabela not in restauradas:
+                continue
+            dados = quadro["dados"]
+            usadas = [i for i, coluna in enumerate(quadro["colunas"]) if coluna in colunas_atuais[tabela]]
+            nomes = [quadro["colunas"][i] for i in usadas]
+            if tabela == "saidas":
+                colunas_saidas.update(nomes)
+            cursor = conn.executemany(
+                f"INSERT INTO {tabela} ({', '.join(nomes)}) VALUES ({', '.join('?' * len(nomes))})",
+                zip(*(dados[i] for i in usadas))
+            )
+            restauradas[tabela] += cursor.rowcount
+        else:
+            raise ErroRestauracao("Dump incompleto: falta o final do arquivo")
+
+        # Dumps de antes das categorias: classificar antes de recriar o índice
+        if "saidas" in restauradas and "categoria_id" not in colunas_saidas:
+            maior = conn.execute("SELECT IFNULL(MAX(id), 0) FROM saidas").fetchone()[0]
+            for inicio in range(0, maior, TAMANHO_LOTE):
+                classificar(conn, "saidas.id > ? AND saidas.id <= ?", (inicio, inicio + TAMANHO_LOTE))
+
+        for sql in recriar:
+            conn.execute(sql)
+        rebuild_resumo_mensal(conn, commit=False)
+        rebuild_busca(conn, commit=False)
+        conn.execute("UPDATE eventos_compactacao SET evento_id = (SELECT IFNULL(MAX(id), 0) FROM eventos)")
+        conn.commit()
+    except (sqlite3.IntegrityError, sqlite3.ProgrammingError) as e:
+        # Linhas que violam chaves ou índices únicos (ao inserir ou ao recriar
+        # os índices) ou com valores que não são escalares
+        conn.rollback()
+        raise ErroRestauracao(f"O dump tem linhas inválidas: {e}")
+    except BaseException:
+        conn.rollback()
+        raise
+    return restauradas
+
+
+def ler_em_pedacos(arquivo, tamanho=1024 * 1024):
+    return iter(lambda: arquivo.read(tamanho), b"")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backup, exportação e restauração do banco")
+    parser.add_argument("comando", choices=("backup", "exportar", "restaurar"))
+    parser.add_argument("arquivo")
+    args = parser.parse_args()
+
+    from database import init_db
+
+    conn = connect(DB_PATH)
+    init_db(conn)
+    if args.comando == "backup":
+        backup_sqlite(conn, args.arquivo)
+    elif args.comando == "exportar":
+        with open(args.arquivo, "wb") as arquivo:
+            for parte in exportar_colunas(conn):
+                arquivo.write(parte)
+    else:
+        with open(args.arquivo, "rb") as arquivo:
+            restauradas = restaurar_colunas(conn, ler_em_pedacos(arquivo))
+        print(", ".join(f"{tabela}: {linhas}" for tabela, linhas in restauradas.items()))
+    conn.close()
@@ -0,0 +1,89 @@
+from fastapi import HTTPException
+
+# Flags conhecidas e seus bits na coluna saidas.flags_mask.
+# "parc" representa qualquer flag de parcelamento (parc2, parc3, parc10...).
+FLAGS = {
+    "urg": 1,
+    "feito": 2,
+    "no_rec": 4,
+    "parc": 8,
+}
+TODOS_OS_BITS = sum(FLAGS.values())
+
+# Expressão da coluna gerada flags_mask, calculada a partir do texto de flags.
+# As vírgulas nas pontas evitam falsos positivos (ex: "refeito" não é "feito").
+FLAGS_MASK_SQL = """(
+    (CASE WHEN (',' || flags || ',') LIKE '%,urg,%' THEN 1 ELSE 0 END) |
+    (CASE WHEN (',' || flags || ',') LIKE '%,feito,%' THEN 2 ELSE 0 END) |
+    (CASE WHEN (',' || flags || ',') LIKE '%,no_rec,%' THEN 4 ELSE 0 END) |
+    (CASE WHEN (',' || flags || ',') LIKE '%,parc%' THEN 8 ELSE 0 END)
+)"""
+
+FLAGS_MASK_COLUMN = f"flags_mask INTEGER GENERATED ALWAYS AS {FLAGS_MASK_SQL} VIRTUAL"
+
+
+def parse_flag_filter(valores):
+    """
+    Interpreta os parâmetros ?flag=urg&flag=!feito em (bits exigidos, bits proibidos)
+    """
+    exigidos = 0
+    proibidos = 0
+    for valor in valores or []:
+        negado = valor.startswith("!")
+        nome = valor[1:] if negado else valor
+        if nome not in FLAGS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Flag desconhecida: {nome}. Use uma de: {', '.join(FLAGS)}"
+            )
+        if negado:
+            proibidos |= FLAGS[nome]
+        else:
+            exigidos |= FLAGS[nome]
+    return exigidos, proibidos
+
+
+def masks_matching(exigidos, proibidos):
+    """
+    Lista todos os valores de flags_mask que satisfazem o filtro. Como há poucos
+    bits, a condição vira um "flags_mask IN (...)" que usa o índice diretamente.
+    """
+    return [
+        mask for mask in range(TODOS_OS_BITS + 1)
+        if mask & exigidos == exigidos and mask & proibidos == 0
+    ]
+
+
+def flag_filter_sql(valores):
+    """
+    Retorna (cláusula SQL, parâmetros) para o filtro de flags, ou (None, []) se vazio
+    """
+    exigidos, proibidos = parse_flag_filter(valores)
+    if not exigidos and not proibidos:
+        return None, []
+    masks = masks_matching(exigidos, proibidos)
+    placeholders = ", ".join("?" for _ in masks)
+    return f"flags_mask IN ({placeholders})", masks
+
+
+def validar_alteracao_flags(adicionar, remover):
+    """
+    Confere as flags a adicionar e a remover (só as conhecidas, exceto parc,
+    que é controlada pelo parcelamento) e devolve as duas listas sem repetições
+    """
+    for nome in list(adicionar) + list(remover):
+        if nome not in FLAGS or nome == "parc":
+            raise HTTPException(
+                status_code=400,
+                detail=f"Flag inválida: {nome}. Use uma de: {', '.join(f for f in FLAGS if f != 'parc')}"
+            )
+    return list(dict.fromkeys(adicionar)), list(dict.fromkeys(remover))
+
+
+def alterar_flags(flags, adicionar, remover):
+    """
+    Novo texto de flags depois de remover e adicionar as flags informadas
+    ("urg,parc6" + feito - urg = "parc6,feito")
+    """
+    atuais = [flag for flag in (flags or "").split(",") if flag and flag not in remover]
+    return ",".join(atuais + [nome for nome in adicionar if nome not in atuais])
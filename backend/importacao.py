@@ -0,0 +1,279 @@
+"""
+Importação em lote de extratos bancários (CSV ou OFX).
+
+O arquivo é lido linha a linha por geradores, cada registro é validado pelos
+modelos Entrada/Saida e gravado em lotes com executemany, um lote por
+transação. Registros repetidos (mesmo conteúdo já importado antes) são
+ignorados pelo hash de conteúdo, então reimportar o mesmo extrato é seguro.
+Fora a contagem de ocorrências de cada conteúdo (um hash por registro
+distinto), a memória usada não depende do tamanho do arquivo.
+
+Uso pela linha de comando:
+    python backend/importacao.py extrato.csv
+    python backend/importacao.py extrato.ofx --formato ofx
+"""
+import argparse
+import csv
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from pydantic import ValidationError
+from db_pool import DB_PATH
+from models import Entrada, Saida
+
+TAMANHO_LOTE = 500
+
+# Nomes de coluna aceitos no CSV (sem acentos, minúsculos)
+COLUNAS_CSV = {
+    "nome": ("nome", "descricao", "historico", "lancamento", "memo"),
+    "valor": ("valor", "amount", "quantia"),
+    "data": ("data", "date", "data_vencimento", "vencimento"),
+    "tipo": ("tipo", "type"),
+    "status": ("status",),
+    "flags": ("flags",),
+}
+
+
+class ErroImportacao(ValueError):
+    pass
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFKD", texto.strip().lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def parse_valor(texto):
+    """
+    Converte "1.234,56", "-50,00" ou "1234.56" em float
+    """
+    texto = texto.strip().replace("R$", "").replace(" ", "")
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    try:
+        valor = float(texto)
+    except ValueError:
+        raise ErroImportacao(f"valor inválido: {texto!r}")
+    # float() também aceita "nan", "inf" e "1e309"
+    if not math.isfinite(valor):
+        raise ErroImportacao(f"valor inválido: {texto!r}")
+    return valor
+
+
+def parse_data(texto):
+    """
+    Aceita YYYY-MM-DD, DD/MM/YYYY e YYYYMMDD (OFX) e devolve YYYY-MM-DD
+    """
+    texto = texto.strip()
+    for formato, tamanho in (("%Y-%m-%d", 10), ("%d/%m/%Y", 10), ("%Y%m%d", 8)):
+        try:
+            return datetime.strptime(texto[:tamanho], formato).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ErroImportacao(f"data inválida: {texto!r}")
+
+
+def parse_csv(linhas):
+    """
+    Gera (número da linha, campos) para cada linha de dados do CSV.
+    Aceita separador vírgula ou ponto e vírgula, detectado pelo cabeçalho.
+    """
+    linhas = iter(linhas)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        return
+    delimitador = ";" if cabecalho.count(";") > cabecalho.count(",") else ","
+    nomes = [_normalizar(c) for c in next(csv.reader([cabecalho], delimiter=delimitador))]
+
+    indices = {}
+    for campo, aliases in COLUNAS_CSV.items():
+        for i, nome in enumerate(nomes):
+            if nome in aliases:
+                indices[campo] = i
+                break
+    faltando = [c for c in ("nome", "valor", "data") if c not in indices]
+    if faltando:
+        raise ErroImportacao(f"colunas obrigatórias ausentes no cabeçalho: {', '.join(faltando)}")
+
+    leitor = csv.reader(linhas, delimiter=delimitador)
+    for numero, valores in enumerate(leitor, start=2):
+        if not any(v.strip() for v in valores):
+            continue
+        yield numero, {campo: valores[i] if i < len(valores) else "" for campo, i in indices.items()}
+
+
+def parse_ofx(linhas):
+    """
+    Gera (número da linha, campos) para cada <STMTTRN> de um arquivo OFX,
+    lendo as tags uma linha por vez (funciona com OFX SGML e XML)
+    """
+    atual = None
+    inicio = 0
+    tag_re = re.compile(r"<(/?)(\w+)>([^<\r\n]*)")
+    for numero, linha in enumerate(linhas, start=1):
+        for fechando, tag, valor in tag_re.findall(linha):
+            tag = tag.upper()
+            if tag == "STMTTRN" and not fechando:
+                atual, inicio = {}, numero
+            elif tag == "STMTTRN" and fechando:
+                if atual is not None:
+                    yield inicio, {
+                        "nome": atual.get("MEMO") or atual.get("NAME", ""),
+                        "valor": atual.get("TRNAMT", ""),
+                        "data": atual.get("DTPOSTED", ""),
+                        "id_externo": atual.get("FITID"),
+                    }
+                atual = None
+            elif atual is not None and not fechando and valor.strip():
+                atual[tag] = valor.strip()
+
+
+def to_registro(campos):
+    """
+    Converte os campos brutos de uma linha em (tabela, modelo validado).
+    Sem coluna "tipo", valores negativos são saídas e positivos são entradas.
+    """
+    valor = parse_valor(campos["valor"])
+    data = parse_data(campos["data"])
+    tipo = _normalizar(campos.get("tipo") or "")
+    if tipo not in ("", "entrada", "saida"):
+        raise ErroImportacao(f"tipo inválido: {campos['tipo']!r}")
+    if not tipo:
+        tipo = "saida" if valor < 0 else "entrada"
+
+    nome = campos["nome"].strip()
+    if tipo == "entrada":
+        return "entradas", Entrada(nome=nome, valor=abs(valor), status=campos.get("status") or "recebido", data=data)
+    return "saidas", Saida(nome=nome, valor=abs(valor), flags=campos.get("flags") or "", data_vencimento=data)
+
+
+def conteudo(tabela, modelo):
+    return f"{tabela}|{json.dumps(modelo.model_dump(), sort_keys=True)}"
+
+
+def hash_conteudo(tabela, modelo, ocorrencia, id_externo=None):
+    """
+    Hash usado para deduplicar. Usa o identificador do banco (FITID) quando
+    existe; senão o conteúdo mais o número da ocorrência entre as linhas
+    idênticas do arquivo (duas compras iguais no mesmo dia continuam sendo
+    duas, estejam ou não em linhas seguidas).
+    """
+    if id_externo:
+        chave = f"{tabela}|id|{id_externo}"
+    else:
+        chave = f"{conteudo(tabela, modelo)}|{ocorrencia}"
+    return hashlib.sha1(chave.encode()).hexdigest()
+
+
+def registros(linhas, formato):
+    """
+    Gera (número da linha, tabela, modelo, hash) ou (número da linha, None, erro, None)
+    """
+    parser = parse_ofx if formato == "ofx" else parse_csv
+    # Ocorrências de cada conteúdo no arquivo, pelo hash do conteúdo para ocupar pouco
+    ocorrencias = Counter()
+    for numero, campos in parser(linhas):
+        try:
+            tabela, modelo = to_registro(campos)
+        except (ErroImportacao, ValidationError) as e:
+            yield numero, None, str(e), None
+            continue
+        ocorrencia = 0
+        if not campos.get("id_externo"):
+            chave = hashlib.sha1(conteudo(tabela, modelo).encode()).digest()
+            ocorrencia = ocorrencias[chave]
+            ocorrencias[chave] += 1
+        yield numero, tabela, modelo, hash_conteudo(tabela, modelo, ocorrencia, campos.get("id_externo"))
+
+
+def _gravar_lote(conn, lote):
+    """
+    Grava um lote numa transação; devolve quantos registros eram novos
+    """
+    entradas = [
+        (m.nome, m.valor, m.status, m.data, h)
+        for tabela, m, h in lote if tabela == "entradas"
+    ]
+    saidas = [
+        (m.nome, m.valor, m.flags, m.data_vencimento, h)
+        for tabela, m, h in lote if tabela == "saidas"
+    ]
+    inseridas = 0
+    with conn:
+        cursor = conn.cursor()
+        if entradas:
+            cursor.executemany("""
+                INSERT OR IGNORE INTO entradas (nome, valor, status, data, hash_importacao)
+                VALUES (?, ?, ?, ?, ?)
+            """, entradas)
+            inseridas += cursor.rowcount
+        if saidas:
+            cursor.executemany("""
+                INSERT OR IGNORE INTO saidas (nome, valor, flags, data_vencimento, hash_importacao)
+                VALUES (?, ?, ?, ?, ?)
+            """, saidas)
+            inseridas += cursor.rowcount
+    return inseridas
+
+
+def importar(conn, linhas, formato="csv", tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa o extrato e gera eventos de andamento:
+      {"linha": n, "erro": "..."}                    para cada linha rejeitada
+      {"processadas": n, "inseridas": n, ...}        ao final de cada lote
+      {"resumo": {...}}                              no final
+    """
+    resumo = {"processadas": 0, "inseridas": 0, "duplicadas": 0, "erros": 0}
+    try:
+        fluxo = registros(linhas, formato)
+        while True:
+            bloco = list(islice(fluxo, tamanho_lote))
+            if not bloco:
+                break
+            lote = []
+            for numero, tabela, modelo, hash_ in bloco:
+                resumo["processadas"] += 1
+                if tabela is None:
+                    resumo["erros"] += 1
+                    yield {"linha": numero, "erro": modelo}
+                else:
+                    lote.append((tabela, modelo, hash_))
+            if lote:
+                inseridas = _gravar_lote(conn, lote)
+                resumo["inseridas"] += inseridas
+                resumo["duplicadas"] += len(lote) - inseridas
+            yield dict(resumo)
+    except ErroImportacao as e:
+        resumo["erros"] += 1
+        yield {"linha": 1, "erro": str(e)}
+    yield {"resumo": resumo}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa um extrato CSV ou OFX")
+    parser.add_argument("arquivo")
+    parser.add_argument("--formato", choices=("csv", "ofx"))
+    parser.add_argument("--encoding", default="utf-8-sig")
+    args = parser.parse_args()
+
+    from database import init_db
+
+    formato = args.formato or ("ofx" if args.arquivo.lower().endswith(".ofx") else "csv")
+    conn = sqlite3.connect(DB_PATH)
+    init_db(conn)
+    with open(args.arquivo, encoding=args.encoding, errors="replace", newline="") as arquivo:
+        for evento in importar(conn, arquivo, formato):
+            if "erro" in evento:
+                print(f"linha {evento['linha']}: {evento['erro']}")
+            elif "resumo" in evento:
+                r = evento["resumo"]
+                print(f"Concluído: {r['inseridas']} inseridas, {r['duplicadas']} duplicadas, {r['erros']} erros")
+            else:
+                print(f"... {evento['processadas']} linhas processadas")
+    conn.close()
@@ -0,0 +1,346 @@
+"""
+Vários inquilinos (famílias/usuários) num mesmo backend, cada um com seu
+próprio arquivo SQLite.
+
+Com TENANTS_DIR definido, cada requisição é atendida pelo banco
+<TENANTS_DIR>/<inquilino>.sqlite3. O inquilino vem do token de acesso
+(Authorization: Bearer <inquilino>.<assinatura>) quando TENANT_SECRET está
+definido, ou do cabeçalho X-Tenant quando não está (por exemplo atrás de um
+proxy que já autentica e preenche o cabeçalho). Sem TENANTS_DIR há um único
+banco, em DB_PATH, como antes.
+
+Cada inquilino tem seu pool de conexões, cache de respostas, thread de
+escrita e registro dos meses de recorrências já gerados; as threads de
+leitura são compartilhadas. O schema é criado/migrado na primeira vez que o
+inquilino é usado no processo, e os inquilinos abertos ficam num LRU de até
+MAX_TENANTS: o menos usado é fechado quando o limite é passado (depois que
+suas requisições e tarefas em segundo plano em andamento terminam).
+
+Nada é compartilhado entre processos além dos próprios arquivos, então vários
+workers do uvicorn podem atender o mesmo inquilino sem locks em comum: o
+SQLite em WAL cuida da concorrência e cada cache percebe as escritas dos
+outros processos por PRAGMA data_version (MonitorAlteracoes).
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import re
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, QueryParams
+from alteracoes import CanalAlteracoes
+from cache import ResponseCache
+from database import init_db
+from db_async import DB_READERS, DatabaseExecutor
+from db_pool import DB_PATH, DB_POOL_SIZE, ConnectionPool, MonitorAlteracoes
+from metricas import TimedConnection
+
+# Diretório dos bancos por inquilino; vazio = banco único em DB_PATH
+TENANTS_DIR = os.environ.get("TENANTS_DIR", "")
+# Máximo de inquilinos abertos ao mesmo tempo por processo
+MAX_TENANTS = int(os.environ.get("MAX_TENANTS", "32"))
+# Conexões por inquilino (o pool do banco único continua usando DB_POOL_SIZE)
+TENANT_POOL_SIZE = int(os.environ.get("TENANT_POOL_SIZE", "4"))
+# Segredo para assinar os tokens; sem ele vale o cabeçalho X-Tenant
+TENANT_SECRET = os.environ.get("TENANT_SECRET", "")
+TENANT_HEADER = "X-Tenant"
+
+# Nomes viram nomes de arquivo, então só letras minúsculas, dígitos, _ e -
+NOME_VALIDO = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+_atual = ContextVar("inquilino_atual", default=None)
+# Tarefas em segundo plano em andamento (referências fortes até terminarem)
+_tarefas = set()
+
+logger = logging.getLogger("inquilinos")
+
+
+def gerar_token(nome, segredo=None):
+    """
+    Token de acesso de um inquilino: "<nome>.<HMAC-SHA256 do nome>"
+    """
+    segredo = segredo or TENANT_SECRET
+    assinatura = hmac.new(segredo.encode(), nome.encode(), hashlib.sha256).hexdigest()[:32]
+    return f"{nome}.{assinatura}"
+
+
+def validar_token(token):
+    nome = token.rpartition(".")[0]
+    if not nome or not hmac.compare_digest(gerar_token(nome), token):
+        raise HTTPException(status_code=401, detail="Token de acesso inválido")
+    return nome
+
+
+class Inquilino:
+    """
+    Recursos de um banco: pool, cache, executor, meses de recorrências já
+    gerados, tarefas em segundo plano e o canal de alterações. Criar o
+    objeto aplica o schema (init_db) no arquivo.
+    """
+
+    def __init__(self, path, pool_size, leitura, apos_gravar=None):
+        self.path = path
+        self.pool = ConnectionPool(path, pool_size, factory=TimedConnection)
+        with self.pool.connection() as conn:
+            init_db(conn)
+        self.monitor = MonitorAlteracoes(path)
+        self.cache = ResponseCache(alterado=self.monitor)
+        self.db = DatabaseExecutor(self.pool, leitura=leitura, ao_gravar=self.cache.invalidar,
+                                   apos_gravar=apos_gravar)
+        self.meses_materializados = set()
+        self.tarefas = {}
+        self.alteracoes = CanalAlteracoes()
+        self.em_uso = 0
+        self.descartado = False
+
+    def liberar(self):
+        """
+        Encerra um uso (requisição ou tarefa); um inquilino descartado do LRU
+        é fechado quando o último uso termina
+        """
+        self.em_uso -= 1
+        if self.descartado and not self.em_uso:
+            asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self):
+        self.db.close()
+        self.pool.close()
+        self.monitor.close()
+
+
+class RegistroInquilinos:
+    """
+    Inquilinos abertos neste processo, do menos para o mais usado
+    recentemente. Só é usado a partir do event loop, por isso não tem locks.
+    """
+
+    def __init__(self, diretorio=TENANTS_DIR, max_abertos=MAX_TENANTS, pool_size=TENANT_POOL_SIZE,
+                 leitores=DB_READERS, apos_gravar=None):
+        self.diretorio = diretorio
+        self.max_abertos = max(1, max_abertos)
+        self.pool_size = pool_size
+        self.leitores = leitores
+        self.apos_gravar = apos_gravar
+        self._leitura = None
+        self._abertos = OrderedDict()
+        self._abrindo = {}
+
+    def identificar(self, headers, params=None):
+        """
+        Nome do inquilino da requisição (None no modo de banco único). Com
+        `params`, o token (ou o nome) também pode vir na URL, em ?token= ou
+        ?tenant=, para clientes que não enviam cabeçalhos, como o EventSource.
+        """
+        if not self.diretorio:
+            return None
+        params = params or {}
+        if TENANT_SECRET:
+            esquema, _, token = headers.get("authorization", "").partition(" ")
+            if not token and params.get("token"):
+                esquema, token = "bearer", params["token"]
+            if esquema.lower() != "bearer" or not token:
+                raise HTTPException(status_code=401, detail="Token de acesso não informado")
+            nome = validar_token(token.strip())
+        else:
+            nome = headers.get(TENANT_HEADER) or params.get("tenant")
+            if not nome:
+                raise HTTPException(status_code=400, detail=f"Cabeçalho {TENANT_HEADER} não informado")
+        if not NOME_VALIDO.match(nome):
+            raise HTTPException(status_code=400, detail="Nome de inquilino inválido")
+        return nome
+
+    def caminho(self, nome):
+        if nome is None:
+            return DB_PATH
+        return os.path.join(self.diretorio, f"{nome}.sqlite3")
+
+    def aberto(self, nome=None):
+        """
+        Inquilino já aberto neste processo, ou None
+        """
+        return self._abertos.get(nome)
+
+    def _abrir(self, nome):
+        if nome is None:
+            return Inquilino(DB_PATH, DB_POOL_SIZE, self._leitura, self.apos_gravar)
+        os.makedirs(self.diretorio, exist_ok=True)
+        return Inquilino(self.caminho(nome), self.pool_size, self._leitura, self.apos_gravar)
+
+    async def _obter(self, nome):
+        inquilino = self._abertos.get(nome)
+        if inquilino is not None:
+            self._abertos.move_to_end(nome)
+            return inquilino
+
+        # Requisições simultâneas do mesmo inquilino esperam a mesma abertura
+        tarefa = self._abrindo.get(nome)
+        if tarefa is None:
+            tarefa = self._abrindo[nome] = asyncio.ensure_future(asyncio.to_thread(self._abrir, nome))
+        try:
+            inquilino = await asyncio.shield(tarefa)
+        finally:
+            self._abrindo.pop(nome, None)
+
+        if nome not in self._abertos:
+            self._abertos[nome] = inquilino
+            while len(self._abertos) > self.max_abertos:
+                _, antigo = self._abertos.popitem(last=False)
+                antigo.descartado = True
+                if not antigo.em_uso:
+                    asyncio.get_running_loop().run_in_executor(None, antigo.close)
+        return self._abertos[nome]
+
+    @asynccontextmanager
+    async def usar(self, nome):
+        """
+        Torna o inquilino o atual enquanto a requisição estiver em andamento;
+        um inquilino descartado do LRU só é fechado quando ninguém o usa
+        """
+        inquilino = await self._obter(nome)
+        inquilino.em_uso += 1
+        token = _atual.set(inquilino)
+        try:
+            yield inquilino
+        finally:
+            _atual.reset(token)
+            inquilino.liberar()
+
+    async def iniciar(self):
+        self._leitura = ThreadPoolExecutor(max_workers=self.leitores, thread_name_prefix="db-leitura")
+        # O banco único continua sendo preparado na inicialização
+        if not self.diretorio:
+            await self._obter(None)
+
+    async def encerrar(self):
+        """
+        Cancela as tarefas em segundo plano e fecha tudo
+        """
+        for tarefa in list(_tarefas):
+            tarefa.cancel()
+        await asyncio.gather(*_tarefas, return_exceptions=True)
+        self.close()
+
+    def fechar_canais(self):
+        """
+        Encerra as conexões de /eventos/stream de todos os inquilinos
+        """
+        for inquilino in self._abertos.values():
+            inquilino.alteracoes.fechar()
+
+    def close(self):
+        for inquilino in self._abertos.values():
+            inquilino.close()
+        self._abertos.clear()
+        self._leitura.shutdown(wait=True)
+
+
+class InquilinoMiddleware:
+    """
+    Middleware ASGI que escolhe o inquilino de cada requisição. Fica ativo até
+    o fim do envio da resposta, inclusive das respostas em streaming.
+    Rotas em `livres` (por exemplo /metrics) não exigem inquilino; nas rotas
+    em `token_na_url` o token também é aceito na query string.
+    """
+
+    def __init__(self, app, registro, livres=(), token_na_url=()):
+        self.app = app
+        self.registro = registro
+        self.livres = set(livres)
+        self.token_na_url = set(token_na_url)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.livres:
+            await self.app(scope, receive, send)
+            return
+        try:
+            params = QueryParams(scope["query_string"]) if scope["path"] in self.token_na_url else None
+            nome = self.registro.identificar(Headers(scope=scope), params)
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code)
+            await response(scope, receive, send)
+            return
+        async with self.registro.usar(nome):
+            await self.app(scope, receive, send)
+
+
+def atual():
+    """
+    Inquilino da requisição em andamento
+    """
+    inquilino = _atual.get()
+    if inquilino is None:
+        raise RuntimeError("Nenhum inquilino ativo fora de uma requisição")
+    return inquilino
+
+
+def em_segundo_plano(nome, fabrica):
+    """
+    Roda a corrotina criada por fabrica() depois da requisição, com o inquilino
+    atual, que não é fechado antes de ela terminar. Roda uma por nome e por
+    inquilino: pedidos feitos enquanto ela está rodando fazem com que rode
+    mais uma vez ao terminar, em vez de rodarem em paralelo.
+    """
+    inquilino = atual()
+    estado = inquilino.tarefas.get(nome)
+    if estado is not None:
+        estado["repetir"] = True
+        return
+    estado = inquilino.tarefas[nome] = {"repetir": False}
+    inquilino.em_uso += 1
+
+    async def rodar():
+        try:
+            while True:
+                estado["repetir"] = False
+                try:
+                    await fabrica()
+                except Exception:
+                    logger.exception("falha na tarefa %s", nome)
+                if not estado["repetir"]:
+                    break
+        finally:
+            del inquilino.tarefas[nome]
+            inquilino.liberar()
+
+    tarefa = asyncio.create_task(rodar())
+    _tarefas.add(tarefa)
+    tarefa.add_done_callback(_tarefas.discard)
+
+
+def em_andamento(nome):
+    """
+    Se a tarefa em segundo plano `nome` do inquilino atual está rodando
+    """
+    return nome in atual().tarefas
+
+
+class _DoInquilino:
+    """
+    Atalho para um recurso (db, pool, cache) do inquilino atual, para que os
+    handlers continuem escrevendo db.read(...), pool.connection() etc.
+    """
+
+    def __init__(self, recurso):
+        self._recurso = recurso
+
+    def __getattr__(self, nome):
+        return getattr(getattr(atual(), self._recurso), nome)
+
+
+db = _DoInquilino("db")
+pool = _DoInquilino("pool")
+cache = _DoInquilino("cache")
+
+
+if __name__ == "__main__":
+    # python inquilinos.py <nome>: imprime o token de acesso do inquilino
+    if len(sys.argv) != 2 or not TENANT_SECRET or not NOME_VALIDO.match(sys.argv[1]):
+        sys.exit("Uso: TENANT_SECRET=... python inquilinos.py <nome>")
+    print(gerar_token(sys.argv[1]))
@@ -0,0 +1,52 @@
+"""
+Serialização JSON sem a validação do FastAPI.
+
+Quando um handler declara response_model=List[dict] e devolve a lista, o
+FastAPI valida cada linha com pydantic antes de serializar (e, em versões
+mais antigas, ainda passa tudo por jsonable_encoder). As linhas vindas do
+banco já têm tipos simples (int, float, str, None), então os handlers de
+listagem devolvem FastJSONResponse direto, que pula essas etapas. Se o
+orjson estiver instalado ele é usado; senão, o serializador em Rust do
+pydantic_core, que já vem com o FastAPI.
+"""
+from fastapi.responses import Response
+from pydantic_core import to_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(dados):
+    """
+    Serializa para bytes UTF-8, no mesmo formato compacto do FastAPI
+    """
+    if orjson is not None:
+        return orjson.dumps(dados)
+    return to_json(dados)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+def rows_to_dicts(cursor):
+    """
+    Linhas restantes do cursor como lista de dicts
+    """
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def rows_to_columns(cursor):
+    """
+    Linhas restantes do cursor em formato colunar compacto:
+    {"colunas": [...], "linhas": [[...], ...]}, sem repetir os nomes em cada linha
+    """
+    return {
+        "colunas": [coluna[0] for coluna in cursor.description],
+        "linhas": [tuple(row) for row in cursor.fetchall()],
+    }
@@ -1,12 +1,69 @@
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from typing import List, Optional
 import sqlite3
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+import os
 import re
-from datetime import datetime, timedelta
+import io
+import json
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+import metricas
+from metricas import registrar_etapa
+from json_rapido import FastJSONResponse, rows_to_columns, rows_to_dicts
+from inquilinos import (InquilinoMiddleware, RegistroInquilinos, atual, cache, db, em_andamento,
+                        em_segundo_plano, pool)
+from resumo import get_meses, get_resumo
+from flags import FLAGS, flag_filter_sql
+from parcelas import delete_grupo, insert_parcelas, update_grupo
+from models import Categoria, Entrada, GrupoParcelaUpdate, Recorrencia, RegraCategoria, Saida
+from importacao import importar
+from paginacao import LIMITE_MAXIMO, LIMITE_PADRAO, keyset_query, proximo_cursor, stream_ndjson
+from recorrencias import aplicar_recorrencia, materializar_mes, validar_recorrencia
+from busca import get_busca, termos_busca
+from categorias import (OUTROS, classificar_pendentes, get_categorias, reclassificar_em_lotes,
+                        totais_por_categoria, validar_regra)
+from exportacao import ErroRestauracao, backup_sqlite, exportar_colunas, ler_em_pedacos, restaurar_colunas
+from alteracoes import (DURACAO_SEGUNDOS, LIMITE_EVENTOS, PING_SEGUNDOS, ao_desligar, desde_evento,
+                        mensagem_sse)
+from eventos import compactar, desfazer, evento_no_momento, get_eventos, get_mes_em, parse_momento
+from relatorios import get_previsao, get_relatorio, intervalo_padrao, parse_ano_mes
 
-app = FastAPI()
+# Bancos abertos: um só (DB_PATH) ou um por inquilino (TENANTS_DIR). Cada um
+# tem pool de conexões, executores de leitura/escrita e cache de respostas;
+# db, pool e cache apontam para os do inquilino da requisição atual
+def apos_gravar(conn):
+    # Depois de cada escrita: saídas novas ou renomeadas recebem sua categoria,
+    # os meses com muitos eventos desde o último snapshot ganham um novo e as
+    # alterações são enviadas a quem acompanha /eventos/stream
+    classificar_pendentes(conn)
+    compactar(conn)
+    atual().alteracoes.publicar(conn, montar_alteracoes)
+
+registro = RegistroInquilinos(apos_gravar=apos_gravar)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Garantir que o schema (tabelas, resumo mensal e triggers) esteja atualizado;
+    # com vários inquilinos isso acontece no primeiro acesso de cada um
+    await registro.iniciar()
+    # O servidor só desliga depois que as respostas terminam, e as de /eventos/stream não terminam sozinhas
+    ao_desligar(registro.fechar_canais)
+    yield
+    await registro.encerrar()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Inquilino de cada requisição (cabeçalho X-Tenant ou token); fica por dentro
+# do CORS para que os erros de identificação também levem os cabeçalhos CORS
+# (o EventSource não envia cabeçalhos, então /eventos/stream aceita o token na URL)
+app.add_middleware(InquilinoMiddleware, registro=registro, livres={"/metrics", "/docs", "/openapi.json"},
+                   token_na_url={"/eventos/stream"})
 
 # Configuração de CORS
 app.add_middleware(
@@ -15,27 +72,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Proximo-Cursor", "ETag", "Server-Timing"],
 )
 
-# Modelos Pydantic atualizados
-class Entrada(BaseModel):
-    nome: str
-    valor: float
-    status: str = "pendente"
-    data: Optional[str] = None
-
-class Saida(BaseModel):
-    nome: str
-    valor: float
-    flags: str = ""
-    data_vencimento: Optional[str] = None
-    parcelamento: Optional[int] = None  # Número de parcelas (2, 3, 5, 6, 10, etc.)
-
-# Funções de banco de dados
-def get_db():
-    conn = sqlite3.connect("db.sqlite3")
-    conn.row_factory = sqlite3.Row
-    return conn
+# Tempo de cada requisição por rota e por etapa (conexão, SQL, Python, JSON)
+@app.middleware("http")
+async def medir_requisicao(request: Request, call_next):
+    tempos = {}
+    token = metricas.tempos_requisicao.set(tempos)
+    inicio = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        metricas.tempos_requisicao.reset(token)
+    total = time.perf_counter() - inicio
+    
+    # Rota no formato declarado (/saidas/{id}) para não criar uma série por id
+    route = request.scope.get("route")
+    rota = route.path if route else "desconhecida"
+    metricas.REQUISICOES.observar((request.method, rota, str(response.status_code)), total)
+    for etapa, segundos in tempos.items():
+        metricas.ETAPAS.observar((rota, etapa), segundos)
+    
+    if metricas.SERVER_TIMING:
+        partes = [f"{etapa};dur={segundos * 1000:.2f}" for etapa, segundos in tempos.items()]
+        partes.append(f"total;dur={total * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(partes)
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+# Colunas retornadas pelos endpoints de entradas e saídas (sem as internas, como hash_importacao)
+ENTRADAS_COLUMNS = "id, nome, valor, status, data"
+SAIDAS_COLUMNS = """id, nome, valor, flags, flags_mask, data, parcela_atual,
+               total_parcelas, id_grupo_parcela, id_recorrencia, categoria_id, data_vencimento"""
 
 # Função para obter o início e fim do mês atual
 def get_current_month_range():
@@ -64,12 +133,74 @@ def get_month_range(year, month):
     last_day = last_day.strftime('%Y-%m-%d')
     return first_day, last_day
 
+# Filtro por tipo de saída (parcelas, não parceladas ou vencimento próximo)
+def tipo_filter_sql(tipo, dias):
+    if tipo == "parcelas":
+        return "total_parcelas > 1", []
+    if tipo == "nao_parcelas":
+        return "IFNULL(total_parcelas, 1) <= 1", []
+    if tipo == "proximas":
+        hoje = datetime.now()
+        return "data_vencimento BETWEEN ? AND ?", [
+            hoje.strftime('%Y-%m-%d'),
+            (hoje + timedelta(days=dias)).strftime('%Y-%m-%d')
+        ]
+    return None, []
+
+# Resposta de leitura servida do cache, com ETag e 304 quando o cliente já a tem
+async def cached_response(request, chave, consulta):
+    # Respostas que dependem da data de hoje (mês atual, próximos vencimentos) mudam de chave a cada dia
+    chave = (request.url.path, date.today().isoformat()) + chave
+    # Escritas de outros processos: PRAGMA data_version, na thread de leitura
+    await db.call(cache.conferir)
+    item = cache.get(chave)
+    if item is None:
+        versao = cache.versao
+        dados = await db.read(consulta)
+        inicio = time.perf_counter()
+        item = cache.put(chave, versao, dados)
+        registrar_etapa("json", time.perf_counter() - inicio)
+    corpo, etag = item
+    
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=corpo, media_type="application/json", headers=headers)
+
+# Gera as saídas recorrentes do mês na primeira vez que ele é consultado
+# (os meses já gerados por este processo ficam registrados por inquilino)
+async def garantir_recorrencias(first_day):
+    ano_mes = first_day[:7]
+    meses_materializados = atual().meses_materializados
+    if ano_mes in meses_materializados:
+        return
+    await db.write(materializar_mes, ano_mes)
+    meses_materializados.add(ano_mes)
+
+# Listagens /todos: devolvem a resposta já serializada, sem a validação do response_model
+async def listagem_response(sql, params, coluna_data, limit, formato):
+    if formato == "ndjson":
+        return StreamingResponse(db.stream(stream_ndjson(pool, sql, params)), media_type="application/x-ndjson")
+    
+    def consulta(conn):
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return rows_to_columns(cursor) if formato == "colunas" else rows_to_dicts(cursor)
+    
+    dados = await db.read(consulta)
+    
+    if formato == "colunas":
+        proximo = proximo_cursor(dados["linhas"], coluna_data, limit, dados["colunas"])
+    else:
+        proximo = proximo_cursor(dados, coluna_data, limit)
+    headers = {"X-Proximo-Cursor": proximo} if proximo else None
+    return FastJSONResponse(dados, headers=headers)
+
 # Função para criar parcelas
-def create_parcelas(nome, valor_total, flags, parcelas, data_inicial=None):
+def create_parcelas(conn, nome, valor_total, flags, parcelas, data_inicial=None):
     """
     Cria parcelas automaticamente baseado no número de parcelas
     """
-    conn = get_db()
     cursor = conn.cursor()
     
     if not parcelas or parcelas <= 1:
@@ -80,7 +211,6 @@ def create_parcelas(nome, valor_total, flags, parcelas, data_inicial=None):
         )
         saida_id = cursor.lastrowid
         conn.commit()
-        conn.close()
         return saida_id
     
     # Adicionar a flag de parcelamento
@@ -90,172 +220,158 @@ def create_parcelas(nome, valor_total, flags, parcelas, data_inicial=None):
         else:
             flags = f"parc{parcelas}"
     
-    valor_parcela = round(valor_total / parcelas, 2)
-    
-    # Criar um ID de grupo para vincular todas as parcelas
-    cursor.execute("INSERT INTO saidas (nome, valor, flags) VALUES ('temp', 0, '')")
-    id_grupo = cursor.lastrowid
-    cursor.execute("DELETE FROM saidas WHERE id = ?", (id_grupo,))
-    
     # Data inicial para primeira parcela (hoje se não for especificada)
     if not data_inicial:
         data_inicial = datetime.now().strftime('%Y-%m-%d')
     
-    data_atual = datetime.strptime(data_inicial, '%Y-%m-%d')
-    first_id = None
-    
-    # Criar todas as parcelas
-    for i in range(1, parcelas + 1):
-        data_vencimento = data_atual.strftime('%Y-%m-%d')
-        nome_parcela = f"{nome} ({i}/{parcelas})"
-        
-        cursor.execute("""
-            INSERT INTO saidas 
-            (nome, valor, flags, parcela_atual, total_parcelas, id_grupo_parcela, data_vencimento) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (nome_parcela, valor_parcela, flags, i, parcelas, id_grupo, data_vencimento))
-        
-        if i == 1:
-            first_id = cursor.lastrowid
-        
-        # Avançar um mês para a próxima parcela
-        if data_atual.month == 12:
-            data_atual = data_atual.replace(year=data_atual.year + 1, month=1)
-        else:
-            data_atual = data_atual.replace(month=data_atual.month + 1)
-    
-    conn.commit()
-    conn.close()
-    return first_id
+    return insert_parcelas(conn, nome, valor_total, flags, parcelas, data_inicial)
 
 # Endpoints de Entradas
 @app.get("/entradas", response_model=List[dict])
-def get_entradas(
+async def get_entradas(
+    request: Request,
     ano: Optional[int] = Query(None, description="Ano para filtrar (ex: 2025)"),
     mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)")
 ):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Se ano e mês forem fornecidos, use-os para filtrar
+    # Se ano e mês forem fornecidos, use-os para filtrar; caso contrário, o mês atual
     if ano and mes:
         first_day, last_day = get_month_range(ano, mes)
-        cursor.execute(
-            "SELECT * FROM entradas WHERE data BETWEEN ? AND ? ORDER BY data",
-            (first_day, last_day)
-        )
     else:
-        # Caso contrário, use o mês atual
         first_day, last_day = get_current_month_range()
+    
+    def consulta(conn):
+        cursor = conn.cursor()
         cursor.execute(
-            "SELECT * FROM entradas WHERE data BETWEEN ? AND ? ORDER BY data",
+            f"SELECT {ENTRADAS_COLUMNS} FROM entradas WHERE data BETWEEN ? AND ? ORDER BY data",
             (first_day, last_day)
         )
+        return [dict(row) for row in cursor.fetchall()]
     
-    entradas = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return entradas
+    return await cached_response(request, (first_day,), consulta)
 
 @app.get("/entradas/todos", response_model=List[dict])
-def get_todas_entradas():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM entradas ORDER BY data DESC")
-    entradas = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return entradas
+async def get_todas_entradas(
+    limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO, description="Máximo de itens por página"),
+    after: Optional[str] = Query(None, description="Cursor retornado em X-Proximo-Cursor"),
+    formato: str = Query("json", pattern="^(json|colunas|ndjson)$", description="json, colunas ou ndjson (streaming)")
+):
+    sql, params = keyset_query("entradas", ENTRADAS_COLUMNS, "data", descendente=True, limit=limit, after=after)
+    return await listagem_response(sql, params, "data", limit, formato)
 
 @app.post("/entradas", response_model=dict)
-def add_entrada(entrada: Entrada):
-    conn = get_db()
-    cursor = conn.cursor()
+async def add_entrada(entrada: Entrada):
     data = entrada.data or datetime.now().strftime('%Y-%m-%d')
-    cursor.execute("INSERT INTO entradas (nome, valor, status, data) VALUES (?, ?, ?, ?)",
-                   (entrada.nome, entrada.valor, entrada.status, data))
-    conn.commit()
-    entrada_id = cursor.lastrowid
-    conn.close()
+    
+    def grava(conn):
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO entradas (nome, valor, status, data) VALUES (?, ?, ?, ?)",
+                       (entrada.nome, entrada.valor, entrada.status, data))
+        conn.commit()
+        return cursor.lastrowid
+    
+    entrada_id = await db.write(grava)
     return {"id": entrada_id, **entrada.dict()}
 
 @app.put("/entradas/{id}", response_model=dict)
-def update_entrada(id: int, entrada: Entrada):
-    conn = get_db()
-    cursor = conn.cursor()
+async def update_entrada(id: int, entrada: Entrada):
     data = entrada.data or datetime.now().strftime('%Y-%m-%d')
-    cursor.execute("UPDATE entradas SET nome = ?, valor = ?, status = ?, data = ? WHERE id = ?",
-                   (entrada.nome, entrada.valor, entrada.status, data, id))
-    if cursor.rowcount == 0:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Entrada não encontrada")
-    conn.commit()
-    conn.close()
+    
+    def grava(conn):
+        cursor = conn.cursor()
+        cursor.execute("UPDATE entradas SET nome = ?, valor = ?, status = ?, data = ? WHERE id = ?",
+                       (entrada.nome, entrada.valor, entrada.status, data, id))
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Entrada não encontrada")
+        conn.commit()
+    
+    await db.write(grava)
     return {"id": id, **entrada.dict()}
 
 @app.delete("/entradas/{id}")
-def delete_entrada(id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM entradas WHERE id = ?", (id,))
-    if cursor.rowcount == 0:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Entrada não encontrada")
-    conn.commit()
-    conn.close()
+async def delete_entrada(id: int):
+    def grava(conn):
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM entradas WHERE id = ?", (id,))
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Entrada não encontrada")
+        conn.commit()
+    
+    await db.write(grava)
     return {"message": "Entrada deletada com sucesso"}
 
 # Endpoints de Saídas
 @app.get("/saidas", response_model=List[dict])
-def get_saidas(
+async def get_saidas(
+    request: Request,
     ano: Optional[int] = Query(None, description="Ano para filtrar (ex: 2025)"),
-    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)")
+    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)"),
+    flag: Optional[List[str]] = Query(None, description="Filtrar por flag (ex: urg, !feito)"),
+    tipo: Optional[str] = Query(None, pattern="^(parcelas|nao_parcelas|proximas)$", description="parcelas, nao_parcelas ou proximas"),
+    dias: int = Query(30, ge=0, le=3660, description="Janela em dias para tipo=proximas"),
+    categoria: Optional[int] = Query(None, description="Filtrar por id de categoria")
 ):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Se ano e mês forem fornecidos, use-os para filtrar
+    # Se ano e mês forem fornecidos, use-os para filtrar; caso contrário, o mês atual
     if ano and mes:
         first_day, last_day = get_month_range(ano, mes)
-        cursor.execute("""
-            SELECT id, nome, valor, flags, data, parcela_atual, 
-                   total_parcelas, id_grupo_parcela, data_vencimento
-            FROM saidas
-            WHERE data_vencimento BETWEEN ? AND ?
-            ORDER BY data_vencimento ASC
-        """, (first_day, last_day))
     else:
-        # Caso contrário, use o mês atual
         first_day, last_day = get_current_month_range()
-        cursor.execute("""
-            SELECT id, nome, valor, flags, data, parcela_atual, 
-                   total_parcelas, id_grupo_parcela, data_vencimento
+    
+    await garantir_recorrencias(first_day)
+    
+    where = ["data_vencimento BETWEEN ? AND ?"]
+    params = [first_day, last_day]
+    
+    # Filtro de flags pelo bitmask indexado
+    flag_sql, flag_params = flag_filter_sql(flag)
+    if flag_sql:
+        where.append(flag_sql)
+        params.extend(flag_params)
+    
+    tipo_sql, tipo_params = tipo_filter_sql(tipo, dias)
+    if tipo_sql:
+        where.append(tipo_sql)
+        params.extend(tipo_params)
+    
+    if categoria is not None:
+        where.append("categoria_id = ?")
+        params.append(categoria)
+    
+    def consulta(conn):
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {SAIDAS_COLUMNS}
             FROM saidas
-            WHERE data_vencimento BETWEEN ? AND ?
+            WHERE {" AND ".join(where)}
             ORDER BY data_vencimento ASC
-        """, (first_day, last_day))
+        """, params)
+        return [dict(row) for row in cursor.fetchall()]
     
-    saidas = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return saidas
+    return await cached_response(request, (" AND ".join(where), tuple(params)), consulta)
 
 @app.get("/saidas/todos", response_model=List[dict])
-def get_todas_saidas():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, nome, valor, flags, data, parcela_atual, 
-               total_parcelas, id_grupo_parcela, data_vencimento
-        FROM saidas
-        ORDER BY data_vencimento ASC
-    """)
-    saidas = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return saidas
+async def get_todas_saidas(
+    flag: Optional[List[str]] = Query(None, description="Filtrar por flag (ex: urg, !feito)"),
+    tipo: Optional[str] = Query(None, pattern="^(parcelas|nao_parcelas|proximas)$", description="parcelas, nao_parcelas ou proximas"),
+    dias: int = Query(30, ge=0, le=3660, description="Janela em dias para tipo=proximas"),
+    limit: int = Query(LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO, description="Máximo de itens por página"),
+    after: Optional[str] = Query(None, description="Cursor retornado em X-Proximo-Cursor"),
+    formato: str = Query("json", pattern="^(json|colunas|ndjson)$", description="json, colunas ou ndjson (streaming)")
+):
+    flag_sql, flag_params = flag_filter_sql(flag)
+    tipo_sql, tipo_params = tipo_filter_sql(tipo, dias)
+    sql, params = keyset_query(
+        "saidas", SAIDAS_COLUMNS, "data_vencimento",
+        where=[c for c in (flag_sql, tipo_sql) if c], params=flag_params + tipo_params,
+        limit=limit, after=after
+    )
+    return await listagem_response(sql, params, "data_vencimento", limit, formato)
 
 @app.post("/saidas", response_model=dict)
-def add_saida(saida: Saida):
+async def add_saida(saida: Saida):
     # Se tiver parcelamento, usa a função específica
     if saida.parcelamento and saida.parcelamento > 1:
-        saida_id = create_parcelas(
+        saida_id = await db.write(
+            create_parcelas,
             saida.nome, 
             saida.valor, 
             saida.flags, 
@@ -265,195 +381,466 @@ def add_saida(saida: Saida):
         return {"id": saida_id, **saida.dict()}
     
     # Caso contrário, insere normalmente
-    conn = get_db()
-    cursor = conn.cursor()
     data_vencimento = saida.data_vencimento or datetime.now().strftime('%Y-%m-%d')
-    cursor.execute("""
-        INSERT INTO saidas (nome, valor, flags, data_vencimento) 
-        VALUES (?, ?, ?, ?)
-    """, (saida.nome, saida.valor, saida.flags, data_vencimento))
-    conn.commit()
-    saida_id = cursor.lastrowid
-    conn.close()
+    
+    def grava(conn):
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO saidas (nome, valor, flags, data_vencimento) 
+            VALUES (?, ?, ?, ?)
+        """, (saida.nome, saida.valor, saida.flags, data_vencimento))
+        conn.commit()
+        return cursor.lastrowid
+    
+    saida_id = await db.write(grava)
     return {"id": saida_id, **saida.dict()}
 
 @app.put("/saidas/{id}", response_model=dict)
-def update_saida(id: int, saida: Saida):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Verificar se faz parte de um grupo de parcelas
-    cursor.execute("SELECT id_grupo_parcela, total_parcelas FROM saidas WHERE id = ?", (id,))
-    result = cursor.fetchone()
+async def update_saida(id: int, saida: Saida):
+    data_vencimento = saida.data_vencimento or datetime.now().strftime('%Y-%m-%d')
     
-    if result and result['id_grupo_parcela'] and result['total_parcelas'] > 1:
-        # Se for uma parcela, perguntar se deseja atualizar todas as parcelas do grupo
-        grupo_id = result['id_grupo_parcela']
+    def grava(conn):
+        cursor = conn.cursor()
         
-        # Atualizar apenas a parcela específica
-        data_vencimento = saida.data_vencimento or datetime.now().strftime('%Y-%m-%d')
+        # Atualiza só esta linha, mesmo que seja uma parcela;
+        # alterações no grupo inteiro vão por PATCH /saidas/grupo/{grupo_id}
         cursor.execute("""
             UPDATE saidas 
             SET nome = ?, valor = ?, flags = ?, data_vencimento = ? 
             WHERE id = ?
         """, (saida.nome, saida.valor, saida.flags, data_vencimento, id))
-    else:
-        # Atualização normal
-        data_vencimento = saida.data_vencimento or datetime.now().strftime('%Y-%m-%d')
-        cursor.execute("""
-            UPDATE saidas 
-            SET nome = ?, valor = ?, flags = ?, data_vencimento = ? 
-            WHERE id = ?
-        """, (saida.nome, saida.valor, saida.flags, data_vencimento, id))
-    
-    if cursor.rowcount == 0:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Saída não encontrada")
+        
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Saída não encontrada")
+        
+        conn.commit()
     
-    conn.commit()
-    conn.close()
+    await db.write(grava)
     return {"id": id, **saida.dict()}
 
 @app.delete("/saidas/{id}")
-def delete_saida(id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Verificar se faz parte de um grupo de parcelas
-    cursor.execute("SELECT id_grupo_parcela FROM saidas WHERE id = ?", (id,))
-    result = cursor.fetchone()
-    
-    if result and result['id_grupo_parcela']:
-        # Se for uma parcela, deletar apenas esta parcela específica
-        cursor.execute("DELETE FROM saidas WHERE id = ?", (id,))
-    else:
-        # Deleção normal
+async def delete_saida(id: int):
+    def grava(conn):
+        cursor = conn.cursor()
+        
+        # Remove só esta linha, mesmo que seja uma parcela;
+        # para o grupo use DELETE /saidas/grupo/{grupo_id}
         cursor.execute("DELETE FROM saidas WHERE id = ?", (id,))
+        
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Saída não encontrada")
+        
+        conn.commit()
     
-    if cursor.rowcount == 0:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Saída não encontrada")
-    
-    conn.commit()
-    conn.close()
+    await db.write(grava)
     return {"message": "Saída deletada com sucesso"}
 
-# Endpoint para deletar todas as parcelas de um grupo
+# Endpoints de Recorrências (modelos das despesas que se repetem todo mês)
+@app.get("/recorrencias", response_model=List[dict])
+async def get_recorrencias():
+    def consulta(conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM recorrencias ORDER BY nome")
+        return rows_to_dicts(cursor)
+    
+    return FastJSONResponse(await db.read(consulta))
+
+@app.post("/recorrencias", response_model=dict)
+async def add_recorrencia(recorrencia: Recorrencia):
+    inicio, fim = validar_recorrencia(recorrencia)
+    
+    def grava(conn):
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO recorrencias (nome, valor, flags, dia, inicio, fim, ativa)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (recorrencia.nome, recorrencia.valor, recorrencia.flags, recorrencia.dia,
+                  inicio, fim, recorrencia.ativa))
+            recorrencia_id = cursor.lastrowid
+            # Incluir também nos meses que já foram gerados
+            aplicar_recorrencia(conn, recorrencia_id)
+            return recorrencia_id
+    
+    recorrencia_id = await db.write(grava)
+    return {"id": recorrencia_id, **recorrencia.dict(), "inicio": inicio, "fim": fim}
+
+@app.put("/recorrencias/{id}", response_model=dict)
+async def update_recorrencia(id: int, recorrencia: Recorrencia):
+    inicio, fim = validar_recorrencia(recorrencia)
+    
+    # Saídas já geradas (ou excluídas) não mudam; a alteração vale para os meses
+    # ainda não gerados e para os já gerados que a recorrência passa a cobrir
+    def grava(conn):
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE recorrencias
+                SET nome = ?, valor = ?, flags = ?, dia = ?, inicio = ?, fim = ?, ativa = ?
+                WHERE id = ?
+            """, (recorrencia.nome, recorrencia.valor, recorrencia.flags, recorrencia.dia,
+                  inicio, fim, recorrencia.ativa, id))
+            if cursor.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Recorrência não encontrada")
+            aplicar_recorrencia(conn, id)
+    
+    await db.write(grava)
+    return {"id": id, **recorrencia.dict(), "inicio": inicio, "fim": fim}
+
+@app.delete("/recorrencias/{id}")
+async def delete_recorrencia(id: int):
+    # As saídas já geradas continuam como saídas comuns
+    def grava(conn):
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM recorrencias WHERE id = ?", (id,))
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Recorrência não encontrada")
+        conn.commit()
+    
+    await db.write(grava)
+    return {"message": "Recorrência deletada com sucesso"}
+
+# Escopo das operações em grupo: todas, só as não pagas ou a partir da parcela n
+ESCOPO_QUERY = Query("all", pattern=r"^(all|remaining|from=\d+)$", description="all, remaining ou from=n")
+
+# Endpoint para alterar várias parcelas de um grupo de uma vez
+@app.patch("/saidas/grupo/{grupo_id}", response_model=List[dict])
+async def update_grupo_parcelas(grupo_id: int, alteracoes: GrupoParcelaUpdate, escopo: str = ESCOPO_QUERY):
+    return FastJSONResponse(await db.write(update_grupo, grupo_id, alteracoes, escopo, SAIDAS_COLUMNS))
+
+# Endpoint para deletar as parcelas de um grupo
 @app.delete("/saidas/grupo/{grupo_id}")
-def delete_grupo_parcelas(grupo_id: int):
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM saidas WHERE id_grupo_parcela = ?", (grupo_id,))
-    deleted_count = cursor.rowcount
-    conn.commit()
-    conn.close()
+async def delete_grupo_parcelas(grupo_id: int, escopo: str = ESCOPO_QUERY):
+    deleted_count = await db.write(delete_grupo, grupo_id, escopo)
     
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Grupo de parcelas não encontrado")
     
     return {"message": f"Grupo de parcelas deletado com sucesso. {deleted_count} parcelas removidas."}
 
-# Endpoint para obter meses disponíveis para filtro
-@app.get("/meses-disponiveis")
-def get_meses_disponiveis():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Buscar meses únicos de entradas
-    cursor.execute("""
-        SELECT DISTINCT strftime('%Y', data) as ano, strftime('%m', data) as mes
-        FROM entradas
-        ORDER BY ano DESC, mes DESC
-    """)
-    meses_entradas = [{"ano": int(row[0]), "mes": int(row[1])} for row in cursor.fetchall()]
-    
-    # Buscar meses únicos de saídas
-    cursor.execute("""
-        SELECT DISTINCT strftime('%Y', data_vencimento) as ano, strftime('%m', data_vencimento) as mes
-        FROM saidas
-        ORDER BY ano DESC, mes DESC
-    """)
-    meses_saidas = [{"ano": int(row[0]), "mes": int(row[1])} for row in cursor.fetchall()]
-    
-    # Combinar e remover duplicados
-    todos_meses = meses_entradas + meses_saidas
-    meses_unicos = []
-    for mes in todos_meses:
-        if mes not in meses_unicos:
-            meses_unicos.append(mes)
-    
-    # Ordenar por ano e mês (decrescente)
-    meses_unicos.sort(key=lambda x: (x["ano"], x["mes"]), reverse=True)
-    
-    conn.close()
-    return meses_unicos
+# Importação de extratos (CSV ou OFX) enviados no corpo da requisição
+@app.post("/import")
+async def importar_extrato(
+    request: Request,
+    formato: str = Query("csv", pattern="^(csv|ofx)$", description="Formato do arquivo: csv ou ofx"),
+    encoding: str = Query("utf-8-sig", description="Codificação do arquivo")
+):
+    # Guardar o upload em disco a partir de 1 MB para a memória não crescer com o arquivo
+    arquivo = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    async for chunk in request.stream():
+        arquivo.write(chunk)
+    arquivo.seek(0)
+    linhas = io.TextIOWrapper(arquivo, encoding=encoding, errors="replace", newline="")
+    
+    # Andamento e erros por linha são enviados em NDJSON enquanto a importação roda;
+    # cada lote passa pela thread de escrita, intercalado com as demais escritas
+    def eventos():
+        try:
+            with pool.connection() as conn:
+                for evento in importar(conn, linhas, formato):
+                    yield json.dumps(evento, ensure_ascii=False) + "\n"
+        finally:
+            linhas.close()
+    
+    return StreamingResponse(db.stream(eventos(), escrita=True), media_type="application/x-ndjson")
 
-# Dashboard
-@app.get("/dashboard")
-def get_dashboard(
-    ano: Optional[int] = Query(None, description="Ano para filtrar (ex: 2025)"),
-    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)")
+# Backup (arquivo SQLite) e dump colunar do banco, consistentes mesmo com escritas em andamento
+@app.get("/export")
+async def exportar_banco(
+    formato: str = Query("sqlite", pattern="^(sqlite|colunas)$", description="sqlite ou colunas")
 ):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Definir o período a ser analisado
-    if ano and mes:
-        first_day, last_day = get_month_range(ano, mes)
-    else:
-        first_day, last_day = get_current_month_range()
-    
-    # Entradas do mês selecionado
-    cursor.execute("""
-        SELECT SUM(valor) FROM entradas 
-        WHERE status = 'recebido' AND data BETWEEN ? AND ?
-    """, (first_day, last_day))
-    entradas_recebidas = cursor.fetchone()[0] or 0
-    
-    cursor.execute("""
-        SELECT SUM(valor) FROM entradas 
-        WHERE data BETWEEN ? AND ?
-    """, (first_day, last_day))
-    entradas_totais = cursor.fetchone()[0] or 0
+    data = date.today().strftime("%Y%m%d")
+    if formato == "sqlite":
+        descritor, caminho = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(descritor)
+        try:
+            await db.read(backup_sqlite, caminho)
+        except BaseException:
+            os.unlink(caminho)
+            raise
+        return FileResponse(caminho, media_type="application/vnd.sqlite3", filename=f"gastos-{data}.sqlite3",
+                            background=BackgroundTask(os.unlink, caminho))
+
+    # O dump é gerado em blocos pelo executor de leitura, a partir de um único snapshot
+    def partes():
+        with pool.connection() as conn:
+            yield from exportar_colunas(conn)
+
+    return StreamingResponse(db.stream(partes()), media_type="application/gzip",
+                             headers={"Content-Disposition": f'attachment; filename="gastos-{data}.ndjson.gz"'})
+
+# Restauração de um dump colunar: substitui os dados numa única transação
+@app.post("/restore")
+async def restaurar_banco(request: Request):
+    arquivo = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    async for chunk in request.stream():
+        arquivo.write(chunk)
+    arquivo.seek(0)
+
+    def grava(conn):
+        try:
+            restauradas = restaurar_colunas(conn, ler_em_pedacos(arquivo))
+        except ErroRestauracao as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        atual().alteracoes.recarregar(conn)
+        return restauradas
+
+    try:
+        restauradas = await db.write(grava)
+    finally:
+        arquivo.close()
+    # Os meses de recorrências já materializados agora são os do dump
+    atual().meses_materializados.clear()
+    return {"restauradas": restauradas}
+
+# Endpoints de Categorias e das regras que classificam as saídas pelo nome
+RECLASSIFICACAO = "reclassificacao"
+
+# Reaplica as regras a todas as saídas, em lotes pela thread de escrita
+async def reclassificar():
+    def lotes():
+        with pool.connection() as conn:
+            for alteradas in reclassificar_em_lotes(conn):
+                conn.commit()
+                yield alteradas
+    
+    async for _ in db.stream(lotes(), escrita=True):
+        pass
+
+@app.get("/categorias")
+async def get_categorias_regras():
+    # reclassificando: as regras mudaram e as saídas ainda estão sendo reclassificadas
+    return {"categorias": await db.read(get_categorias), "reclassificando": em_andamento(RECLASSIFICACAO)}
+
+@app.post("/categorias", response_model=dict)
+async def add_categoria(categoria: Categoria):
+    def grava(conn):
+        try:
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO categorias (nome) VALUES (?)", (categoria.nome,))
+                return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=400, detail="Já existe uma categoria com esse nome")
+    
+    categoria_id = await db.write(grava)
+    return {"id": categoria_id, **categoria.dict()}
+
+@app.put("/categorias/{id}", response_model=dict)
+async def update_categoria(id: int, categoria: Categoria):
+    def grava(conn):
+        try:
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute("UPDATE categorias SET nome = ? WHERE id = ?", (categoria.nome, id))
+                if cursor.rowcount == 0:
+                    raise HTTPException(status_code=404, detail="Categoria não encontrada")
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=400, detail="Já existe uma categoria com esse nome")
+    
+    await db.write(grava)
+    return {"id": id, **categoria.dict()}
+
+@app.delete("/categorias/{id}")
+async def delete_categoria(id: int):
+    if id == OUTROS:
+        raise HTTPException(status_code=400, detail="A categoria Outros não pode ser removida")
+    
+    # As saídas da categoria vão para Outros e a reclassificação procura outra regra para elas
+    def grava(conn):
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM categorias WHERE id = ?", (id,))
+            if cursor.rowcount == 0:
+                raise HTTPException(status_code=404, detail="Categoria não encontrada")
+            cursor.execute("DELETE FROM regras_categoria WHERE categoria_id = ?", (id,))
+            cursor.execute("UPDATE saidas SET categoria_id = ? WHERE categoria_id = ?", (OUTROS, id))
+    
+    await db.write(grava)
+    em_segundo_plano(RECLASSIFICACAO, reclassificar)
+    return {"message": "Categoria deletada com sucesso", "reclassificando": True}
+
+@app.post("/categorias/{id}/regras", response_model=dict)
+async def add_regra(id: int, regra: RegraCategoria):
+    def grava(conn):
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM categorias WHERE id = ?", (id,))
+            if cursor.fetchone() is None:
+                raise HTTPException(status_code=404, detail="Categoria não encontrada")
+            # A regra é validada junto com as demais, como será usada na classificação
+            cursor.execute("SELECT padrao, regex FROM regras_categoria")
+            validar_regra(regra.padrao, regra.regex, [(padrao, bool(regex)) for padrao, regex in cursor.fetchall()])
+            cursor.execute("""
+                INSERT INTO regras_categoria (categoria_id, padrao, regex, prioridade)
+                VALUES (?, ?, ?, ?)
+            """, (id, regra.padrao, regra.regex, regra.prioridade))
+            return cursor.lastrowid
+    
+    regra_id = await db.write(grava)
+    em_segundo_plano(RECLASSIFICACAO, reclassificar)
+    return {"id": regra_id, "categoria_id": id, **regra.dict(), "reclassificando": True}
+
+@app.delete("/categorias/regras/{id}")
+async def delete_regra(id: int):
+    def grava(conn):
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM regras_categoria WHERE id = ?", (id,))
+        if cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Regra não encontrada")
+        conn.commit()
     
-    # Saídas do mês selecionado
-    cursor.execute("""
-        SELECT SUM(valor) FROM saidas 
-        WHERE flags LIKE '%feito%' AND data_vencimento BETWEEN ? AND ?
-    """, (first_day, last_day))
-    saidas_pagas = cursor.fetchone()[0] or 0
+    await db.write(grava)
+    em_segundo_plano(RECLASSIFICACAO, reclassificar)
+    return {"message": "Regra deletada com sucesso", "reclassificando": True}
+
+# Reclassificação manual, por exemplo depois de uma carga feita direto no banco
+@app.post("/categorias/reclassificar")
+async def reclassificar_saidas():
+    em_segundo_plano(RECLASSIFICACAO, reclassificar)
+    return {"reclassificando": True}
+
+# Histórico: eventos de entradas e saídas, estado de um mês no passado e desfazer
+@app.get("/eventos", response_model=List[dict])
+async def get_historico_eventos(
+    tabela: Optional[str] = Query(None, pattern="^(entradas|saidas)$", description="entradas ou saidas"),
+    linha_id: Optional[int] = Query(None, description="Só os eventos desta linha"),
+    antes_de: Optional[int] = Query(None, description="Eventos com id menor que este (página seguinte)"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    return FastJSONResponse(await db.read(get_eventos, tabela, linha_id, antes_de, limit))
+
+@app.get("/historico")
+async def get_historico_mes(
+    request: Request,
+    ano: int = Query(..., description="Ano (ex: 2025)"),
+    mes: int = Query(..., ge=1, le=12, description="Mês (1-12)"),
+    em: Optional[str] = Query(None, description="Momento (YYYY-MM-DD ou YYYY-MM-DDTHH:MM, horário local)"),
+    evento: Optional[int] = Query(None, ge=0, description="Estado logo depois deste evento")
+):
+    if (em is None) == (evento is None):
+        raise HTTPException(status_code=400, detail="Informe em ou evento")
+    ano_mes = f"{ano:04d}-{mes:02d}"
+    momento = parse_momento(em) if em is not None else None
     
-    cursor.execute("""
-        SELECT SUM(valor) FROM saidas 
-        WHERE data_vencimento BETWEEN ? AND ?
-    """, (first_day, last_day))
-    saidas_totais = cursor.fetchone()[0] or 0
+    def consulta(conn):
+        evento_id = evento if momento is None else evento_no_momento(conn, momento)
+        return get_mes_em(conn, ano_mes, evento_id)
     
-    # Dados de parcelas
-    cursor.execute("""
-        SELECT COUNT(*) FROM saidas 
-        WHERE total_parcelas > 1 AND data_vencimento BETWEEN ? AND ?
-    """, (first_day, last_day))
-    total_itens_parcelados = cursor.fetchone()[0] or 0
+    return await cached_response(request, (ano_mes, em, evento), consulta)
+
+@app.post("/eventos/{id}/desfazer")
+async def desfazer_evento(id: int):
+    await db.write(desfazer, id)
+    return {"message": "Evento desfeito com sucesso"}
+
+# Mensagem de /eventos/stream com o que mudou entre dois eventos do histórico:
+# o estado atual das linhas alteradas (ou seus ids, se foram removidas) e o
+# dashboard dos meses afetados. None quando são eventos demais para uma mensagem.
+def montar_alteracoes(conn, desde, ate):
+    eventos = conn.execute("""
+        SELECT tabela, linha_id, mes, mes_anterior FROM eventos
+        WHERE id > ? AND id <= ?
+        LIMIT ?
+    """, (desde, ate, LIMITE_EVENTOS + 1)).fetchall()
+    if len(eventos) > LIMITE_EVENTOS:
+        return None
+    
+    ids = {"entradas": set(), "saidas": set()}
+    meses = set()
+    for evento in eventos:
+        ids[evento["tabela"]].add(evento["linha_id"])
+        meses.update(mes for mes in (evento["mes"], evento["mes_anterior"]) if mes)
+    
+    dados = {}
+    for tabela, colunas in (("entradas", ENTRADAS_COLUMNS), ("saidas", SAIDAS_COLUMNS)):
+        linhas = [dict(row) for row in conn.execute(f"""
+            SELECT {colunas} FROM {tabela}
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(sorted(ids[tabela])),))]
+        removidas = ids[tabela] - {linha["id"] for linha in linhas}
+        dados[tabela] = {"alteradas": linhas, "removidas": sorted(removidas)}
+    dados["dashboard"] = {
+        mes: dados_dashboard(conn, *get_month_range(int(mes[:4]), int(mes[5:7])))
+        for mes in sorted(meses)
+    }
+    return mensagem_sse("alteracoes", dados, id=ate)
+
+# Alterações em tempo real (Server-Sent Events): linhas alteradas e totais do
+# dashboard depois de cada escrita, para o frontend atualizar a tela sem
+# buscar tudo de novo
+@app.get("/eventos/stream")
+async def stream_alteracoes(last_event_id: Optional[int] = Header(None)):
+    canal = atual().alteracoes
+    
+    async def mensagens():
+        async with canal.assinar() as fila:
+            # Acompanhar o histórico a partir do fim atual; uma reconexão
+            # (Last-Event-ID) recebe antes o que perdeu enquanto esteve fora
+            ate = await db.read(canal.publicar, montar_alteracoes)
+            yield b"retry: 1000\n\n"
+            if last_event_id is None:
+                yield mensagem_sse("pronto", {}, id=ate)
+            else:
+                perdidas = await db.read(desde_evento, montar_alteracoes, last_event_id, ate)
+                if perdidas:
+                    yield perdidas
+            
+            # A conexão é encerrada depois de DURACAO_SEGUNDOS (o navegador
+            # reconecta) ou quando o servidor vai desligar (None na fila)
+            loop = asyncio.get_running_loop()
+            fim = loop.time() + DURACAO_SEGUNDOS
+            while loop.time() < fim:
+                try:
+                    mensagem = await asyncio.wait_for(fila.get(), PING_SEGUNDOS)
+                    if mensagem is None:
+                        return
+                    yield mensagem
+                except asyncio.TimeoutError:
+                    # Escritas de outros processos só aparecem no histórico
+                    await db.read(canal.publicar, montar_alteracoes)
+                    yield b": ping\n\n"
+    
+    return StreamingResponse(mensagens(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Endpoint para obter meses disponíveis para filtro
+@app.get("/meses-disponiveis")
+async def get_meses_disponiveis(request: Request):
+    # Os meses vêm do resumo mensal, que já tem uma linha por mês com dados
+    return await cached_response(request, (), get_meses)
+
+# Dados do dashboard de um mês (também enviados em /eventos/stream quando o mês muda)
+def dados_dashboard(conn, first_day, last_day):
+    # Totais do mês lidos do resumo mensal (uma única linha, mantida por triggers)
+    resumo = get_resumo(conn, first_day[:7])
     
     # Valor das próximas parcelas (vencimento nos próximos 30 dias)
     hoje = datetime.now().strftime('%Y-%m-%d')
     proximo_mes = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
-    
+    cursor = conn.cursor()
     cursor.execute("""
         SELECT SUM(valor) FROM saidas 
         WHERE data_vencimento BETWEEN ? AND ?
-        AND flags NOT LIKE '%feito%'
-    """, (hoje, proximo_mes))
+        AND flags_mask & ? = 0
+    """, (hoje, proximo_mes, FLAGS["feito"]))
     proximas_parcelas = cursor.fetchone()[0] or 0
     
-    saldo = entradas_recebidas - saidas_pagas
-    pendentes = saidas_totais - saidas_pagas
+    if resumo:
+        entradas_recebidas = round(resumo['entradas_recebidas'], 2)
+        entradas_totais = round(resumo['entradas_totais'], 2)
+        saidas_pagas = round(resumo['saidas_pagas'], 2)
+        saidas_totais = round(resumo['saidas_totais'], 2)
+        total_itens_parcelados = resumo['itens_parcelados']
+    else:
+        entradas_recebidas = entradas_totais = saidas_pagas = saidas_totais = 0
+        total_itens_parcelados = 0
     
-    # Obter o nome do mês para exibição
-    mes_nome = datetime(ano or datetime.now().year, mes or datetime.now().month, 1).strftime('%B %Y')
+    saldo = round(entradas_recebidas - saidas_pagas, 2)
+    pendentes = round(saidas_totais - saidas_pagas, 2)
     
-    conn.close()
+    # Obter o nome do mês para exibição
+    mes_nome = datetime.strptime(first_day, '%Y-%m-%d').strftime('%B %Y')
     return {
         "mes_referencia": mes_nome,
         "saldo": saldo,
@@ -463,5 +850,70 @@ def get_dashboard(
         "saidas_pagas": saidas_pagas,
         "pendentes": pendentes,
         "total_itens_parcelados": total_itens_parcelados,
-        "proximas_parcelas": proximas_parcelas
+        "proximas_parcelas": proximas_parcelas,
+        "categorias": totais_por_categoria(conn, first_day, last_day)
     }
+
+# Dashboard
+@app.get("/dashboard")
+async def get_dashboard(
+    request: Request,
+    ano: Optional[int] = Query(None, description="Ano para filtrar (ex: 2025)"),
+    mes: Optional[int] = Query(None, description="Mês para filtrar (1-12)")
+):
+    # Definir o período a ser analisado
+    if ano and mes:
+        first_day, last_day = get_month_range(ano, mes)
+    else:
+        first_day, last_day = get_current_month_range()
+    
+    await garantir_recorrencias(first_day)
+    
+    def consulta(conn):
+        return dados_dashboard(conn, first_day, last_day)
+    
+    return await cached_response(request, (first_day,), consulta)
+
+# Relatórios: séries mensais para gráficos, numa única consulta
+@app.get("/relatorios")
+async def get_relatorios(
+    request: Request,
+    de: Optional[str] = Query(None, description="Mês inicial (YYYY-MM), padrão 11 meses atrás"),
+    ate: Optional[str] = Query(None, description="Mês final (YYYY-MM), padrão o mês atual"),
+    agrupar: str = Query("mes", pattern="^mes$", description="Agrupamento das séries (mes)")
+):
+    de_padrao, ate_padrao = intervalo_padrao()
+    de = parse_ano_mes(de) if de else de_padrao
+    ate = parse_ano_mes(ate) if ate else ate_padrao
+    
+    return await cached_response(request, (de, ate, agrupar), lambda conn: get_relatorio(conn, de, ate))
+
+# Previsão de fluxo de caixa para os próximos meses
+@app.get("/previsao")
+async def get_previsao_caixa(
+    request: Request,
+    meses: int = Query(6, ge=1, le=60, description="Quantidade de meses a projetar, a partir do atual")
+):
+    # Memorizada pelo cache de respostas: só recalcula depois de uma escrita
+    return await cached_response(request, (meses,), lambda conn: get_previsao(conn, meses))
+
+# Busca por nome em entradas e saídas (índice FTS5), por relevância
+@app.get("/busca")
+async def buscar(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Palavras a buscar (prefixos, sem acentos)"),
+    tipo: Optional[str] = Query(None, pattern="^(entradas|saidas)$", description="Buscar só em entradas ou saidas"),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0, le=10000)
+):
+    termos = termos_busca(q)
+    tipos = (tipo,) if tipo else ("entradas", "saidas")
+    return await cached_response(
+        request, (tuple(termos), tipos, limit, offset),
+        lambda conn: get_busca(conn, q, tipos, limit, offset)
+    )
+
+# Métricas no formato texto do Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metricas.render(), media_type="text/plain; version=0.0.4")
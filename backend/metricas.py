@@ -0,0 +1,166 @@
+"""
+Instrumentação: tempo por rota, por etapa da requisição (espera por conexão,
+SQL, código Python, serialização JSON) e por instrução SQL, exposto em
+/metrics no formato texto do Prometheus.
+
+As conexões do pool usam TimedConnection, cujos cursores medem execute e
+fetch de cada instrução. Consultas acima de SLOW_QUERY_MS são registradas no
+log "consultas_lentas" junto com o EXPLAIN QUERY PLAN.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+# Instruções acima deste tempo (ms) vão para o log de consultas lentas
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+# Com SERVER_TIMING=1 as respostas levam o cabeçalho Server-Timing
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+# Limites dos buckets dos histogramas, em segundos
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+logger = logging.getLogger("consultas_lentas")
+
+# Tempos (em segundos) por etapa da requisição atual; o middleware cria o dict
+# e os executores do banco copiam o contexto, então as threads somam nele
+tempos_requisicao = ContextVar("tempos_requisicao", default=None)
+
+
+def registrar_etapa(etapa, segundos):
+    tempos = tempos_requisicao.get()
+    if tempos is not None:
+        tempos[etapa] = tempos.get(etapa, 0) + segundos
+
+
+class Histograma:
+    def __init__(self, nome, ajuda, rotulos):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valores, segundos):
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * len(BUCKETS), 0.0, 0]
+            for i, limite in enumerate(BUCKETS):
+                if segundos <= limite:
+                    serie[0][i] += 1
+            serie[1] += segundos
+            serie[2] += 1
+
+    def render(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            series = [(valores, list(b), s, n) for valores, (b, s, n) in self._series.items()]
+        for valores, buckets, soma, total in sorted(series):
+            rotulos = ",".join(f'{r}="{_escapar(v)}"' for r, v in zip(self.rotulos, valores))
+            for limite, contagem in zip(BUCKETS, buckets):
+                linhas.append(f'{self.nome}_bucket{{{rotulos},le="{limite}"}} {contagem}')
+            linhas.append(f'{self.nome}_bucket{{{rotulos},le="+Inf"}} {total}')
+            linhas.append(f"{self.nome}_sum{{{rotulos}}} {soma:.6f}")
+            linhas.append(f"{self.nome}_count{{{rotulos}}} {total}")
+        return "\n".join(linhas)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+REQUISICOES = Histograma(
+    "http_request_duration_seconds", "Duração das requisições por rota", ("method", "route", "status"))
+ETAPAS = Histograma(
+    "http_request_stage_seconds", "Tempo de cada etapa da requisição por rota", ("route", "stage"))
+CONSULTAS = Histograma(
+    "sqlite_statement_duration_seconds", "Tempo de execute + fetch por instrução SQL", ("statement",))
+
+
+def normalizar_sql(sql):
+    """
+    Forma curta da instrução para usar como rótulo: espaços colapsados e
+    listas de parâmetros "?, ?, ?" reduzidas a "?+"
+    """
+    sql = " ".join(sql.split())
+    sql = re.sub(r"\?(\s*,\s*\?)+", "?+", sql)
+    return sql[:160]
+
+
+def render():
+    return "\n".join(h.render() for h in (REQUISICOES, ETAPAS, CONSULTAS)) + "\n"
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor que acumula o tempo gasto em execute e nos fetch da instrução
+    corrente; o total é registrado quando a próxima instrução começa ou
+    quando a conexão volta ao pool (TimedConnection.finalizar)
+    """
+
+    def _medir(self, metodo, *args):
+        inicio = time.perf_counter()
+        try:
+            return metodo(self, *args)
+        finally:
+            self.connection._pendente[2] += time.perf_counter() - inicio
+
+    def execute(self, sql, params=()):
+        self.connection._iniciar(sql, params)
+        return self._medir(sqlite3.Cursor.execute, sql, params)
+
+    def executemany(self, sql, params):
+        self.connection._iniciar(sql, None)
+        return self._medir(sqlite3.Cursor.executemany, sql, params)
+
+    def fetchone(self):
+        return self._medir(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._medir(sqlite3.Cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._medir(sqlite3.Cursor.fetchall)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Conexão cujos cursores são TimedCursor. Guarda a instrução em andamento
+    como [sql, parâmetros, segundos acumulados].
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pendente = [None, None, 0.0]
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def _iniciar(self, sql, params):
+        self.finalizar()
+        self._pendente = [sql, params, 0.0]
+
+    def finalizar(self):
+        sql, params, segundos = self._pendente
+        if sql is None:
+            return
+        self._pendente = [None, None, 0.0]
+        CONSULTAS.observar((normalizar_sql(sql),), segundos)
+        registrar_etapa("sql", segundos)
+        if segundos * 1000 >= SLOW_QUERY_MS:
+            self._registrar_lenta(sql, params, segundos)
+
+    def _registrar_lenta(self, sql, params, segundos):
+        plano = ""
+        if params is not None and sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            try:
+                # Cursor comum, para o EXPLAIN não ser medido nem registrado
+                linhas = sqlite3.Cursor(self).execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+                plano = "\n".join(f"    {linha[3]}" for linha in linhas)
+            except sqlite3.Error as e:
+                plano = f"    (EXPLAIN falhou: {e})"
+        logger.warning("consulta lenta (%.1f ms): %s\n%s", segundos * 1000, " ".join(sql.split()), plano)
@@ -1,44 +1,397 @@
+"""
+Migrações do schema, numeradas e registradas em PRAGMA user_version.
+
+O passo n de MIGRACOES leva o banco da versão n-1 para a n e roda numa
+transação (BEGIN IMMEDIATE) junto com a atualização de user_version, então um
+passo que falha não deixa o schema pela metade. Na inicialização basta ler
+user_version: com o banco já na última versão nada mais é feito.
+
+Passos que preenchem colunas em tabelas grandes são geradores: cada yield
+encerra um lote, gravado antes do próximo, para não segurar o lock de escrita
+durante todo o preenchimento. Esses passos precisam poder recomeçar do início
+(só atualizam linhas ainda NULL) e por isso não misturam DDL com o
+preenchimento.
+
+Bancos criados antes deste controle ficam na versão 0 com parte do schema já
+aplicada; os passos até a versão 6 usam IF NOT EXISTS e conferem as colunas
+existentes, então valem tanto para eles quanto para bancos novos.
+
+Para mudar o schema, acrescente um passo no fim da lista; passos já
+publicados não devem ser alterados nem reordenados.
+"""
+import inspect
+import logging
 import sqlite3
 from datetime import datetime
+from db_pool import DB_PATH
+from flags import FLAGS_MASK_COLUMN
+from busca import BUSCA_SCHEMA, rebuild_busca
+from categorias import CATEGORIAS_INDICE, CATEGORIAS_SCHEMA, classificar, seed_categorias
+from eventos import EVENTOS_SCHEMA
+from recorrencias import EXCLUIDAS_SCHEMA, RECORRENCIAS_SCHEMA, aplicar_recorrencia, normalizar_mes
+from resumo import RESUMO_SCHEMA, rebuild_resumo_mensal
+
+# Linhas por lote nos preenchimentos de colunas
+TAMANHO_LOTE = 50000
+# Espera pelo lock de escrita durante a migração (outro worker pode estar migrando)
+MIGRACAO_TIMEOUT_MS = 60000
+
+logger = logging.getLogger("migracoes")
+
+
+def executar_script(conn, script):
+    """
+    Executa um script SQL instrução por instrução, dentro da transação atual
+    (executescript faria COMMIT antes de começar)
+    """
+    instrucao = ""
+    for linha in script.splitlines(keepends=True):
+        instrucao += linha
+        if sqlite3.complete_statement(instrucao):
+            conn.execute(instrucao)
+            instrucao = ""
+
+
+def _existe(conn, tipo, nome):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (tipo, nome)
+    ).fetchone() is not None
+
+
+def _adicionar_colunas(conn, tabela, colunas):
+    # table_xinfo também lista colunas geradas, que table_info omite
+    existentes = {coluna[1] for coluna in conn.execute(f"PRAGMA table_xinfo({tabela})")}
+    for nome, definicao in colunas:
+        if nome not in existentes:
+            conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {definicao}")
+
+
+def _preencher_em_lotes(conn, tabela, coluna, valor):
+    """
+    Preenche `coluna` onde ainda for NULL, em faixas de rowid; um yield por lote
+    """
+    maior = conn.execute(f"SELECT IFNULL(MAX(rowid), 0) FROM {tabela}").fetchone()[0]
+    for inicio in range(0, maior, TAMANHO_LOTE):
+        conn.execute(
+            f"UPDATE {tabela} SET {coluna} = ? WHERE rowid > ? AND rowid <= ? AND {coluna} IS NULL",
+            (valor, inicio, inicio + TAMANHO_LOTE)
+        )
+        yield
+
+
+def _tabelas(conn):
+    """
+    Tabelas de entradas e saídas; em bancos antigos, as colunas que vieram depois
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS entradas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            valor REAL NOT NULL,
+            status TEXT DEFAULT 'pendente',
+            data TEXT DEFAULT (strftime('%Y-%m-%d', 'now')),
+            hash_importacao TEXT DEFAULT NULL
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS saidas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            valor REAL NOT NULL,
+            flags TEXT DEFAULT '',
+            data TEXT DEFAULT (strftime('%Y-%m-%d', 'now')),
+            parcela_atual INTEGER DEFAULT 1,
+            total_parcelas INTEGER DEFAULT 1,
+            id_grupo_parcela INTEGER DEFAULT NULL,
+            data_vencimento TEXT DEFAULT (strftime('%Y-%m-%d', 'now')),
+            hash_importacao TEXT DEFAULT NULL,
+            id_recorrencia INTEGER DEFAULT NULL,
+            {FLAGS_MASK_COLUMN}
+        )
+    """)
+    # ALTER TABLE não aceita default calculado; as datas vazias são preenchidas no passo seguinte
+    _adicionar_colunas(conn, "saidas", (
+        ("parcela_atual", "parcela_atual INTEGER DEFAULT 1"),
+        ("total_parcelas", "total_parcelas INTEGER DEFAULT 1"),
+        ("id_grupo_parcela", "id_grupo_parcela INTEGER DEFAULT NULL"),
+        ("data_vencimento", "data_vencimento TEXT"),
+        ("hash_importacao", "hash_importacao TEXT DEFAULT NULL"),
+        ("id_recorrencia", "id_recorrencia INTEGER DEFAULT NULL"),
+        ("flags_mask", FLAGS_MASK_COLUMN),
+    ))
+    _adicionar_colunas(conn, "entradas", (
+        ("data", "data TEXT"),
+        ("hash_importacao", "hash_importacao TEXT DEFAULT NULL"),
+    ))
+
+
+def _datas_vazias(conn):
+    """
+    Linhas de bancos antigos sem data recebem a data da migração
+    """
+    hoje = datetime.now().strftime('%Y-%m-%d')
+    yield from _preencher_em_lotes(conn, "saidas", "data_vencimento", hoje)
+    yield from _preencher_em_lotes(conn, "entradas", "data", hoje)
+
+
+def _grupos_parcela(conn):
+    """
+    Tabela de grupos de parcelas (aloca os ids de id_grupo_parcela)
+    """
+    if _existe(conn, "table", "grupos_parcela"):
+        return
+    conn.execute("""
+        CREATE TABLE grupos_parcela (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT,
+            valor_total REAL,
+            total_parcelas INTEGER,
+            criado_em TEXT DEFAULT (strftime('%Y-%m-%d', 'now'))
+        )
+    """)
+    # Registrar os grupos já existentes com os mesmos ids; o AUTOINCREMENT
+    # continua a partir do maior deles, então novos ids nunca colidem
+    conn.execute("""
+        INSERT INTO grupos_parcela (id, nome, valor_total, total_parcelas)
+        SELECT id_grupo_parcela, MIN(nome), SUM(valor), MAX(total_parcelas)
+        FROM saidas
+        WHERE id_grupo_parcela IS NOT NULL
+        GROUP BY id_grupo_parcela
+    """)
+
+
+def _indices(conn):
+    executar_script(conn, """
+        -- Deduplicação da importação de extratos
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_entradas_hash_importacao
+        ON entradas (hash_importacao) WHERE hash_importacao IS NOT NULL;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_saidas_hash_importacao
+        ON saidas (hash_importacao) WHERE hash_importacao IS NOT NULL;
+
+        CREATE INDEX IF NOT EXISTS idx_saidas_grupo
+        ON saidas (id_grupo_parcela, parcela_atual);
+
+        -- Índices de intervalo de datas (visões mensais e dashboard). Incluem as
+        -- colunas usadas nos filtros e somas para que as consultas sejam cobertas
+        -- pelo índice sem precisar ler a tabela.
+        CREATE INDEX IF NOT EXISTS idx_entradas_data
+        ON entradas (data, status, valor);
+        CREATE INDEX IF NOT EXISTS idx_saidas_data_vencimento
+        ON saidas (data_vencimento, flags_mask, valor);
+
+        -- Índices para a paginação por chave (data, id) das listagens completas
+        CREATE INDEX IF NOT EXISTS idx_entradas_data_id
+        ON entradas (data, id);
+        CREATE INDEX IF NOT EXISTS idx_saidas_data_vencimento_id
+        ON saidas (data_vencimento, id);
+
+        -- Índice parcial para a visão "somente parcelas" (GET /saidas?tipo=parcelas)
+        CREATE INDEX IF NOT EXISTS idx_saidas_parcelas
+        ON saidas (data_vencimento, id) WHERE total_parcelas > 1;
+        CREATE INDEX IF NOT EXISTS idx_saidas_flags_mask
+        ON saidas (flags_mask, data_vencimento);
+    """)
+
+
+def _recorrencias(conn):
+    """
+    Modelos de despesas recorrentes
+    """
+    executar_script(conn, RECORRENCIAS_SCHEMA)
+
+
+def _resumo_mensal(conn):
+    """
+    Resumo mensal e seus triggers; na criação é preenchido com o histórico
+    """
+    existia = _existe(conn, "table", "resumo_mensal")
+    executar_script(conn, RESUMO_SCHEMA)
+    if not existia:
+        rebuild_resumo_mensal(conn, commit=False)
+
+
+def _busca(conn):
+    """
+    Índices FTS5 dos nomes de entradas e saídas, preenchidos com o que já existe
+    """
+    executar_script(conn, BUSCA_SCHEMA)
+    rebuild_busca(conn, commit=False)
+
+
+def _categorias(conn):
+    """
+    Categorias, regras padrão e a coluna saidas.categoria_id
+    """
+    existia = _existe(conn, "table", "categorias")
+    _adicionar_colunas(conn, "saidas", (
+        ("categoria_id", "categoria_id INTEGER DEFAULT NULL"),
+    ))
+    executar_script(conn, CATEGORIAS_SCHEMA)
+    if not existia:
+        seed_categorias(conn)
+
+
+def _classificar_saidas(conn):
+    """
+    Classifica as saídas existentes pelas regras padrão (o índice de
+    categoria_id vem depois, em _indice_categorias)
+    """
+    maior = conn.execute("SELECT IFNULL(MAX(id), 0) FROM saidas").fetchone()[0]
+    for inicio in range(0, maior, TAMANHO_LOTE):
+        classificar(
+            conn, "saidas.id > ? AND saidas.id <= ? AND saidas.categoria_id IS NULL",
+            (inicio, inicio + TAMANHO_LOTE)
+        )
+        yield
+
+
+def _eventos(conn):
+    """
+    Histórico de eventos de entradas e saídas e os snapshots mensais; começa
+    vazio, com as linhas existentes valendo como o estado inicial
+    """
+    executar_script(conn, EVENTOS_SCHEMA)
+
+
+def _indice_categorias(conn):
+    """
+    Índice de categoria_id, criado depois da classificação para não ser
+    atualizado linha a linha. Bancos que passaram pela versão 9 antes de este
+    passo existir já o têm.
+    """
+    executar_script(conn, CATEGORIAS_INDICE)
+
+
+def _dia_vencimento_grupos(conn):
+    """
+    Dia de vencimento original de cada grupo de parcelas, de onde partem os
+    deslocamentos de vencimentos; nos grupos existentes, o da primeira parcela
+    """
+    _adicionar_colunas(conn, "grupos_parcela", (
+        ("dia_vencimento", "dia_vencimento INTEGER DEFAULT NULL"),
+    ))
+    conn.execute("""
+        UPDATE grupos_parcela SET dia_vencimento = (
+            SELECT CAST(substr(data_vencimento, 9, 2) AS INTEGER) FROM saidas
+            WHERE id_grupo_parcela = grupos_parcela.id
+            ORDER BY parcela_atual LIMIT 1
+        )
+        WHERE dia_vencimento IS NULL
+    """)
+
+
+def _recorrencias_excluidas(conn):
+    """
+    Registro das saídas recorrentes excluídas pelo usuário; as excluídas antes
+    dele são recuperadas do histórico de eventos
+    """
+    executar_script(conn, EXCLUIDAS_SCHEMA)
+    conn.execute("""
+        INSERT OR IGNORE INTO recorrencias_excluidas (id_recorrencia, ano_mes)
+        SELECT json_extract(antes, '$.id_recorrencia'), substr(json_extract(antes, '$.data_vencimento'), 1, 7)
+        FROM eventos
+        WHERE tabela = 'saidas' AND operacao = 'delete' AND json_valid(antes)
+          AND json_extract(antes, '$.id_recorrencia') IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM saidas s
+              WHERE s.id_recorrencia = json_extract(antes, '$.id_recorrencia')
+                AND substr(s.data_vencimento, 1, 7) = substr(json_extract(antes, '$.data_vencimento'), 1, 7)
+          )
+    """)
+
+
+def _meses_recorrencias(conn):
+    """
+    inicio/fim das recorrências gravados como 'YYYY-M' passam a 'YYYY-MM'. Como
+    são comparados como texto, parte dos meses ficava de fora ("2025-02" <
+    "2025-1"); esses meses, se já gerados, recebem agora as saídas
+    """
+    recorrencias = conn.execute("""
+        SELECT id, inicio, fim FROM recorrencias
+        WHERE inicio NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]'
+           OR fim NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]'
+    """).fetchall()
+    for recorrencia_id, inicio, fim in recorrencias:
+        try:
+            meses = [normalizar_mes(inicio), normalizar_mes(fim) if fim else None]
+        except ValueError:
+            logger.warning("recorrência %d com mês inválido: %r a %r", recorrencia_id, inicio, fim)
+            continue
+        conn.execute("UPDATE recorrencias SET inicio = ?, fim = ? WHERE id = ?", meses + [recorrencia_id])
+        aplicar_recorrencia(conn, recorrencia_id)
+
+
+# Passo n leva o banco à versão n
+MIGRACOES = [
+    _tabelas,
+    _datas_vazias,
+    _grupos_parcela,
+    _indices,
+    _recorrencias,
+    _resumo_mensal,
+    _busca,
+    _categorias,
+    _classificar_saidas,
+    _eventos,
+    _indice_categorias,
+    _dia_vencimento_grupos,
+    _recorrencias_excluidas,
+    _meses_recorrencias,
+]
+VERSAO_ATUAL = len(MIGRACOES)
+
+
+def versao_do_banco(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _aplicar(conn, versao, passo):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Outro processo pode ter aplicado o passo enquanto esperávamos o lock
+        if versao_do_banco(conn) >= versao:
+            conn.rollback()
+            return
+        resultado = passo(conn)
+        if inspect.isgenerator(resultado):
+            for _ in resultado:
+                conn.commit()
+                conn.execute("BEGIN IMMEDIATE")
+        conn.execute(f"PRAGMA user_version = {versao:d}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    logger.info("schema na versão %d (%s)", versao, passo.__name__.lstrip("_"))
+
+
+def migrate_db(conn=None):
+    """
+    Aplica os passos pendentes e devolve a versão final do schema
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
+    try:
+        versao = versao_do_banco(conn)
+        if versao >= VERSAO_ATUAL:
+            return versao
+
+        if conn.in_transaction:
+            conn.commit()
+        timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        conn.execute(f"PRAGMA busy_timeout = {MIGRACAO_TIMEOUT_MS:d}")
+        try:
+            for numero in range(versao + 1, VERSAO_ATUAL + 1):
+                _aplicar(conn, numero, MIGRACOES[numero - 1])
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {timeout:d}")
+        return versao_do_banco(conn)
+    finally:
+        if own_conn:
+            conn.close()
 
-def migrate_db():
-    conn = sqlite3.connect("db.sqlite3")
-    cursor = conn.cursor()
-    
-    # Get current date in YYYY-MM-DD format
-    current_date = datetime.now().strftime('%Y-%m-%d')
-    
-    # Check if the new columns exist in the saidas table
-    cursor.execute("PRAGMA table_info(saidas)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    # Add new columns if they don't exist
-    if "parcela_atual" not in columns:
-        cursor.execute("ALTER TABLE saidas ADD COLUMN parcela_atual INTEGER DEFAULT 1")
-    
-    if "total_parcelas" not in columns:
-        cursor.execute("ALTER TABLE saidas ADD COLUMN total_parcelas INTEGER DEFAULT 1")
-    
-    if "id_grupo_parcela" not in columns:
-        cursor.execute("ALTER TABLE saidas ADD COLUMN id_grupo_parcela INTEGER DEFAULT NULL")
-    
-    if "data_vencimento" not in columns:
-        cursor.execute(f"ALTER TABLE saidas ADD COLUMN data_vencimento TEXT DEFAULT '{current_date}'")
-        # Update all rows to have the current date
-        cursor.execute(f"UPDATE saidas SET data_vencimento = '{current_date}' WHERE data_vencimento IS NULL")
-    
-    # Check if data column exists in entradas
-    cursor.execute("PRAGMA table_info(entradas)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if "data" not in columns:
-        cursor.execute(f"ALTER TABLE entradas ADD COLUMN data TEXT DEFAULT '{current_date}'")
-        # Update all rows to have the current date
-        cursor.execute(f"UPDATE entradas SET data = '{current_date}' WHERE data IS NULL")
-    
-    conn.commit()
-    conn.close()
-    print("Database migration completed successfully!")
 
 if __name__ == "__main__":
-    migrate_db()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(f"Banco na versão {migrate_db()} do schema")
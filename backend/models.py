@@ -0,0 +1,44 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from flags import FLAGS
+
+# Limite de parcelas de uma compra (10 anos de parcelas mensais)
+MAX_PARCELAS = 120
+
+# Modelos Pydantic atualizados
+class Entrada(BaseModel):
+    nome: str
+    valor: float
+    status: str = "pendente"
+    data: Optional[str] = None
+
+class Saida(BaseModel):
+    nome: str
+    valor: float
+    flags: str = ""
+    data_vencimento: Optional[str] = None
+    parcelamento: Optional[int] = Field(None, ge=1, le=MAX_PARCELAS)  # Número de parcelas (2, 3, 5, 6, 10, etc.)
+
+class Recorrencia(BaseModel):
+    nome: str
+    valor: float
+    flags: str = ""
+    dia: int = 1                   # Dia do vencimento (limitado ao último dia do mês)
+    inicio: Optional[str] = None   # Primeiro mês (YYYY-MM), padrão o mês atual
+    fim: Optional[str] = None      # Último mês (YYYY-MM), sem fim se vazio
+    ativa: bool = True
+
+class Categoria(BaseModel):
+    nome: str
+
+class RegraCategoria(BaseModel):
+    padrao: str            # Ex: "cartao*" ou "luz|agua|internet" (palavras do nome)
+    regex: bool = False    # padrao é uma expressão regular
+    prioridade: int = 0    # Regras de maior prioridade são testadas primeiro
+
+class GrupoParcelaUpdate(BaseModel):
+    nome: Optional[str] = None             # Novo nome, sem o sufixo (n/total)
+    valor_total: Optional[float] = None    # Novo valor total da compra
+    adicionar_flags: List[str] = Field([], max_length=len(FLAGS))  # Ex: ["feito"]
+    remover_flags: List[str] = Field([], max_length=len(FLAGS))
+    deslocar_meses: Optional[int] = None   # Adia (ou antecipa, se negativo) os vencimentos
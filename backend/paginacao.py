@@ -0,0 +1,71 @@
+import json
+from fastapi import HTTPException
+
+# Linhas lidas do SQLite por vez no modo de streaming
+TAMANHO_BLOCO = 500
+
+# Itens por página das listagens quando o cliente não informa limit, e o máximo aceito
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+
+def make_cursor(data, id):
+    """
+    Cursor da próxima página no formato "YYYY-MM-DD:id"
+    """
+    return f"{data}:{id}"
+
+
+def parse_cursor(after):
+    try:
+        data, id = after.rsplit(":", 1)
+        return data, int(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Cursor inválido: {after}")
+
+
+def keyset_query(tabela, colunas, coluna_data, descendente=False, where=None, params=(), limit=None, after=None):
+    """
+    Monta a consulta paginada por chave (coluna_data, id). A página seguinte
+    começa logo depois do último item da anterior, então cada página custa o
+    mesmo independente de quantas já foram lidas (sem OFFSET).
+    """
+    condicoes = list(where or [])
+    params = list(params)
+    if after:
+        condicoes.append(f"({coluna_data}, id) {'<' if descendente else '>'} (?, ?)")
+        params.extend(parse_cursor(after))
+
+    ordem = "DESC" if descendente else "ASC"
+    sql = f"SELECT {colunas} FROM {tabela}"
+    if condicoes:
+        sql += f" WHERE {' AND '.join(condicoes)}"
+    sql += f" ORDER BY {coluna_data} {ordem}, id {ordem}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def proximo_cursor(itens, coluna_data, limit, colunas=None):
+    """
+    Cursor para a próxima página, ou None se esta foi a última. Com `colunas`,
+    os itens são tuplas nessa ordem de colunas em vez de dicts.
+    """
+    if not limit or len(itens) < limit:
+        return None
+    ultimo = dict(zip(colunas, itens[-1])) if colunas else itens[-1]
+    return make_cursor(ultimo[coluna_data], ultimo["id"])
+
+
+def stream_ndjson(pool, sql, params):
+    """
+    Gera as linhas da consulta em NDJSON à medida que são lidas do banco
+    """
+    with pool.connection() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            bloco = cursor.fetchmany(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            yield "".join(json.dumps(dict(row), ensure_ascii=False) + "\n" for row in bloco)
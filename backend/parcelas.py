@@ -0,0 +1,193 @@
+import calendar
+import json
+import re
+from datetime import date, datetime
+from fastapi import HTTPException
+from flags import FLAGS, alterar_flags, validar_alteracao_flags
+
+
+def add_months(data, meses):
+    """
+    Soma meses a uma data, ajustando o dia ao último dia do mês quando
+    necessário (ex: 31/01 + 1 mês = 28/02 ou 29/02)
+    """
+    total = data.month - 1 + meses
+    ano = data.year + total // 12
+    mes = total % 12 + 1
+    dia = min(data.day, calendar.monthrange(ano, mes)[1])
+    return date(ano, mes, dia)
+
+
+def datas_parcelas(data_inicial, parcelas):
+    """
+    Calcula de uma vez os vencimentos de todas as parcelas. Cada vencimento é
+    contado a partir da data inicial (e não da parcela anterior), para que uma
+    compra no dia 31 volte ao dia 31 nos meses que o têm.
+    """
+    inicio = datetime.strptime(data_inicial, '%Y-%m-%d').date()
+    return [add_months(inicio, i).strftime('%Y-%m-%d') for i in range(parcelas)]
+
+
+def valores_parcelas(valor_total, parcelas):
+    """
+    Divide o valor em parcelas arredondadas a centavos; a última parcela
+    absorve a diferença do arredondamento para que a soma feche com o total
+    (ex: 100 em 3 = 33,33 + 33,33 + 33,34)
+    """
+    valor_parcela = round(valor_total / parcelas, 2)
+    ultima = round(valor_total - valor_parcela * (parcelas - 1), 2)
+    return [valor_parcela] * (parcelas - 1) + [ultima]
+
+
+def deslocar_vencimentos(vencimentos, meses, dia_original):
+    """
+    Desloca vencimentos 'YYYY-MM-DD' em alguns meses, cada um mantendo o seu
+    dia (inclusive os alterados à mão). Um vencimento no último dia do mês
+    pode ter sido ajustado (compra do dia 31 que caiu em 28/02); esse volta
+    ao dia_original, o da compra (grupos_parcela.dia_vencimento), nos meses
+    que o têm.
+    """
+    novas = []
+    for vencimento in vencimentos:
+        d = datetime.strptime(vencimento, '%Y-%m-%d').date()
+        dia = d.day
+        if dia == calendar.monthrange(d.year, d.month)[1]:
+            dia = max(dia, dia_original)
+        novo = add_months(d.replace(day=1), meses)
+        novo = novo.replace(day=min(dia, calendar.monthrange(novo.year, novo.month)[1]))
+        novas.append(novo.strftime('%Y-%m-%d'))
+    return novas
+
+
+def insert_parcelas(conn, nome, valor_total, flags, parcelas, data_inicial):
+    """
+    Insere todas as parcelas de uma compra numa única transação: aloca o grupo
+    em grupos_parcela (com o dia de vencimento original) e grava as linhas com
+    um só executemany.
+    Retorna o id da primeira parcela.
+    """
+    valores = valores_parcelas(valor_total, parcelas)
+    vencimentos = datas_parcelas(data_inicial, parcelas)
+
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO grupos_parcela (nome, valor_total, total_parcelas, dia_vencimento) VALUES (?, ?, ?, ?)",
+            (nome, valor_total, parcelas, int(vencimentos[0][8:10]))
+        )
+        id_grupo = cursor.lastrowid
+
+        cursor.executemany("""
+            INSERT INTO saidas
+            (nome, valor, flags, parcela_atual, total_parcelas, id_grupo_parcela, data_vencimento)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (f"{nome} ({i}/{parcelas})", valor, flags, i, parcelas, id_grupo, vencimento)
+            for i, (valor, vencimento) in enumerate(zip(valores, vencimentos), start=1)
+        ])
+
+        # lastrowid não é atualizado pelo executemany
+        cursor.execute(
+            "SELECT id FROM saidas WHERE id_grupo_parcela = ? AND parcela_atual = 1",
+            (id_grupo,)
+        )
+        return cursor.fetchone()[0]
+
+
+def escopo_sql(escopo):
+    """
+    Condição SQL das parcelas atingidas por uma operação no grupo:
+      all         todas as parcelas
+      remaining   as que ainda não foram pagas (sem a flag feito)
+      from=n      a parcela n e as seguintes
+    """
+    if escopo == "all":
+        return "1", []
+    if escopo == "remaining":
+        return "flags_mask & ? = 0", [FLAGS["feito"]]
+    match = re.fullmatch(r"from=(\d+)", escopo)
+    if match:
+        return "parcela_atual >= ?", [int(match.group(1))]
+    raise HTTPException(status_code=400, detail=f"Escopo inválido: {escopo}. Use all, remaining ou from=n")
+
+
+def update_grupo(conn, grupo_id, alteracoes, escopo="all", colunas="*"):
+    """
+    Aplica as alterações (GrupoParcelaUpdate) às parcelas do grupo dentro do
+    escopo com um único UPDATE, numa transação. Com valor_total, o valor que
+    falta (total menos as parcelas fora do escopo) é redistribuído entre as
+    parcelas do escopo, com o ajuste de centavos na última.
+    Retorna as parcelas alteradas, com as colunas pedidas.
+    """
+    cond, cond_params = escopo_sql(escopo)
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT id, parcela_atual, valor, flags, data_vencimento, {cond} AS no_escopo
+            FROM saidas WHERE id_grupo_parcela = ?
+            ORDER BY parcela_atual
+        """, cond_params + [grupo_id])
+        linhas = cursor.fetchall()
+        if not linhas:
+            raise HTTPException(status_code=404, detail="Grupo de parcelas não encontrado")
+        alvo = [row for row in linhas if row["no_escopo"]]
+        if not alvo:
+            return []
+
+        sets = []
+        params = []
+        if alteracoes.nome is not None:
+            sets.append("nome = ? || ' (' || parcela_atual || '/' || total_parcelas || ')'")
+            params.append(alteracoes.nome)
+        if alteracoes.valor_total is not None:
+            fora = sum(row["valor"] for row in linhas if not row["no_escopo"])
+            valores = valores_parcelas(alteracoes.valor_total - fora, len(alvo))
+            if valores[0] < 0 or valores[-1] < 0:
+                raise HTTPException(status_code=400, detail="valor_total menor que as parcelas fora do escopo")
+            sets.append("valor = CASE WHEN id = ? THEN ? ELSE ? END")
+            params.extend([alvo[-1]["id"], valores[-1], valores[0]])
+        if alteracoes.adicionar_flags or alteracoes.remover_flags:
+            adicionar, remover = validar_alteracao_flags(alteracoes.adicionar_flags, alteracoes.remover_flags)
+            sets.append("flags = json_extract(?, '$.\"' || id || '\"')")
+            params.append(json.dumps({str(row["id"]): alterar_flags(row["flags"], adicionar, remover) for row in alvo}))
+        if alteracoes.deslocar_meses:
+            grupo = cursor.execute("SELECT dia_vencimento FROM grupos_parcela WHERE id = ?", (grupo_id,)).fetchone()
+            dia_original = grupo["dia_vencimento"] if grupo else None
+            if dia_original is None:
+                # Grupo sem o dia gravado (dump anterior à coluna): o da primeira parcela
+                primeira = next((row for row in linhas if row["parcela_atual"] == 1), linhas[0])
+                dia_original = int(primeira["data_vencimento"][8:10])
+            novas = deslocar_vencimentos([row["data_vencimento"] for row in alvo], alteracoes.deslocar_meses, dia_original)
+            sets.append("data_vencimento = json_extract(?, '$.\"' || id || '\"')")
+            params.append(json.dumps({str(row["id"]): data for row, data in zip(alvo, novas)}))
+        if not sets:
+            raise HTTPException(status_code=400, detail="Nenhuma alteração informada")
+
+        cursor.execute(f"""
+            UPDATE saidas SET {", ".join(sets)}
+            WHERE id_grupo_parcela = ? AND {cond}
+        """, params + [grupo_id] + cond_params)
+
+        if alteracoes.nome is not None or alteracoes.valor_total is not None:
+            cursor.execute("""
+                UPDATE grupos_parcela
+                SET nome = IFNULL(?, nome), valor_total = IFNULL(?, valor_total)
+                WHERE id = ?
+            """, (alteracoes.nome, alteracoes.valor_total, grupo_id))
+
+        cursor.execute(
+            f"SELECT {colunas} FROM saidas WHERE id_grupo_parcela = ? AND id IN ({', '.join('?' for _ in alvo)}) ORDER BY parcela_atual",
+            [grupo_id] + [row["id"] for row in alvo]
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def delete_grupo(conn, grupo_id, escopo="all"):
+    """
+    Remove as parcelas do grupo dentro do escopo; retorna quantas foram removidas
+    """
+    cond, cond_params = escopo_sql(escopo)
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(f"DELETE FROM saidas WHERE id_grupo_parcela = ? AND {cond}", [grupo_id] + cond_params)
+        return cursor.rowcount
@@ -0,0 +1,122 @@
+from datetime import datetime
+from fastapi import HTTPException
+
+# Modelos de despesas recorrentes e registro dos meses já gerados. As saídas de
+# um mês são criadas a partir dos modelos só quando o mês é consultado pela
+# primeira vez, então não há anos de linhas futuras pré-criadas.
+RECORRENCIAS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS recorrencias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        valor REAL NOT NULL,
+        flags TEXT DEFAULT '',
+        dia INTEGER NOT NULL DEFAULT 1,
+        inicio TEXT NOT NULL,
+        fim TEXT DEFAULT NULL,
+        ativa INTEGER NOT NULL DEFAULT 1
+    );
+
+    CREATE TABLE IF NOT EXISTS recorrencias_meses (
+        ano_mes TEXT PRIMARY KEY NOT NULL
+    ) WITHOUT ROWID;
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_saidas_recorrencia
+    ON saidas (id_recorrencia, substr(data_vencimento, 1, 7))
+    WHERE id_recorrencia IS NOT NULL;
+"""
+
+# Meses em que o usuário excluiu a saída gerada por uma recorrência (ou a
+# mudou de mês), para que ela não seja gerada de novo quando a recorrência é
+# alterada
+EXCLUIDAS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS recorrencias_excluidas (
+        id_recorrencia INTEGER NOT NULL,
+        ano_mes TEXT NOT NULL,
+        PRIMARY KEY (id_recorrencia, ano_mes)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS recorrencias_saidas_delete AFTER DELETE ON saidas
+    WHEN OLD.id_recorrencia IS NOT NULL
+    BEGIN
+        INSERT OR IGNORE INTO recorrencias_excluidas (id_recorrencia, ano_mes)
+        VALUES (OLD.id_recorrencia, substr(OLD.data_vencimento, 1, 7));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS recorrencias_saidas_mes AFTER UPDATE OF data_vencimento, id_recorrencia ON saidas
+    WHEN OLD.id_recorrencia IS NOT NULL
+     AND (NEW.id_recorrencia IS NOT OLD.id_recorrencia
+          OR substr(NEW.data_vencimento, 1, 7) IS NOT substr(OLD.data_vencimento, 1, 7))
+    BEGIN
+        INSERT OR IGNORE INTO recorrencias_excluidas (id_recorrencia, ano_mes)
+        VALUES (OLD.id_recorrencia, substr(OLD.data_vencimento, 1, 7));
+    END;
+"""
+
+# Gera as saídas dos modelos ativos nos meses já registrados, menos onde a
+# saída foi excluída. O dia de vencimento é limitado ao último dia do mês
+# (dia 31 vira 28/02) e o índice único por (recorrência, mês) torna a operação
+# idempotente.
+GERAR_SQL = """
+    INSERT OR IGNORE INTO saidas (nome, valor, flags, data_vencimento, id_recorrencia)
+    SELECT r.nome, r.valor, r.flags,
+           m.ano_mes || '-' || printf('%02d', MIN(r.dia, CAST(strftime('%d', m.ano_mes || '-01', '+1 month', '-1 day') AS INTEGER))),
+           r.id
+    FROM recorrencias r
+    JOIN recorrencias_meses m ON m.ano_mes >= r.inicio AND (r.fim IS NULL OR m.ano_mes <= r.fim)
+    WHERE r.ativa = 1 AND {filtro}
+      AND NOT EXISTS (
+          SELECT 1 FROM recorrencias_excluidas x WHERE x.id_recorrencia = r.id AND x.ano_mes = m.ano_mes
+      )
+"""
+
+
+def materializar_mes(conn, ano_mes):
+    """
+    Gera de uma vez as saídas recorrentes do mês 'YYYY-MM', se ainda não foram
+    geradas. Retorna quantas saídas foram criadas.
+    """
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT OR IGNORE INTO recorrencias_meses (ano_mes) VALUES (?)", (ano_mes,))
+        if cursor.rowcount == 0:
+            return 0
+        cursor.execute(GERAR_SQL.format(filtro="m.ano_mes = ?"), (ano_mes,))
+        return cursor.rowcount
+
+
+def aplicar_recorrencia(conn, recorrencia_id):
+    """
+    Gera as saídas de uma recorrência nova (ou alterada) nos meses que já
+    foram gerados, para que ela apareça também nos meses já consultados. As
+    saídas já geradas continuam como estão, e as excluídas não voltam.
+    """
+    conn.execute(GERAR_SQL.format(filtro="r.id = ?"), (recorrencia_id,))
+
+
+def normalizar_mes(valor):
+    """
+    'YYYY-M' ou 'YYYY-MM' em 'YYYY-MM'; os meses são comparados como texto
+    """
+    return datetime.strptime(valor, "%Y-%m").strftime("%Y-%m")
+
+
+def validar_recorrencia(recorrencia):
+    """
+    Normaliza inicio/fim (YYYY-MM) e rejeita modelos inconsistentes;
+    devolve (inicio, fim)
+    """
+    meses = {}
+    for campo, valor in (("inicio", recorrencia.inicio or datetime.now().strftime("%Y-%m")), ("fim", recorrencia.fim)):
+        try:
+            meses[campo] = normalizar_mes(valor) if valor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{campo} inválido (use YYYY-MM): {valor}")
+    inicio, fim = meses["inicio"], meses["fim"]
+    if fim and fim < inicio:
+        raise HTTPException(status_code=400, detail="fim deve ser posterior ou igual a inicio")
+    if not 1 <= recorrencia.dia <= 31:
+        raise HTTPException(status_code=400, detail="dia deve estar entre 1 e 31")
+    flags = [f.strip() for f in recorrencia.flags.split(",") if f.strip()]
+    if "no_rec" in flags:
+        raise HTTPException(status_code=400, detail="Uma recorrência não pode ter a flag no_rec")
+    return inicio, fim
@@ -0,0 +1,152 @@
+from datetime import datetime
+from itertools import accumulate
+from fastapi import HTTPException
+from flags import FLAGS
+
+# Maior intervalo aceito por /relatorios, em meses
+MAX_MESES = 120
+
+# Séries devolvidas por get_relatorio, na ordem das colunas da consulta
+SERIES = (
+    "entradas", "entradas_recebidas", "saidas", "saidas_pagas",
+    "saldo", "saldo_acumulado", "parcelas",
+)
+
+# Uma única consulta: gera a sequência de meses do intervalo, junta o resumo
+# mensal e a carga de parcelas de cada mês e calcula o saldo acumulado com uma
+# função de janela, partindo do saldo de todos os meses anteriores ao intervalo.
+RELATORIO_SQL = """
+    WITH RECURSIVE meses(ano_mes) AS (
+        SELECT :de
+        UNION ALL
+        SELECT strftime('%Y-%m', ano_mes || '-01', '+1 month') FROM meses WHERE ano_mes < :ate
+    ),
+    parcelas AS (
+        SELECT substr(data_vencimento, 1, 7) AS ano_mes, SUM(valor) AS total
+        FROM saidas
+        WHERE total_parcelas > 1 AND data_vencimento BETWEEN :de || '-01' AND :ate || '-31'
+        GROUP BY 1
+    )
+    SELECT m.ano_mes,
+           IFNULL(r.entradas_totais, 0),
+           IFNULL(r.entradas_recebidas, 0),
+           IFNULL(r.saidas_totais, 0),
+           IFNULL(r.saidas_pagas, 0),
+           IFNULL(r.entradas_recebidas - r.saidas_pagas, 0),
+           (SELECT IFNULL(SUM(entradas_recebidas - saidas_pagas), 0) FROM resumo_mensal WHERE ano_mes < :de)
+             + SUM(IFNULL(r.entradas_recebidas - r.saidas_pagas, 0)) OVER (ORDER BY m.ano_mes),
+           IFNULL(p.total, 0)
+    FROM meses m
+    LEFT JOIN resumo_mensal r ON r.ano_mes = m.ano_mes
+    LEFT JOIN parcelas p ON p.ano_mes = m.ano_mes
+    ORDER BY m.ano_mes
+"""
+
+
+def parse_ano_mes(texto):
+    try:
+        return datetime.strptime(texto, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Mês inválido (use YYYY-MM): {texto}")
+
+
+def intervalo_padrao(hoje=None):
+    """
+    Últimos 12 meses, terminando no mês atual
+    """
+    hoje = hoje or datetime.now()
+    total = hoje.year * 12 + hoje.month - 1 - 11
+    return f"{total // 12:04d}-{total % 12 + 1:02d}", hoje.strftime("%Y-%m")
+
+
+def get_relatorio(conn, de, ate):
+    """
+    Séries mensais de de até ate (YYYY-MM, inclusive) em formato colunar:
+    {"periodos": [...], "entradas": [...], ...}, um valor por mês em cada série
+    """
+    meses = (int(ate[:4]) * 12 + int(ate[5:])) - (int(de[:4]) * 12 + int(de[5:])) + 1
+    if meses < 1:
+        raise HTTPException(status_code=400, detail="'de' deve ser anterior ou igual a 'ate'")
+    if meses > MAX_MESES:
+        raise HTTPException(status_code=400, detail=f"Intervalo máximo de {MAX_MESES} meses")
+
+    cursor = conn.cursor()
+    cursor.execute(RELATORIO_SQL, {"de": de, "ate": ate})
+    linhas = cursor.fetchall()
+
+    relatorio = {"periodos": [row[0] for row in linhas]}
+    for i, serie in enumerate(SERIES, start=1):
+        relatorio[serie] = [round(row[i], 2) for row in linhas]
+    return relatorio
+
+
+# Previsão: tudo o que ainda vai entrar ou sair, agrupado por mês numa única
+# consulta. Valores pendentes de meses passados caem no mês atual. Para os
+# meses cujas recorrências ainda não foram geradas, entram os modelos ativos.
+PREVISAO_SQL = """
+    WITH RECURSIVE meses(ano_mes, n) AS (
+        SELECT :inicio, 1
+        UNION ALL
+        SELECT strftime('%Y-%m', ano_mes || '-01', '+1 month'), n + 1 FROM meses WHERE n < :meses
+    ),
+    movimentos(ano_mes, entrada, saida, parcela, recorrente) AS (
+        SELECT MAX(substr(data, 1, 7), :inicio), valor, 0, 0, 0
+        FROM entradas
+        WHERE data < :fim AND status != 'recebido'
+        UNION ALL
+        SELECT MAX(substr(data_vencimento, 1, 7), :inicio), 0, valor,
+               CASE WHEN id_grupo_parcela IS NOT NULL THEN valor ELSE 0 END,
+               CASE WHEN id_recorrencia IS NOT NULL THEN valor ELSE 0 END
+        FROM saidas
+        WHERE data_vencimento < :fim AND flags_mask & :feito = 0
+        UNION ALL
+        SELECT m.ano_mes, 0, r.valor, 0, r.valor
+        FROM recorrencias r
+        JOIN meses m ON m.ano_mes >= r.inicio AND (r.fim IS NULL OR m.ano_mes <= r.fim)
+        WHERE r.ativa = 1
+          AND (',' || r.flags || ',') NOT LIKE '%,feito,%'
+          AND m.ano_mes NOT IN (SELECT ano_mes FROM recorrencias_meses)
+    )
+    SELECT m.ano_mes,
+           IFNULL(SUM(v.entrada), 0),
+           IFNULL(SUM(v.saida), 0),
+           IFNULL(SUM(v.parcela), 0),
+           IFNULL(SUM(v.recorrente), 0),
+           (SELECT IFNULL(SUM(entradas_recebidas - saidas_pagas), 0) FROM resumo_mensal)
+    FROM meses m
+    LEFT JOIN movimentos v ON v.ano_mes = m.ano_mes
+    GROUP BY m.ano_mes
+    ORDER BY m.ano_mes
+"""
+
+
+def get_previsao(conn, meses, hoje=None):
+    """
+    Projeção do saldo mês a mês a partir do mês atual, em formato colunar.
+    O saldo inicial é o realizado até hoje (recebido menos pago); cada mês
+    soma as entradas pendentes e subtrai as saídas ainda não pagas.
+    """
+    hoje = hoje or datetime.now()
+    inicio = hoje.strftime("%Y-%m")
+    total = hoje.year * 12 + hoje.month - 1 + meses
+    fim = f"{total // 12:04d}-{total % 12 + 1:02d}-01"
+
+    cursor = conn.cursor()
+    cursor.execute(PREVISAO_SQL, {"inicio": inicio, "meses": meses, "fim": fim, "feito": FLAGS["feito"]})
+    linhas = cursor.fetchall()
+
+    saldo_inicial = round(linhas[0][5], 2)
+    entradas = [round(row[1], 2) for row in linhas]
+    saidas = [round(row[2], 2) for row in linhas]
+    return {
+        "saldo_inicial": saldo_inicial,
+        "periodos": [row[0] for row in linhas],
+        "entradas": entradas,
+        "saidas": saidas,
+        "parcelas": [round(row[3], 2) for row in linhas],
+        "recorrentes": [round(row[4], 2) for row in linhas],
+        "saldo": [
+            round(saldo, 2)
+            for saldo in accumulate((e - s for e, s in zip(entradas, saidas)), initial=saldo_inicial)
+        ][1:],
+    }
@@ -0,0 +1,165 @@
+import sqlite3
+from db_pool import DB_PATH
+
+# Tabela de resumo mensal mantida por triggers: uma linha por ano-mês com os
+# totais usados pelo dashboard, para que /dashboard seja uma leitura de uma
+# única linha em vez de vários SUM sobre as tabelas inteiras.
+RESUMO_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS resumo_mensal (
+        ano_mes TEXT PRIMARY KEY NOT NULL,
+        entradas_recebidas REAL NOT NULL DEFAULT 0,
+        entradas_totais REAL NOT NULL DEFAULT 0,
+        qtd_entradas INTEGER NOT NULL DEFAULT 0,
+        saidas_pagas REAL NOT NULL DEFAULT 0,
+        saidas_totais REAL NOT NULL DEFAULT 0,
+        itens_parcelados INTEGER NOT NULL DEFAULT 0,
+        qtd_saidas INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS resumo_entradas_insert AFTER INSERT ON entradas
+    BEGIN
+        INSERT OR IGNORE INTO resumo_mensal (ano_mes) VALUES (substr(NEW.data, 1, 7));
+        UPDATE resumo_mensal SET
+            entradas_recebidas = entradas_recebidas + (CASE WHEN NEW.status = 'recebido' THEN NEW.valor ELSE 0 END),
+            entradas_totais = entradas_totais + NEW.valor,
+            qtd_entradas = qtd_entradas + 1
+        WHERE ano_mes = substr(NEW.data, 1, 7);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS resumo_entradas_delete AFTER DELETE ON entradas
+    BEGIN
+        UPDATE resumo_mensal SET
+            entradas_recebidas = entradas_recebidas - (CASE WHEN OLD.status = 'recebido' THEN OLD.valor ELSE 0 END),
+            entradas_totais = entradas_totais - OLD.valor,
+            qtd_entradas = qtd_entradas - 1
+        WHERE ano_mes = substr(OLD.data, 1, 7);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS resumo_entradas_update AFTER UPDATE OF valor, status, data ON entradas
+    BEGIN
+        UPDATE resumo_mensal SET
+            entradas_recebidas = entradas_recebidas - (CASE WHEN OLD.status = 'recebido' THEN OLD.valor ELSE 0 END),
+            entradas_totais = entradas_totais - OLD.valor,
+            qtd_entradas = qtd_entradas - 1
+        WHERE ano_mes = substr(OLD.data, 1, 7);
+        INSERT OR IGNORE INTO resumo_mensal (ano_mes) VALUES (substr(NEW.data, 1, 7));
+        UPDATE resumo_mensal SET
+            entradas_recebidas = entradas_recebidas + (CASE WHEN NEW.status = 'recebido' THEN NEW.valor ELSE 0 END),
+            entradas_totais = entradas_totais + NEW.valor,
+            qtd_entradas = qtd_entradas + 1
+        WHERE ano_mes = substr(NEW.data, 1, 7);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS resumo_saidas_insert AFTER INSERT ON saidas
+    BEGIN
+        INSERT OR IGNORE INTO resumo_mensal (ano_mes) VALUES (substr(NEW.data_vencimento, 1, 7));
+        UPDATE resumo_mensal SET
+            saidas_pagas = saidas_pagas + (CASE WHEN (',' || NEW.flags || ',') LIKE '%,feito,%' THEN NEW.valor ELSE 0 END),
+            saidas_totais = saidas_totais + NEW.valor,
+            itens_parcelados = itens_parcelados + (IFNULL(NEW.total_parcelas, 1) > 1),
+            qtd_saidas = qtd_saidas + 1
+        WHERE ano_mes = substr(NEW.data_vencimento, 1, 7);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS resumo_saidas_delete AFTER DELETE ON saidas
+    BEGIN
+        UPDATE resumo_mensal SET
+            saidas_pagas = saidas_pagas - (CASE WHEN (',' || OLD.flags || ',') LIKE '%,feito,%' THEN OLD.valor ELSE 0 END),
+            saidas_totais = saidas_totais - OLD.valor,
+            itens_parcelados = itens_parcelados - (IFNULL(OLD.total_parcelas, 1) > 1),
+            qtd_saidas = qtd_saidas - 1
+        WHERE ano_mes = substr(OLD.data_vencimento, 1, 7);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS resumo_saidas_update
+    AFTER UPDATE OF valor, flags, total_parcelas, data_vencimento ON saidas
+    BEGIN
+        UPDATE resumo_mensal SET
+            saidas_pagas = saidas_pagas - (CASE WHEN (',' || OLD.flags || ',') LIKE '%,feito,%' THEN OLD.valor ELSE 0 END),
+            saidas_totais = saidas_totais - OLD.valor,
+            itens_parcelados = itens_parcelados - (IFNULL(OLD.total_parcelas, 1) > 1),
+            qtd_saidas = qtd_saidas - 1
+        WHERE ano_mes = substr(OLD.data_vencimento, 1, 7);
+        INSERT OR IGNORE INTO resumo_mensal (ano_mes) VALUES (substr(NEW.data_vencimento, 1, 7));
+        UPDATE resumo_mensal SET
+            saidas_pagas = saidas_pagas + (CASE WHEN (',' || NEW.flags || ',') LIKE '%,feito,%' THEN NEW.valor ELSE 0 END),
+            saidas_totais = saidas_totais + NEW.valor,
+            itens_parcelados = itens_parcelados + (IFNULL(NEW.total_parcelas, 1) > 1),
+            qtd_saidas = qtd_saidas + 1
+        WHERE ano_mes = substr(NEW.data_vencimento, 1, 7);
+    END;
+"""
+
+
+def create_resumo_mensal(cursor):
+    """
+    Cria a tabela resumo_mensal e os triggers que a mantêm atualizada
+    """
+    cursor.executescript(RESUMO_SCHEMA)
+
+
+def rebuild_resumo_mensal(conn, commit=True):
+    """
+    Recalcula todo o resumo a partir de entradas e saídas (para bancos existentes
+    ou para corrigir qualquer divergência acumulada); com commit=False fica na
+    transação de quem chamou
+    """
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM resumo_mensal")
+    cursor.execute("""
+        INSERT INTO resumo_mensal
+        (ano_mes, entradas_recebidas, entradas_totais, qtd_entradas,
+         saidas_pagas, saidas_totais, itens_parcelados, qtd_saidas)
+        SELECT ano_mes, SUM(er), SUM(et), SUM(qe), SUM(sp), SUM(st), SUM(ip), SUM(qs)
+        FROM (
+            SELECT substr(data, 1, 7) AS ano_mes,
+                   CASE WHEN status = 'recebido' THEN valor ELSE 0 END AS er,
+                   valor AS et, 1 AS qe, 0 AS sp, 0 AS st, 0 AS ip, 0 AS qs
+            FROM entradas
+            WHERE data IS NOT NULL
+            UNION ALL
+            SELECT substr(data_vencimento, 1, 7),
+                   0, 0, 0,
+                   CASE WHEN (',' || flags || ',') LIKE '%,feito,%' THEN valor ELSE 0 END,
+                   valor, IFNULL(total_parcelas, 1) > 1, 1
+            FROM saidas
+            WHERE data_vencimento IS NOT NULL
+        )
+        GROUP BY ano_mes
+    """)
+    if commit:
+        conn.commit()
+
+
+def get_resumo(conn, ano_mes):
+    """
+    Retorna a linha do resumo para o mês 'YYYY-MM' (ou None se não houver dados)
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM resumo_mensal WHERE ano_mes = ?", (ano_mes,))
+    return cursor.fetchone()
+
+
+
+def get_meses(conn):
+    """
+    Meses com ao menos uma entrada ou saída, do mais recente ao mais antigo.
+    Lê só o resumo (uma linha por mês), então o custo não depende de quantos
+    registros existem.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT ano_mes FROM resumo_mensal
+        WHERE qtd_entradas > 0 OR qtd_saidas > 0
+        ORDER BY ano_mes DESC
+    """)
+    return [{"ano": int(row[0][:4]), "mes": int(row[0][5:7])} for row in cursor.fetchall()]
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DB_PATH)
+    create_resumo_mensal(conn.cursor())
+    rebuild_resumo_mensal(conn)
+    total = conn.execute("SELECT COUNT(*) FROM resumo_mensal").fetchone()[0]
+    conn.close()
+    print(f"Resumo mensal reconstruído: {total} meses.")
@@ -0,0 +1,83 @@
+"""
+Benchmark da serialização das listagens: as mesmas N linhas de saidas
+servidas de três formas por um app FastAPI mínimo, sem servidor HTTP:
+
+- modelo:   response_model=List[dict] devolvendo a lista (cada linha é
+            validada pelo pydantic antes de serializar, como era antes)
+- direto:   FastJSONResponse com a lista de dicts
+- colunas:  FastJSONResponse com {"colunas": [...], "linhas": [...]}
+
+Imprime o menor tempo por requisição, o custo por linha e o tamanho do corpo.
+
+Uso:
+    python bench/bench_json.py [--linhas 10000] [--repeticoes 20]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from typing import List
+
+from bench_pool import BACKEND, criar_banco  # noqa: F401 (coloca o backend no sys.path)
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from json_rapido import FastJSONResponse, rows_to_columns, rows_to_dicts  # noqa: E402
+import json_rapido  # noqa: E402
+
+
+def criar_app(db_path, linhas):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    sql = f"SELECT * FROM saidas ORDER BY data_vencimento DESC, id DESC LIMIT {linhas}"
+    app = FastAPI()
+
+    @app.get("/modelo", response_model=List[dict])
+    def modelo():
+        return rows_to_dicts(conn.execute(sql))
+
+    @app.get("/direto")
+    def direto():
+        return FastJSONResponse(rows_to_dicts(conn.execute(sql)))
+
+    @app.get("/colunas")
+    def colunas():
+        return FastJSONResponse(rows_to_columns(conn.execute(sql)))
+
+    return app
+
+
+def medir(client, rota, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        r = client.get(rota)
+        tempos.append(time.perf_counter() - inicio)
+        assert r.status_code == 200, r.text
+    return min(tempos), len(r.content)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=10000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.sqlite3")
+        criar_banco(db_path, args.linhas)
+        client = TestClient(criar_app(db_path, args.linhas))
+
+        print(f"{args.linhas} linhas, serializador: {'orjson' if json_rapido.orjson else 'pydantic_core'}")
+        base = None
+        for rota in ("/modelo", "/direto", "/colunas"):
+            client.get(rota)
+            melhor, tamanho = medir(client, rota, args.repeticoes)
+            base = base or melhor
+            print(f"{rota:10} {melhor * 1000:8.1f} ms  {melhor / args.linhas * 1e6:6.2f} us/linha  "
+                  f"{tamanho / 1024:8.0f} KiB  {base / melhor:4.1f}x")
+
+
+if __name__ == "__main__":
+    main()
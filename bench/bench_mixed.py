@@ -0,0 +1,138 @@
+"""
+Benchmark de carga mista: leitores em /saidas e /dashboard enquanto outros
+clientes gravam saídas (simples e parceladas) ao mesmo tempo. Mede a latência
+de cada requisição e imprime p50/p95/p99 por rota.
+
+Para comparar com outra versão do backend (por exemplo os handlers síncronos
+de um commit anterior), rode novamente apontando --app-dir para a pasta
+backend de um checkout dessa versão:
+
+    git worktree add /tmp/antes HEAD~1
+    python bench/bench_mixed.py --app-dir /tmp/antes/backend
+
+Uso:
+    python bench/bench_mixed.py [--linhas 5000] [--duracao 5] [--leitores 16] [--escritores 4]
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+from bench_pool import BACKEND, criar_banco
+
+
+def iniciar_servidor(app_dir, db_path, porta):
+    env = dict(os.environ, DB_PATH=db_path)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", app_dir,
+         "--port", str(porta), "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=1)
+            conn.request("GET", "/dashboard")
+            conn.getresponse().read()
+            conn.close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("servidor não iniciou")
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def carga(porta, duracao, leitores, escritores):
+    """
+    Roda leitores e escritores em paralelo e devolve as latências (ms) por rota
+    """
+    hoje = date.today()
+    leituras = [
+        ("GET /saidas", f"/saidas?ano={hoje.year}&mes={hoje.month}"),
+        ("GET /dashboard", f"/dashboard?ano={hoje.year}&mes={hoje.month}"),
+    ]
+    fim = time.perf_counter() + duracao
+    latencias = {}
+    lock = threading.Lock()
+
+    def registrar(rota, inicio, resp):
+        resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f"{rota}: HTTP {resp.status}")
+        ms = (time.perf_counter() - inicio) * 1000
+        with lock:
+            latencias.setdefault(rota, []).append(ms)
+
+    def leitor(n):
+        conn = http.client.HTTPConnection("127.0.0.1", porta)
+        i = n
+        while time.perf_counter() < fim:
+            rota, caminho = leituras[i % len(leituras)]
+            inicio = time.perf_counter()
+            conn.request("GET", caminho)
+            registrar(rota, inicio, conn.getresponse())
+            i += 1
+        conn.close()
+
+    def escritor(n):
+        conn = http.client.HTTPConnection("127.0.0.1", porta)
+        i = 0
+        while time.perf_counter() < fim:
+            parcelas = 6 if i % 4 == 0 else 1
+            corpo = json.dumps({
+                "nome": f"bench {n}-{i}", "valor": 120.0, "flags": "",
+                "parcelamento": parcelas, "data_vencimento": hoje.isoformat(),
+            })
+            inicio = time.perf_counter()
+            conn.request("POST", "/saidas", corpo, {"Content-Type": "application/json"})
+            registrar("POST /saidas", inicio, conn.getresponse())
+            i += 1
+        conn.close()
+
+    threads = [threading.Thread(target=leitor, args=(n,)) for n in range(leitores)]
+    threads += [threading.Thread(target=escritor, args=(n,)) for n in range(escritores)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=BACKEND, help="pasta do backend a ser testado")
+    parser.add_argument("--linhas", type=int, default=5000)
+    parser.add_argument("--duracao", type=float, default=5)
+    parser.add_argument("--leitores", type=int, default=16)
+    parser.add_argument("--escritores", type=int, default=4)
+    parser.add_argument("--porta", type=int, default=8766)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "db.sqlite3")
+        criar_banco(db_path, args.linhas)
+        proc = iniciar_servidor(args.app_dir, db_path, args.porta)
+        try:
+            latencias = carga(args.porta, args.duracao, args.leitores, args.escritores)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{'rota':<16} {'req':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for rota, valores in sorted(latencias.items()):
+        print(f"{rota:<16} {len(valores):>7} "
+              f"{percentil(valores, 50):>7.1f}ms {percentil(valores, 95):>7.1f}ms {percentil(valores, 99):>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark de carga: compara req/s de /saidas e /dashboard com o pool de
+conexões desligado (DB_POOL_SIZE=0, uma conexão por requisição) e ligado.
+
+Uso:
+    python bench/bench_pool.py [--linhas 5000] [--duracao 5] [--clientes 8]
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+sys.path.insert(0, BACKEND)
+
+
+def criar_banco(path, linhas):
+    """
+    Cria um banco temporário com o schema da aplicação e dados sintéticos
+    """
+    from gerador import gerar_banco
+
+    gerar_banco(path, linhas)
+
+
+def iniciar_servidor(db_path, porta, pool_size):
+    env = dict(os.environ, DB_PATH=db_path, DB_POOL_SIZE=str(pool_size))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND,
+         "--port", str(porta), "--log-level", "warning"],
+        env=env,
+    )
+    # Aguardar o servidor aceitar conexões
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=1)
+            conn.request("GET", "/dashboard")
+            conn.getresponse().read()
+            conn.close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("servidor não iniciou")
+
+
+def carga(porta, caminho, duracao, clientes):
+    """
+    Dispara requisições em paralelo durante `duracao` segundos e retorna req/s
+    """
+    fim = time.perf_counter() + duracao
+    contagem = [0] * clientes
+
+    def worker(n):
+        conn = http.client.HTTPConnection("127.0.0.1", porta)
+        while time.perf_counter() < fim:
+            conn.request("GET", caminho)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                raise RuntimeError(f"{caminho}: HTTP {resp.status}")
+            contagem[n] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(clientes)]
+    inicio = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(contagem) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=5000)
+    parser.add_argument("--duracao", type=float, default=5)
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--porta", type=int, default=8765)
+    args = parser.parse_args()
+
+    hoje = date.today()
+    caminhos = [
+        f"/saidas?ano={hoje.year}&mes={hoje.month}",
+        f"/dashboard?ano={hoje.year}&mes={hoje.month}",
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "db.sqlite3")
+        criar_banco(db_path, args.linhas)
+
+        resultados = {}
+        for nome, pool_size in (("sem pool", 0), ("com pool", 8)):
+            proc = iniciar_servidor(db_path, args.porta, pool_size)
+            try:
+                for caminho in caminhos:
+                    resultados[(nome, caminho)] = carga(args.porta, caminho, args.duracao, args.clientes)
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    print(f"{'endpoint':<40} {'sem pool':>12} {'com pool':>12} {'ganho':>8}")
+    for caminho in caminhos:
+        antes = resultados[("sem pool", caminho)]
+        depois = resultados[("com pool", caminho)]
+        print(f"{caminho:<40} {antes:>10.1f}/s {depois:>10.1f}/s {depois / antes:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Benchmark de todas as rotas do backend sobre um banco sintético (bench/gerador.py).
+
+Duas fases:
+  asgi     cada rota é chamada em processo pelo TestClient (sem rede), em
+           sequência; as rotas de escrita rodam em ciclos criar/alterar/excluir
+  uvicorn  servidor local com clientes HTTP em paralelo nas rotas de leitura;
+           /eventos/stream, uma conexão longa, só é medido aqui, do pedido
+           até a mensagem "pronto"
+
+Para cada rota imprime req/s e latência p50/p95/p99, além do pico de memória
+(RSS) do processo e do servidor. --salvar grava os números num JSON de
+referência; --comparar compara com uma referência salva e sai com código 1 se
+alguma rota piorou além da tolerância.
+
+Por padrão o cache de respostas fica desligado (CACHE_SIZE=0) para medir as
+consultas; use --com-cache para medir o caminho com cache.
+
+Uso:
+    python bench/bench_rotas.py --entradas 100000 --salvar bench/baselines/100k.json
+    python bench/bench_rotas.py --entradas 100000 --comparar bench/baselines/100k.json
+    python bench/bench_rotas.py --banco /tmp/10m.sqlite3 --iteracoes 50 --fases asgi
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+
+from bench_mixed import iniciar_servidor, percentil
+from bench_pool import BACKEND
+
+
+def rotas_leitura(hoje):
+    mes = f"ano={hoje.year}&mes={hoje.month}"
+    return [
+        ("GET /entradas", f"/entradas?{mes}"),
+        ("GET /entradas/todos", "/entradas/todos?limit=100"),
+        ("GET /entradas/todos ndjson", "/entradas/todos?limit=1000&formato=ndjson"),
+        ("GET /saidas", f"/saidas?{mes}"),
+        ("GET /saidas flag", f"/saidas?{mes}&flag=urg&flag=!feito"),
+        ("GET /saidas tipo", f"/saidas?{mes}&tipo=parcelas"),
+        ("GET /saidas/todos", "/saidas/todos?limit=100&tipo=proximas&dias=60"),
+        ("GET /saidas/todos ndjson", "/saidas/todos?limit=1000&formato=ndjson"),
+        ("GET /saidas/todos colunas", "/saidas/todos?limit=1000&formato=colunas"),
+        ("GET /meses-disponiveis", "/meses-disponiveis"),
+        ("GET /dashboard", f"/dashboard?{mes}"),
+        ("GET /relatorios", "/relatorios"),
+        ("GET /previsao", "/previsao?meses=12"),
+        ("GET /recorrencias", "/recorrencias"),
+        ("GET /busca", "/busca?q=mercado"),
+        ("GET /busca prefixo", "/busca?q=farm&tipo=saidas"),
+        ("GET /categorias", "/categorias"),
+        ("GET /eventos", "/eventos"),
+        ("GET /eventos linha", "/eventos?tabela=saidas&linha_id=1"),
+        ("GET /historico", f"/historico?{mes}&em={hoje.isoformat()}"),
+        ("GET /metrics", "/metrics"),
+    ]
+
+
+# Conexão do canal de alterações: medida até a primeira mensagem, sem esperar o fim
+ROTA_STREAM = ("GET /eventos/stream", "/eventos/stream")
+
+
+def resumo_latencias(valores, duracao):
+    return {
+        "n": len(valores),
+        "req_s": round(len(valores) / duracao, 1) if duracao else None,
+        "p50": round(percentil(valores, 50), 3),
+        "p95": round(percentil(valores, 95), 3),
+        "p99": round(percentil(valores, 99), 3),
+    }
+
+
+def fase_asgi(db_path, iteracoes):
+    """
+    Chama cada rota `iteracoes` vezes em processo; devolve {rota: resumo}
+    """
+    sys.path.insert(0, BACKEND)
+    import main as app_main
+    from fastapi.testclient import TestClient
+
+    hoje = date.today()
+    latencias = {}
+    tempos = {}
+
+    def medir(rota, fn):
+        inicio = time.perf_counter()
+        resp = fn()
+        ms = (time.perf_counter() - inicio) * 1000
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{rota}: HTTP {resp.status_code} {resp.text[:200]}")
+        latencias.setdefault(rota, []).append(ms)
+        tempos[rota] = tempos.get(rota, 0) + ms / 1000
+        return resp
+
+    db = sqlite3.connect(db_path)
+    with TestClient(app_main.app) as client:
+        for rota, caminho in rotas_leitura(hoje):
+            for _ in range(iteracoes):
+                medir(rota, lambda: client.get(caminho))
+
+        vencimento = hoje.isoformat()
+        for i in range(iteracoes):
+            entrada = {"nome": f"bench {i}", "valor": 100.0, "status": "pendente", "data": vencimento}
+            id_ = medir("POST /entradas", lambda: client.post("/entradas", json=entrada)).json()["id"]
+            medir("PUT /entradas/{id}", lambda: client.put(f"/entradas/{id_}", json=dict(entrada, status="recebido")))
+            medir("DELETE /entradas/{id}", lambda: client.delete(f"/entradas/{id_}"))
+
+            saida = {"nome": f"bench {i}", "valor": 80.0, "flags": "urg", "data_vencimento": vencimento}
+            id_ = medir("POST /saidas", lambda: client.post("/saidas", json=saida)).json()["id"]
+            medir("PUT /saidas/{id}", lambda: client.put(f"/saidas/{id_}", json=dict(saida, flags="feito")))
+            medir("DELETE /saidas/{id}", lambda: client.delete(f"/saidas/{id_}"))
+
+            id_ = client.post("/saidas", json=saida).json()["id"]
+            evento = db.execute(
+                "SELECT MAX(id) FROM eventos WHERE tabela = 'saidas' AND linha_id = ?", (id_,)
+            ).fetchone()[0]
+            medir("POST /eventos/{id}/desfazer", lambda: client.post(f"/eventos/{evento}/desfazer"))
+
+            parcelada = dict(saida, valor=1200.0, parcelamento=12)
+            id_ = medir("POST /saidas parcelada", lambda: client.post("/saidas", json=parcelada)).json()["id"]
+            grupo = db.execute("SELECT id_grupo_parcela FROM saidas WHERE id = ?", (id_,)).fetchone()[0]
+            medir("PATCH /saidas/grupo/{id}", lambda: client.patch(
+                f"/saidas/grupo/{grupo}", params={"escopo": "from=4"},
+                json={"adicionar_flags": ["feito"], "valor_total": 1300.0}))
+            medir("DELETE /saidas/grupo/{id}", lambda: client.delete(f"/saidas/grupo/{grupo}"))
+
+            recorrencia = {"nome": f"bench {i}", "valor": 50.0, "dia": 31}
+            id_ = medir("POST /recorrencias", lambda: client.post("/recorrencias", json=recorrencia)).json()["id"]
+            medir("PUT /recorrencias/{id}", lambda: client.put(f"/recorrencias/{id_}", json=dict(recorrencia, valor=55.0)))
+            medir("DELETE /recorrencias/{id}", lambda: client.delete(f"/recorrencias/{id_}"))
+
+            csv = "nome,valor,data\n" + "".join(f"import {i}-{n},-{n + 1},{vencimento}\n" for n in range(50))
+            medir("POST /import (50 linhas)", lambda: client.post(
+                "/import", content=csv.encode(), headers={"Content-Type": "text/csv"}))
+
+        # Mudanças nas regras disparam a reclassificação em segundo plano; ela
+        # roda depois das outras escritas e termina antes das medições seguintes
+        for i in range(iteracoes):
+            categoria = {"nome": f"bench {i}"}
+            id_ = medir("POST /categorias", lambda: client.post("/categorias", json=categoria)).json()["id"]
+            medir("PUT /categorias/{id}", lambda: client.put(f"/categorias/{id_}", json={"nome": f"bench {i}b"}))
+            regra = {"padrao": f"bench{i}*", "prioridade": 1}
+            regra_id = medir("POST /categorias/{id}/regras", lambda: client.post(
+                f"/categorias/{id_}/regras", json=regra)).json()["id"]
+            medir("DELETE /categorias/regras/{id}", lambda: client.delete(f"/categorias/regras/{regra_id}"))
+            medir("DELETE /categorias/{id}", lambda: client.delete(f"/categorias/{id_}"))
+            medir("POST /categorias/reclassificar", lambda: client.post("/categorias/reclassificar"))
+        while client.get("/categorias").json()["reclassificando"]:
+            time.sleep(0.05)
+
+        # Exportação e restauração percorrem o banco inteiro: uma rodada a cada
+        # 10 iterações; a restauração recebe o dump que acabou de ser exportado
+        for _ in range(max(1, iteracoes // 10)):
+            medir("GET /export", lambda: client.get("/export"))
+            dump = medir("GET /export colunas", lambda: client.get("/export", params={"formato": "colunas"})).content
+            medir("POST /restore", lambda: client.post("/restore", content=dump))
+    db.close()
+
+    return {rota: resumo_latencias(valores, tempos[rota]) for rota, valores in latencias.items()}
+
+
+def pico_rss_mb(pid):
+    """
+    Pico de memória residente de outro processo (Linux), em MB
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for linha in status:
+                if linha.startswith("VmHWM:"):
+                    return round(int(linha.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def fase_uvicorn(db_path, porta, duracao, clientes):
+    """
+    Carga paralela nas rotas de leitura; devolve ({rota: resumo}, pico de RSS do servidor)
+    """
+    rotas = rotas_leitura(date.today()) + [ROTA_STREAM]
+    proc = iniciar_servidor(BACKEND, db_path, porta)
+    latencias = {}
+    lock = threading.Lock()
+    fim = time.perf_counter() + duracao
+
+    def cliente(n):
+        conn = http.client.HTTPConnection("127.0.0.1", porta)
+        i = n
+        while time.perf_counter() < fim:
+            rota, caminho = rotas[i % len(rotas)]
+            inicio = time.perf_counter()
+            conn.request("GET", caminho)
+            resp = conn.getresponse()
+            if (rota, caminho) == ROTA_STREAM:
+                while resp.readline() not in (b"event: pronto\n", b""):
+                    pass
+            else:
+                resp.read()
+            ms = (time.perf_counter() - inicio) * 1000
+            if resp.status != 200:
+                raise RuntimeError(f"{rota}: HTTP {resp.status}")
+            if (rota, caminho) == ROTA_STREAM:
+                # A resposta continua aberta: a conexão seguinte é nova
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", porta)
+            with lock:
+                latencias.setdefault(rota, []).append(ms)
+            i += 1
+        conn.close()
+
+    try:
+        threads = [threading.Thread(target=cliente, args=(n,)) for n in range(clientes)]
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        total = time.perf_counter() - inicio
+        rss = pico_rss_mb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    return {rota: resumo_latencias(valores, total) for rota, valores in latencias.items()}, rss
+
+
+def imprimir(titulo, resultados):
+    print(f"\n{titulo}")
+    print(f"{'rota':<30} {'n':>6} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for rota, r in resultados.items():
+        print(f"{rota:<30} {r['n']:>6} {r['req_s']:>9} {r['p50']:>7.2f}ms {r['p95']:>7.2f}ms {r['p99']:>7.2f}ms")
+
+
+def comparar(atual, referencia, tolerancia):
+    """
+    Lista as regressões: p95 ou pico de RSS acima da referência mais a
+    tolerância (ignorando diferenças abaixo de 1 ms, que são ruído)
+    """
+    regressoes = []
+    for fase in ("asgi", "uvicorn"):
+        for rota, r in atual.get(fase, {}).items():
+            base = referencia.get(fase, {}).get(rota)
+            if base and r["p95"] > base["p95"] * (1 + tolerancia) and r["p95"] - base["p95"] > 1:
+                regressoes.append(f"{fase} {rota}: p95 {base['p95']:.2f}ms -> {r['p95']:.2f}ms")
+    for fase, rss in atual.get("rss_mb", {}).items():
+        base = referencia.get("rss_mb", {}).get(fase)
+        if base and rss and rss > base * (1 + tolerancia):
+            regressoes.append(f"RSS {fase}: {base}MB -> {rss}MB")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entradas", type=int, default=10000, help="tamanho do banco gerado")
+    parser.add_argument("--saidas", type=int, help="padrão: o mesmo número de entradas")
+    parser.add_argument("--banco", help="usar um banco já gerado (as escritas do benchmark ficam nele)")
+    parser.add_argument("--fases", default="asgi,uvicorn")
+    parser.add_argument("--iteracoes", type=int, default=100, help="chamadas por rota na fase asgi")
+    parser.add_argument("--duracao", type=float, default=5, help="segundos de carga na fase uvicorn")
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--porta", type=int, default=8767)
+    parser.add_argument("--com-cache", action="store_true")
+    parser.add_argument("--salvar", help="gravar os resultados neste JSON")
+    parser.add_argument("--comparar", help="comparar com este JSON de referência")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="piora aceita (0.25 = 25%%)")
+    args = parser.parse_args()
+    fases = set(args.fases.split(","))
+
+    if not args.com_cache:
+        os.environ["CACHE_SIZE"] = "0"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.banco) if args.banco else os.path.join(tmp, "db.sqlite3")
+        # Antes de importar o backend: db_pool lê DB_PATH ao ser importado
+        os.environ["DB_PATH"] = db_path
+        if not args.banco:
+            from gerador import gerar_banco
+            gerar_banco(db_path, args.entradas, args.saidas)
+
+        with sqlite3.connect(db_path) as conn:
+            linhas = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("entradas", "saidas")}
+
+        resultados = {
+            "meta": {
+                "data": datetime.now().isoformat(timespec="seconds"),
+                "linhas": linhas,
+                "cache": args.com_cache,
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "maquina": platform.machine(),
+            },
+            "rss_mb": {},
+        }
+        if "uvicorn" in fases:
+            resultados["uvicorn"], resultados["rss_mb"]["uvicorn"] = fase_uvicorn(
+                db_path, args.porta, args.duracao, args.clientes)
+        if "asgi" in fases:
+            resultados["asgi"] = fase_asgi(db_path, args.iteracoes)
+            # ru_maxrss é em KB no Linux
+            resultados["rss_mb"]["asgi"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    print(f"Banco: {linhas['entradas']} entradas, {linhas['saidas']} saídas")
+    if "asgi" in resultados:
+        imprimir("ASGI em processo", resultados["asgi"])
+    if "uvicorn" in resultados:
+        imprimir(f"uvicorn, {args.clientes} clientes", resultados["uvicorn"])
+    print(f"\nPico de RSS: {resultados['rss_mb']}")
+
+    if args.salvar:
+        os.makedirs(os.path.dirname(os.path.abspath(args.salvar)), exist_ok=True)
+        with open(args.salvar, "w") as arquivo:
+            json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+        print(f"Referência salva em {args.salvar}")
+
+    if args.comparar:
+        with open(args.comparar) as arquivo:
+            regressoes = comparar(resultados, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print("\nRegressões:")
+            for regressao in regressoes:
+                print(f"  {regressao}")
+            sys.exit(1)
+        print("\nSem regressões em relação à referência")
+
+
+if __name__ == "__main__":
+    main()
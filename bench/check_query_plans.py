@@ -0,0 +1,133 @@
+"""
+Verificação de planos de consulta: executa os endpoints de listagem e o
+dashboard contra um banco sintético, captura todo SQL emitido e roda
+EXPLAIN QUERY PLAN em cada SELECT. Falha (código de saída 1) se alguma
+consulta varrer uma tabela do banco (SCAN, mesmo que USING INDEX: percorrer
+um índice inteiro custa o mesmo que a tabela) que não esteja em PERMITIDAS.
+
+Uso:
+    python bench/check_query_plans.py [--linhas 2000]
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import date
+
+from bench_pool import BACKEND, criar_banco
+
+# Varredura de uma tabela, índice, CTE ou subconsulta: "SCAN saidas USING
+# INDEX ...", "SCAN main.saidas_fts_config", "SCAN m", "SCAN (subquery-1)"
+SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(?:main\.)?(\S+)(.*)")
+# CTEs e subconsultas do próprio plano, que não são tabelas do banco
+DERIVADA = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\S+)")
+
+# Tabelas que podem ser varridas inteiras, e por quê
+PERMITIDAS = {
+    "categorias": "a lista de categorias é lida inteira e é pequena",
+    "regras_categoria": "todas as regras entram no classificador",
+    "eventos_compactacao": "tem uma linha só",
+    "entradas_fts_config": "configuração interna do FTS5, poucas linhas",
+    "saidas_fts_config": "configuração interna do FTS5, poucas linhas",
+}
+
+
+def varreduras(plano):
+    """
+    Linhas do plano que varrem uma tabela do banco fora de PERMITIDAS; tabelas
+    virtuais (FTS5) ficam de fora, porque o MATCH é uma busca no índice
+    """
+    derivadas = {m.group(1) for m in map(DERIVADA.match, plano) if m}
+    falhas = []
+    for linha in plano:
+        scan = SCAN.match(linha)
+        if scan is None or "VIRTUAL TABLE" in scan.group(2):
+            continue
+        nome = scan.group(1)
+        if nome.startswith("(") or nome in derivadas or nome in PERMITIDAS:
+            continue
+        falhas.append(linha)
+    return falhas
+
+
+def endpoints():
+    hoje = date.today()
+    mes = {"ano": hoje.year, "mes": hoje.month}
+    return [
+        ("/entradas", mes),
+        ("/saidas", mes),
+        ("/saidas", dict(mes, flag=["urg", "!feito"])),
+        ("/saidas", dict(mes, categoria=1)),
+        ("/dashboard", mes),
+        ("/dashboard", {}),
+        ("/historico", dict(mes, em=hoje.isoformat())),
+        ("/eventos", {"tabela": "saidas"}),
+        ("/busca", {"q": "mercado"}),
+        ("/busca", {"q": "geladeira 3"}),
+    ]
+
+
+def capturar_sql(app_main, client, caminho, params):
+    """
+    Chama o endpoint e devolve todas as instruções SQL que ele executou
+    """
+    statements = []
+    # Pool do banco único (sem TENANTS_DIR), aberto na inicialização do app
+    pool = app_main.registro.aberto().pool
+    acquire_original = pool.acquire
+
+    def acquire():
+        conn = acquire_original()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    pool.acquire = acquire
+    try:
+        resp = client.get(caminho, params=params)
+        resp.raise_for_status()
+    finally:
+        pool.acquire = acquire_original
+    return statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "db.sqlite3")
+        # Antes de criar o banco: db_pool lê DB_PATH ao ser importado
+        os.environ["DB_PATH"] = db_path
+        criar_banco(db_path, args.linhas)
+        sys.path.insert(0, BACKEND)
+        import main as app_main
+        from fastapi.testclient import TestClient
+
+        conn = sqlite3.connect(db_path)
+        falhas = 0
+        with TestClient(app_main.app) as client:
+            for caminho, params in endpoints():
+                for sql in capturar_sql(app_main, client, caminho, params):
+                    if not sql.lstrip().upper().startswith("SELECT"):
+                        continue
+                    plano = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+                    scans = varreduras(plano)
+                    status = "FALHA" if scans else "ok"
+                    falhas += bool(scans)
+                    print(f"[{status}] {caminho} {params}")
+                    print("    " + " ".join(sql.split())[:160])
+                    for linha in plano:
+                        print(f"      {linha}")
+        conn.close()
+
+    if falhas:
+        print(f"\n{falhas} consulta(s) com varredura de tabela")
+        sys.exit(1)
+    print("\nNenhuma varredura de tabela encontrada")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Gerador de dados sintéticos: cria um banco com o schema da aplicação e de
+10 mil a 10 milhões de entradas/saídas realistas: salários e recebimentos
+com status, contas avulsas com flags (urg, feito, no_rec), compras parceladas
+em grupos (com grupos_parcela, centavos ajustados na última parcela e datas
+limitadas ao fim do mês) e modelos de despesas recorrentes.
+
+As linhas são geradas por geradores e gravadas em lotes com executemany, então
+a memória não cresce com o tamanho do banco. Os triggers do resumo mensal,
+dos índices de busca e do histórico de eventos são desligados durante a carga;
+resumo e índices são recalculados uma vez no final, e a carga não entra no
+histórico (vale como o estado inicial). As saídas são
+classificadas nas categorias em lotes depois da carga, com o índice de
+categoria criado só no fim.
+
+Uso:
+    python bench/gerador.py banco.sqlite3 --entradas 100000 [--saidas 300000] [--meses 36]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+sys.path.insert(0, BACKEND)
+
+from database import init_db  # noqa: E402
+from parcelas import datas_parcelas, valores_parcelas  # noqa: E402
+from busca import create_busca, rebuild_busca  # noqa: E402
+from categorias import CATEGORIAS_INDICE, reclassificar_em_lotes  # noqa: E402
+from eventos import create_eventos  # noqa: E402
+from resumo import create_resumo_mensal, rebuild_resumo_mensal  # noqa: E402
+
+TAMANHO_LOTE = 50000
+
+NOMES_ENTRADAS = ("salario", "consultorio", "plantao", "aluguel recebido", "freelance", "reembolso", "dividendos")
+NOMES_SAIDAS = ("mercado", "farmacia", "restaurante", "combustivel", "uber", "padaria", "presente", "manutencao")
+NOMES_PARCELADAS = ("geladeira", "notebook", "sofa", "celular", "curso", "viagem", "tv", "bicicleta")
+RECORRENTES = (
+    ("aluguel", 2200, "urg", 5), ("condominio", 650, "", 10), ("luz", 280, "", 15),
+    ("agua", 120, "", 15), ("internet", 110, "", 20), ("celular", 60, "", 20),
+    ("plano de saude", 1364, "urg", 1), ("academia", 130, "", 31),
+)
+TAMANHOS_PARCELAMENTO = (2, 3, 3, 4, 5, 6, 6, 10, 10, 12, 12, 18, 24)
+
+
+def _dia(rng, hoje, meses):
+    """
+    Data aleatória entre `meses` meses atrás e 3 meses à frente
+    """
+    return hoje - timedelta(days=rng.randrange(-90, meses * 30))
+
+
+def gerar_entradas(rng, total, hoje, meses):
+    for i in range(total):
+        data = _dia(rng, hoje, meses)
+        # Quase tudo que é passado já foi recebido
+        recebido = data < hoje and rng.random() < 0.9
+        yield (
+            f"{rng.choice(NOMES_ENTRADAS)} {i}",
+            round(rng.lognormvariate(8, 0.8), 2),
+            "recebido" if recebido else "pendente",
+            data.isoformat(),
+        )
+
+
+def _flags(rng, data, hoje):
+    flags = []
+    if rng.random() < 0.15:
+        flags.append("urg")
+    if data < hoje and rng.random() < 0.85:
+        flags.append("feito")
+    if rng.random() < 0.1:
+        flags.append("no_rec")
+    return ",".join(flags)
+
+
+def gerar_saidas(rng, total, hoje, meses, proximo_grupo):
+    """
+    Gera (linha de saidas, grupo ou None). Cerca de um terço das linhas são
+    parcelas de compras; cada grupo é gerado inteiro, com as parcelas pagas
+    até hoje marcadas como feito.
+    """
+    gerados = 0
+    while gerados < total:
+        if rng.random() < 0.08:
+            parcelas = min(rng.choice(TAMANHOS_PARCELAMENTO), total - gerados)
+            if parcelas < 2:
+                continue
+            nome = rng.choice(NOMES_PARCELADAS)
+            valor_total = round(rng.lognormvariate(7.5, 0.9), 2)
+            inicio = _dia(rng, hoje, meses)
+            grupo = (proximo_grupo, nome, valor_total, parcelas, inicio.day)
+            proximo_grupo += 1
+            flags_base = f"parc{parcelas}" + (",urg" if rng.random() < 0.1 else "")
+            vencimentos = datas_parcelas(inicio.isoformat(), parcelas)
+            for i, (valor, vencimento) in enumerate(zip(valores_parcelas(valor_total, parcelas), vencimentos), start=1):
+                flags = flags_base + (",feito" if vencimento < hoje.isoformat() else "")
+                yield (f"{nome} ({i}/{parcelas})", valor, flags, i, parcelas, grupo[0], vencimento), (grupo if i == 1 else None)
+            gerados += parcelas
+        else:
+            data = _dia(rng, hoje, meses)
+            yield (rng.choice(NOMES_SAIDAS), round(rng.lognormvariate(5, 1.1), 2), _flags(rng, data, hoje),
+                   1, 1, None, data.isoformat()), None
+            gerados += 1
+
+
+def _lotes(iteravel, tamanho):
+    iteravel = iter(iteravel)
+    while True:
+        lote = list(islice(iteravel, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def gerar_banco(path, entradas, saidas=None, meses=36, seed=42, tamanho_lote=TAMANHO_LOTE, verbose=False):
+    """
+    Cria (ou completa) o banco em `path` com os dados sintéticos
+    """
+    saidas = entradas if saidas is None else saidas
+    rng = random.Random(seed)
+    hoje = date.today()
+    inicio = time.perf_counter()
+
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    cursor = conn.cursor()
+
+    # Os triggers do resumo, da busca e do histórico custariam uma escrita a
+    # mais por linha; resumo e índices de busca são recalculados no final
+    cursor.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'trigger' AND (name LIKE 'resumo_%' OR name LIKE 'fts_%' OR name LIKE 'eventos_%')
+    """)
+    for (nome,) in cursor.fetchall():
+        cursor.execute(f"DROP TRIGGER {nome}")
+    cursor.execute("DROP INDEX IF EXISTS idx_saidas_categoria")
+
+    for lote in _lotes(gerar_entradas(rng, entradas, hoje, meses), tamanho_lote):
+        with conn:
+            cursor.executemany("INSERT INTO entradas (nome, valor, status, data) VALUES (?, ?, ?, ?)", lote)
+
+    proximo_grupo = (cursor.execute("SELECT IFNULL(MAX(id), 0) FROM grupos_parcela").fetchone()[0]) + 1
+    gravadas = 0
+    for lote in _lotes(gerar_saidas(rng, saidas, hoje, meses, proximo_grupo), tamanho_lote):
+        with conn:
+            cursor.executemany(
+                "INSERT INTO grupos_parcela (id, nome, valor_total, total_parcelas, dia_vencimento) VALUES (?, ?, ?, ?, ?)",
+                [grupo for _, grupo in lote if grupo]
+            )
+            cursor.executemany("""
+                INSERT INTO saidas
+                (nome, valor, flags, parcela_atual, total_parcelas, id_grupo_parcela, data_vencimento)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [linha for linha, _ in lote])
+        gravadas += len(lote)
+        if verbose:
+            print(f"... {gravadas} saídas", file=sys.stderr)
+
+    with conn:
+        primeiro_mes = (hoje - timedelta(days=meses * 30)).strftime("%Y-%m")
+        cursor.executemany(
+            "INSERT INTO recorrencias (nome, valor, flags, dia, inicio) VALUES (?, ?, ?, ?, ?)",
+            [(nome, valor, flags, dia, primeiro_mes) for nome, valor, flags, dia in RECORRENTES]
+        )
+
+    create_resumo_mensal(cursor)
+    rebuild_resumo_mensal(conn)
+    create_busca(cursor)
+    rebuild_busca(conn)
+    create_eventos(cursor)
+    for _ in reclassificar_em_lotes(conn):
+        conn.commit()
+    cursor.executescript(CATEGORIAS_INDICE)
+    conn.execute("PRAGMA optimize")
+    conn.close()
+
+    if verbose:
+        print(f"Banco gerado em {time.perf_counter() - inicio:.1f}s: {entradas} entradas, {saidas} saídas",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("banco")
+    parser.add_argument("--entradas", type=int, default=10000)
+    parser.add_argument("--saidas", type=int, help="padrão: o mesmo número de entradas")
+    parser.add_argument("--meses", type=int, default=36, help="meses de histórico")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    gerar_banco(os.path.abspath(args.banco), args.entradas, args.saidas, args.meses, args.seed, verbose=True)
+
+
+if __name__ == "__main__":
+    main()
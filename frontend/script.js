@@ -10,21 +10,65 @@ let viewMode = {
     saidas: "month"    // "month" ou "all"
 };
 
-async function fetchData(endpoint, params = {}) {
-    try {
-        // Construir URL com parâmetros de consulta, se houver
-        let url = `${API_URL}/${endpoint}`;
-        if (Object.keys(params).length > 0) {
-            const queryParams = new URLSearchParams();
-            for (const [key, value] of Object.entries(params)) {
-                if (value !== null && value !== undefined) {
-                    queryParams.append(key, value);
-                }
+// Bits de flags_mask retornado pelo backend (ver backend/flags.py)
+const FLAG_URG = 1;
+const FLAG_FEITO = 2;
+
+// Tamanho da página em "Ver Todos os Meses"
+const PAGE_SIZE = 100;
+
+// Itens já carregados e cursor da próxima página em "Ver Todos os Meses"
+let paginas = {
+    entradas: { itens: [], proximo: null },
+    saidas: { itens: [], proximo: null }
+};
+
+// Itens do mês exibido e o último dashboard desenhado; as mensagens de
+// /eventos/stream alteram esses dados e as tabelas são redesenhadas sem novas buscas
+let itensMes = { entradas: [], saidas: [] };
+let dashboardAtual = null;
+// Meses do seletor ("YYYY-MM")
+let mesesConhecidos = new Set();
+
+// Conexão com /eventos/stream (null se o navegador não tem EventSource)
+let canal = null;
+
+// Coluna de data e ordem das listagens "Ver Todos os Meses" (ver backend/main.py)
+const COLUNA_DATA = { entradas: "data", saidas: "data_vencimento" };
+const TODOS_DESCENDENTE = { entradas: true, saidas: false };
+
+// Backend com vários inquilinos: o token (ou o nome do inquilino, quando o
+// backend roda sem TENANT_SECRET) fica guardado no localStorage do navegador
+function apiFetch(url, options = {}) {
+    const headers = { ...(options.headers || {}) };
+    const token = localStorage.getItem("token");
+    const tenant = localStorage.getItem("tenant");
+    if (token) {
+        headers["Authorization"] = `Bearer ${token}`;
+    } else if (tenant) {
+        headers["X-Tenant"] = tenant;
+    }
+    return fetch(url, { ...options, headers });
+}
+
+function buildUrl(endpoint, params = {}) {
+    // Construir URL com parâmetros de consulta, se houver
+    let url = `${API_URL}/${endpoint}`;
+    if (Object.keys(params).length > 0) {
+        const queryParams = new URLSearchParams();
+        for (const [key, value] of Object.entries(params)) {
+            if (value !== null && value !== undefined) {
+                queryParams.append(key, value);
             }
-            url += `?${queryParams.toString()}`;
         }
-        
-        const response = await fetch(url);
+        url += `?${queryParams.toString()}`;
+    }
+    return url;
+}
+
+async function fetchData(endpoint, params = {}) {
+    try {
+        const response = await apiFetch(buildUrl(endpoint, params));
         if (!response.ok) {
             throw new Error(`HTTP error! Status: ${response.status}`);
         }
@@ -36,6 +80,42 @@ async function fetchData(endpoint, params = {}) {
     }
 }
 
+// Carregar uma página de "entradas/todos" ou "saidas/todos"; com append=true
+// continua de onde a página anterior parou (cursor em X-Proximo-Cursor)
+async function fetchTodos(tipo, append = false, filtros = {}) {
+    const pagina = paginas[tipo];
+    const params = { ...filtros, limit: PAGE_SIZE, after: append ? pagina.proximo : null };
+    
+    try {
+        const response = await apiFetch(buildUrl(`${tipo}/todos`, params));
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        const itens = await response.json();
+        pagina.itens = append ? pagina.itens.concat(itens) : itens;
+        pagina.proximo = response.headers.get("X-Proximo-Cursor");
+        return pagina.itens;
+    } catch (error) {
+        console.error(`Erro ao buscar ${tipo}/todos:`, error);
+        return null;
+    }
+}
+
+// Itens exibidos na tabela: as páginas já carregadas ou os itens do mês
+function itensExibidos(tipo) {
+    return viewMode[tipo] === "all" ? paginas[tipo].itens : itensMes[tipo];
+}
+
+// Linha com o botão "Carregar mais" ao final de uma tabela paginada
+function addCarregarMais(table, tipo, colspan, renderFn) {
+    if (!paginas[tipo].proximo) return;
+    const row = table.insertRow();
+    row.innerHTML = `<td colspan='${colspan}' style='text-align: center;'>
+        <button type="button" class="carregar-mais">Carregar mais</button>
+    </td>`;
+    row.querySelector("button").addEventListener("click", () => renderFn(true));
+}
+
 // Buscar e preencher o seletor de meses disponíveis
 async function populateMonthSelector() {
     const mesesDisponiveis = await fetchData("meses-disponiveis");
@@ -52,8 +132,10 @@ async function populateMonthSelector() {
     mesAtualOption.text = `${getNomeMes(hoje.getMonth() + 1)} ${hoje.getFullYear()} (Atual)`;
     
     // Adicionar meses disponíveis no histórico
+    mesesConhecidos = new Set([chaveMes(hoje.getFullYear(), hoje.getMonth() + 1)]);
     if (mesesDisponiveis && mesesDisponiveis.length > 0) {
         mesesDisponiveis.forEach(mes => {
+            mesesConhecidos.add(chaveMes(mes.ano, mes.mes));
             // Verificar se não é o mês atual
             if (mes.ano !== hoje.getFullYear() || mes.mes !== hoje.getMonth() + 1) {
                 const option = document.createElement("option");
@@ -74,6 +156,16 @@ function getNomeMes(mesNumero) {
     return meses[mesNumero - 1];
 }
 
+// Mês no formato "YYYY-MM", como nas chaves do dashboard em /eventos/stream
+function chaveMes(ano, mes) {
+    return `${ano}-${String(mes).padStart(2, "0")}`;
+}
+
+// Data local no formato "YYYY-MM-DD", como as datas do backend
+function dataISO(data) {
+    return `${chaveMes(data.getFullYear(), data.getMonth() + 1)}-${String(data.getDate()).padStart(2, "0")}`;
+}
+
 // Formatar data para exibição
 function formatarData(dataString) {
     if (!dataString) return "";
@@ -91,7 +183,11 @@ async function renderDashboard() {
         };
     }
     
-    const data = await fetchData("dashboard", params);
+    desenharDashboard(await fetchData("dashboard", params));
+}
+
+function desenharDashboard(data) {
+    dashboardAtual = data;
     const dashboard = document.getElementById("dashboard");
     
     if (data) {
@@ -109,24 +205,27 @@ async function renderDashboard() {
     }
 }
 
-async function renderEntradas() {
+async function renderEntradas(carregarMais = false) {
     let entradas;
-    let endpoint = "entradas";
-    let params = {};
     
     // Verificar o modo de visualização
     if (viewMode.entradas === "all") {
-        endpoint = "entradas/todos";
+        entradas = await fetchTodos("entradas", carregarMais);
     } else {
         // Modo mensal - usar parâmetros de ano e mês
-        params = {
+        entradas = await fetchData("entradas", {
             ano: currentMonth.year,
             mes: currentMonth.month
-        };
+        });
+        itensMes.entradas = entradas || [];
     }
     
-    entradas = await fetchData(endpoint, params);
-    
+    desenharEntradas(entradas !== null);
+}
+
+// Desenha a tabela de entradas com os itens já carregados
+function desenharEntradas(carregou = true) {
+    const entradas = carregou ? itensExibidos("entradas") : null;
     const table = document.getElementById("entradas");
     table.innerHTML = `
         <tr>
@@ -181,6 +280,10 @@ async function renderEntradas() {
         </td>`;
     }
     
+    if (viewMode.entradas === "all") {
+        addCarregarMais(table, "entradas", 5, renderEntradas);
+    }
+    
     // Atualizar botões de visualização
     document.getElementById("show-all-entradas").classList.toggle("active", viewMode.entradas === "all");
     document.getElementById("show-month-entradas").classList.toggle("active", viewMode.entradas === "month");
@@ -208,25 +311,49 @@ function isDateOverdue(dateString) {
     return date < today;
 }
 
-async function renderSaidas() {
+// Valores do filtro de saídas e o parâmetro "tipo" correspondente na API
+const FILTRO_TIPO = {
+    "parcelas": "parcelas",
+    "nao-parcelas": "nao_parcelas",
+    "proximas": "proximas"
+};
+
+// Parâmetros do filtro de saídas selecionado
+function filtrosSaidas() {
+    const filterValue = document.getElementById("filter-saidas").value;
+    const filtros = {};
+    if (FILTRO_TIPO[filterValue]) {
+        filtros.tipo = FILTRO_TIPO[filterValue];
+        if (filtros.tipo === "proximas") filtros.dias = 30;
+    }
+    return filtros;
+}
+
+async function renderSaidas(carregarMais = false) {
     let saidas;
-    let endpoint = "saidas";
-    let params = {};
+    
+    // O filtro selecionado é aplicado no backend
+    const filtros = filtrosSaidas();
     
     // Verificar o modo de visualização
     if (viewMode.saidas === "all") {
-        endpoint = "saidas/todos";
+        saidas = await fetchTodos("saidas", carregarMais, filtros);
     } else {
         // Modo mensal - usar parâmetros de ano e mês
-        params = {
+        saidas = await fetchData("saidas", {
+            ...filtros,
             ano: currentMonth.year,
             mes: currentMonth.month
-        };
+        });
+        itensMes.saidas = saidas || [];
     }
     
-    saidas = await fetchData(endpoint, params);
-    const filterValue = document.getElementById("filter-saidas").value;
-    
+    desenharSaidas(saidas !== null);
+}
+
+// Desenha a tabela de saídas com os itens já carregados
+function desenharSaidas(carregou = true) {
+    const saidas = carregou ? itensExibidos("saidas") : null;
     const table = document.getElementById("saidas");
     table.innerHTML = `
         <tr>
@@ -240,87 +367,61 @@ async function renderSaidas() {
     `;
     
     if (saidas && saidas.length > 0) {
-        // Filtrar os dados com base na seleção
-        let filteredSaidas = saidas;
-        
-        if (filterValue === "parcelas") {
-            filteredSaidas = saidas.filter(s => s.total_parcelas > 1);
-        } else if (filterValue === "nao-parcelas") {
-            filteredSaidas = saidas.filter(s => !s.total_parcelas || s.total_parcelas <= 1);
-        } else if (filterValue === "proximas") {
-            const today = new Date();
-            const nextMonth = new Date(today);
-            nextMonth.setDate(today.getDate() + 30);
-            
-            filteredSaidas = saidas.filter(s => {
-                const vencimento = new Date(s.data_vencimento);
-                return vencimento >= today && vencimento <= nextMonth;
-            });
-        }
-        
-        if (filteredSaidas.length === 0) {
+        saidas.forEach(s => {
             const row = table.insertRow();
-            row.innerHTML = `<td colspan='6' style='text-align: center;'>
-                Nenhuma saída encontrada com os filtros selecionados.
-            </td>`;
-        } else {
-            filteredSaidas.forEach(s => {
-                const row = table.insertRow();
-                const flags = s.flags ? s.flags.split(",") : [];
-                
-                // Determinar a classe do item com base em flags e parcelamento
-                let className = "";
-                if (flags.includes("urg")) className += "urgent ";
-                if (flags.includes("feito")) className += "done ";
-                if (s.total_parcelas > 1) className += "parcela ";
-                
-                row.className = className.trim();
-                
-                // Verifica se o vencimento está próximo ou atrasado
-                let vencimentoClass = "";
-                if (isDateNear(s.data_vencimento)) vencimentoClass = "vencimento-proxima";
-                if (isDateOverdue(s.data_vencimento)) vencimentoClass = "vencimento-atrasado";
-                
-                // Formatar a data de vencimento
-                const dataVencimento = formatarData(s.data_vencimento);
-                
-                // Informações de parcela
-                let parcelaInfo = "";
-                if (s.total_parcelas > 1) {
-                    parcelaInfo = `${s.parcela_atual}/${s.total_parcelas}`;
-                }
-                
-                row.innerHTML = `
-                    <td data-label="Nome">${s.nome}</td>
-                    <td data-label="Valor (R$)">${s.valor.toLocaleString('pt-BR')}</td>
-                    <td data-label="Flags">${s.flags || ''}</td>
-                    <td data-label="Vencimento" class="${vencimentoClass}">${dataVencimento}</td>
-                    <td data-label="Parcelas">${parcelaInfo}</td>
-                    <td data-label="Ações">
-                        <button class="edit" onclick="showEditSaida(${s.id}, '${s.nome}', ${s.valor}, '${s.flags || ''}', '${s.data_vencimento || ''}')">Editar</button>
-                        <button class="delete" onclick="deleteSaida(${s.id}, ${s.id_grupo_parcela || 'null'})">Remover</button>
-                    </td>
-                `;
-                
-                const editRow = table.insertRow();
-                editRow.id = `edit-saida-${s.id}`;
-                editRow.className = "edit-form";
-                editRow.innerHTML = `
-                    <td colspan="6">
-                        <form onsubmit="updateSaida(event, ${s.id})">
-                            <input type="text" id="edit-saida-nome-${s.id}" value="${s.nome}" required>
-                            <input type="number" id="edit-saida-valor-${s.id}" value="${s.valor}" step="0.01" required>
-                            <input type="text" id="edit-saida-flags-${s.id}" value="${s.flags || ''}" placeholder="Flags (ex: urg,feito)">
-                            <input type="date" id="edit-saida-data-vencimento-${s.id}" value="${s.data_vencimento || ''}">
-                            <div class="form-buttons">
-                                <button type="submit">Salvar</button>
-                                <button type="button" onclick="hideEditSaida(${s.id})">Cancelar</button>
-                            </div>
-                        </form>
-                    </td>
-                `;
-            });
-        }
+            
+            // Determinar a classe do item com base em flags e parcelamento
+            let className = "";
+            if (s.flags_mask & FLAG_URG) className += "urgent ";
+            if (s.flags_mask & FLAG_FEITO) className += "done ";
+            if (s.total_parcelas > 1) className += "parcela ";
+            
+            row.className = className.trim();
+            
+            // Verifica se o vencimento está próximo ou atrasado
+            let vencimentoClass = "";
+            if (isDateNear(s.data_vencimento)) vencimentoClass = "vencimento-proxima";
+            if (isDateOverdue(s.data_vencimento)) vencimentoClass = "vencimento-atrasado";
+            
+            // Formatar a data de vencimento
+            const dataVencimento = formatarData(s.data_vencimento);
+            
+            // Informações de parcela
+            let parcelaInfo = "";
+            if (s.total_parcelas > 1) {
+                parcelaInfo = `${s.parcela_atual}/${s.total_parcelas}`;
+            }
+            
+            row.innerHTML = `
+                <td data-label="Nome">${s.nome}</td>
+                <td data-label="Valor (R$)">${s.valor.toLocaleString('pt-BR')}</td>
+                <td data-label="Flags">${s.flags || ''}</td>
+                <td data-label="Vencimento" class="${vencimentoClass}">${dataVencimento}</td>
+                <td data-label="Parcelas">${parcelaInfo}</td>
+                <td data-label="Ações">
+                    <button class="edit" onclick="showEditSaida(${s.id}, '${s.nome}', ${s.valor}, '${s.flags || ''}', '${s.data_vencimento || ''}')">Editar</button>
+                    <button class="delete" onclick="deleteSaida(${s.id}, ${s.id_grupo_parcela || 'null'}, ${s.parcela_atual || 1})">Remover</button>
+                </td>
+            `;
+            
+            const editRow = table.insertRow();
+            editRow.id = `edit-saida-${s.id}`;
+            editRow.className = "edit-form";
+            editRow.innerHTML = `
+                <td colspan="6">
+                    <form onsubmit="updateSaida(event, ${s.id})">
+                        <input type="text" id="edit-saida-nome-${s.id}" value="${s.nome}" required>
+                        <input type="number" id="edit-saida-valor-${s.id}" value="${s.valor}" step="0.01" required>
+                        <input type="text" id="edit-saida-flags-${s.id}" value="${s.flags || ''}" placeholder="Flags (ex: urg,feito)">
+                        <input type="date" id="edit-saida-data-vencimento-${s.id}" value="${s.data_vencimento || ''}">
+                        <div class="form-buttons">
+                            <button type="submit">Salvar</button>
+                            <button type="button" onclick="hideEditSaida(${s.id})">Cancelar</button>
+                        </div>
+                    </form>
+                </td>
+            `;
+        });
     } else {
         const row = table.insertRow();
         row.innerHTML = `<td colspan='6' style='text-align: center;'>
@@ -328,6 +429,10 @@ async function renderSaidas() {
         </td>`;
     }
     
+    if (viewMode.saidas === "all") {
+        addCarregarMais(table, "saidas", 6, renderSaidas);
+    }
+    
     // Atualizar botões de visualização
     document.getElementById("show-all-saidas").classList.toggle("active", viewMode.saidas === "all");
     document.getElementById("show-month-saidas").classList.toggle("active", viewMode.saidas === "month");
@@ -352,7 +457,7 @@ async function updateEntrada(event, id) {
     };
     
     try {
-        const response = await fetch(`${API_URL}/entradas/${id}`, {
+        const response = await apiFetch(`${API_URL}/entradas/${id}`, {
             method: "PUT",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify(entrada)
@@ -360,8 +465,7 @@ async function updateEntrada(event, id) {
         
         if (response.ok) {
             hideEditEntrada(id);
-            await renderEntradas();
-            await renderDashboard();
+            await recarregarSemCanal(renderEntradas, renderDashboard);
         } else {
             const errorData = await response.json();
             console.error("Erro ao atualizar entrada:", errorData);
@@ -376,13 +480,12 @@ async function updateEntrada(event, id) {
 async function deleteEntrada(id) {
     if (confirm("Tem certeza que deseja remover esta entrada?")) {
         try {
-            const response = await fetch(`${API_URL}/entradas/${id}`, {
+            const response = await apiFetch(`${API_URL}/entradas/${id}`, {
                 method: "DELETE"
             });
             
             if (response.ok) {
-                await renderEntradas();
-                await renderDashboard();
+                await recarregarSemCanal(renderEntradas, renderDashboard);
             } else {
                 const errorData = await response.json();
                 console.error("Erro ao deletar entrada:", errorData);
@@ -414,7 +517,7 @@ async function updateSaida(event, id) {
     };
     
     try {
-        const response = await fetch(`${API_URL}/saidas/${id}`, {
+        const response = await apiFetch(`${API_URL}/saidas/${id}`, {
             method: "PUT",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify(saida)
@@ -422,8 +525,7 @@ async function updateSaida(event, id) {
         
         if (response.ok) {
             hideEditSaida(id);
-            await renderSaidas();
-            await renderDashboard();
+            await recarregarSemCanal(renderSaidas, renderDashboard);
         } else {
             const errorData = await response.json();
             console.error("Erro ao atualizar saída:", errorData);
@@ -435,24 +537,23 @@ async function updateSaida(event, id) {
     }
 }
 
-async function deleteSaida(id, grupoId) {
+async function deleteSaida(id, grupoId, parcelaAtual = 1) {
     if (grupoId) {
         // É uma parcela de um grupo
         const options = ["Apenas esta parcela", "Todas as parcelas restantes"];
-        const choice = confirm("Deseja excluir apenas esta parcela ou todas as parcelas?");
+        const choice = confirm("Deseja excluir esta parcela e todas as seguintes? (Cancelar exclui apenas esta parcela)");
         
         if (choice === null) return; // Cancelou
         
         if (choice) {
-            // Excluir todas as parcelas restantes
+            // Excluir esta parcela e as seguintes
             try {
-                const response = await fetch(`${API_URL}/saidas/grupo/${grupoId}`, {
+                const response = await apiFetch(`${API_URL}/saidas/grupo/${grupoId}?escopo=from=${parcelaAtual}`, {
                     method: "DELETE"
                 });
                 
                 if (response.ok) {
-                    await renderSaidas();
-                    await renderDashboard();
+                    await recarregarSemCanal(renderSaidas, renderDashboard);
                 } else {
                     const errorData = await response.json();
                     console.error("Erro ao deletar grupo de parcelas:", errorData);
@@ -465,13 +566,12 @@ async function deleteSaida(id, grupoId) {
         } else {
             // Excluir apenas esta parcela
             try {
-                const response = await fetch(`${API_URL}/saidas/${id}`, {
+                const response = await apiFetch(`${API_URL}/saidas/${id}`, {
                     method: "DELETE"
                 });
                 
                 if (response.ok) {
-                    await renderSaidas();
-                    await renderDashboard();
+                    await recarregarSemCanal(renderSaidas, renderDashboard);
                 } else {
                     const errorData = await response.json();
                     console.error("Erro ao deletar parcela:", errorData);
@@ -486,13 +586,12 @@ async function deleteSaida(id, grupoId) {
         // Exclusão normal (não é parte de um grupo de parcelas)
         if (confirm("Tem certeza que deseja remover esta saída?")) {
             try {
-                const response = await fetch(`${API_URL}/saidas/${id}`, {
+                const response = await apiFetch(`${API_URL}/saidas/${id}`, {
                     method: "DELETE"
                 });
                 
                 if (response.ok) {
-                    await renderSaidas();
-                    await renderDashboard();
+                    await recarregarSemCanal(renderSaidas, renderDashboard);
                 } else {
                     const errorData = await response.json();
                     console.error("Erro ao deletar saída:", errorData);
@@ -583,15 +682,14 @@ document.getElementById("form-entrada").addEventListener("submit", async (e) =>
     };
     
     try {
-        const response = await fetch(`${API_URL}/entradas`, {
+        const response = await apiFetch(`${API_URL}/entradas`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify(entrada)
         });
         
         if (response.ok) {
-            await renderEntradas();
-            await renderDashboard();
+            await recarregarSemCanal(renderEntradas, renderDashboard);
             e.target.reset();
             document.getElementById("form-entrada-container").style.display = "none";
         } else {
@@ -618,15 +716,14 @@ document.getElementById("form-saida").addEventListener("submit", async (e) => {
     };
     
     try {
-        const response = await fetch(`${API_URL}/saidas`, {
+        const response = await apiFetch(`${API_URL}/saidas`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify(saida)
         });
         
         if (response.ok) {
-            await renderSaidas();
-            await renderDashboard();
+            await recarregarSemCanal(renderSaidas, renderDashboard);
             e.target.reset();
             document.getElementById("form-saida-container").style.display = "none";
         } else {
@@ -641,9 +738,86 @@ document.getElementById("form-saida").addEventListener("submit", async (e) => {
 });
 
 // Listener para o filtro de saídas
-document.getElementById("filter-saidas").addEventListener("change", renderSaidas);
+document.getElementById("filter-saidas").addEventListener("change", () => renderSaidas());
 
-async function init() {
+// Alterações em tempo real (/eventos/stream): cada escrita, feita nesta aba,
+// em outra aba ou por outra pessoa, chega como as linhas alteradas e os
+// totais do dashboard dos meses afetados, aplicados sem buscar tudo de novo
+
+// Se a saída passa pelo filtro selecionado (o mesmo aplicado pelo backend)
+function passaFiltroSaidas(saida) {
+    const filtros = filtrosSaidas();
+    if (filtros.tipo === "parcelas") return saida.total_parcelas > 1;
+    if (filtros.tipo === "nao_parcelas") return (saida.total_parcelas || 1) <= 1;
+    if (filtros.tipo === "proximas") {
+        const hoje = new Date();
+        const limite = new Date(hoje.getTime() + filtros.dias * 24 * 60 * 60 * 1000);
+        return saida.data_vencimento >= dataISO(hoje) && saida.data_vencimento <= dataISO(limite);
+    }
+    return true;
+}
+
+// Ordem da tabela: por data e id, decrescente em "Ver Todos" de entradas
+function compararItens(tipo, a, b) {
+    const coluna = COLUNA_DATA[tipo];
+    const ordem = (a[coluna] || "").localeCompare(b[coluna] || "") || a.id - b.id;
+    return viewMode[tipo] === "all" && TODOS_DESCENDENTE[tipo] ? -ordem : ordem;
+}
+
+// Se um item alterado deve aparecer na tabela exibida
+function itemExibido(tipo, item) {
+    if (tipo === "saidas" && !passaFiltroSaidas(item)) return false;
+    if (viewMode[tipo] === "month") {
+        return (item[COLUNA_DATA[tipo]] || "").startsWith(chaveMes(currentMonth.year, currentMonth.month));
+    }
+    // Em "Ver Todos", só até o último item carregado; o resto vem com "Carregar mais"
+    const pagina = paginas[tipo];
+    const ultimo = pagina.itens[pagina.itens.length - 1];
+    return !pagina.proximo || !ultimo || compararItens(tipo, item, ultimo) <= 0;
+}
+
+function aplicarAlteracoes(dados) {
+    for (const tipo of ["entradas", "saidas"]) {
+        const { alteradas, removidas } = dados[tipo];
+        if (alteradas.length === 0 && removidas.length === 0) continue;
+        
+        const ids = new Set(removidas.concat(alteradas.map(item => item.id)));
+        const itens = itensExibidos(tipo).filter(item => !ids.has(item.id))
+            .concat(alteradas.filter(item => itemExibido(tipo, item)));
+        itens.sort((a, b) => compararItens(tipo, a, b));
+        if (viewMode[tipo] === "all") {
+            paginas[tipo].itens = itens;
+        } else {
+            itensMes[tipo] = itens;
+        }
+        tipo === "entradas" ? desenharEntradas() : desenharSaidas();
+    }
+    
+    // Dashboard do mês exibido; as próximas parcelas não dependem do mês
+    const meses = Object.keys(dados.dashboard);
+    const dashboard = dados.dashboard[chaveMes(currentMonth.year, currentMonth.month)];
+    if (dashboard) {
+        desenharDashboard(dashboard);
+    } else if (meses.length > 0 && dashboardAtual) {
+        desenharDashboard({ ...dashboardAtual, proximas_parcelas: dados.dashboard[meses[0]].proximas_parcelas });
+    }
+    
+    // Um mês que ainda não está no seletor passou a ter itens
+    if (meses.some(mes => !mesesConhecidos.has(mes))) {
+        populateMonthSelector();
+    }
+}
+
+// Com o canal conectado a tela é atualizada pelas mensagens de /eventos/stream;
+// sem ele, as tabelas e o dashboard são buscados de novo depois de cada escrita
+async function recarregarSemCanal(...renders) {
+    if (canal && canal.readyState === EventSource.OPEN) return;
+    for (const render of renders) {
+        await render();
+    }
+}
+
+async function carregarTudo() {
     // Popular o seletor de meses
     await populateMonthSelector();
     
@@ -653,4 +827,33 @@ async function init() {
     await renderSaidas();
 }
 
+// Abre o canal e resolve quando ele está pronto (ou falhou), para a primeira
+// carga vir depois do ponto a partir do qual as alterações são enviadas.
+// O EventSource não envia cabeçalhos, então o token vai na URL.
+function conectarAlteracoes() {
+    return new Promise(resolve => {
+        if (!window.EventSource) return resolve();
+        let primeiraConexao = true;
+        const pronto = () => {
+            primeiraConexao = false;
+            resolve();
+        };
+        const token = localStorage.getItem("token");
+        const tenant = localStorage.getItem("tenant");
+        canal = new EventSource(buildUrl("eventos/stream", token ? { token } : { tenant }));
+        
+        // Conexão nova (não a retomada de uma anterior): carregar tudo
+        canal.addEventListener("pronto", () => primeiraConexao ? pronto() : carregarTudo());
+        canal.addEventListener("recarregar", () => carregarTudo());
+        canal.addEventListener("alteracoes", e => aplicarAlteracoes(JSON.parse(e.data)));
+        // Sem o canal a página funciona como antes; o navegador tenta reconectar sozinho
+        canal.addEventListener("error", () => primeiraConexao && pronto());
+    });
+}
+
+async function init() {
+    await conectarAlteracoes();
+    await carregarTudo();
+}
+
 init();
\ No newline at end of file